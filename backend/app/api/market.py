@@ -1,12 +1,27 @@
 """
 Lumina 明见量化 - 市场数据 API
 """
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
-from app.services.data import data_service
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.services.kline import kline_store, get_history_frame
+from app.services.kline.columnar_store import PERIODS
+from app.services.market import market_snapshot, coalesced_data_service, quote_table, stock_search, stock_screener
+from app.services.market.quote_table import RANGE_FILTERS
+from app.services.market.screener import build_predicates
+from app.services.export import (
+    NDJSON, ArrowUnavailableError, aiter_encoded, attachment, encode_columnar, encode_json, encode_stream,
+    frame_columns, negotiate, parse_fields, project, wants_ndjson
+)
 
 router = APIRouter(prefix="/market", tags=["Market"])
 
@@ -45,15 +60,38 @@ class HistoricalData(BaseModel):
     macd: Optional[float] = None
 
 
+async def _columnar_response(columns: dict, media_type: str, stem: str) -> Response:
+    """Arrow / Parquet 下载响应 (pyarrow 未安装时返回 406)"""
+    try:
+        body = await asyncio.to_thread(encode_columnar, columns, media_type)
+    except ArrowUnavailableError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(content=body, media_type=media_type, headers=attachment(stem, media_type))
+
+
+def _snapshot_quotes(symbols: List[str]) -> Optional[List[dict]]:
+    """从足够新的市场快照读取行情 (任一股票不在快照中时返回 None)"""
+    snapshot = market_snapshot.current
+    if snapshot is None or not snapshot.is_fresh(settings.quote_poll_interval):
+        return None
+    if not all(symbol in snapshot.quotes for symbol in symbols):
+        return None
+    return [snapshot.quotes[symbol] for symbol in symbols]
+
+
 @router.get("/quote/{symbol}", response_model=StockQuote)
 async def get_quote(symbol: str):
-    """获取股票实时行情"""
-    quotes = await data_service.get_realtime_quote([symbol])
-    
-    if quotes.empty:
-        raise HTTPException(status_code=404, detail="股票不存在或无数据")
-    
-    row = quotes.iloc[0]
+    """获取股票实时行情 (优先读取市场快照)"""
+    row = _snapshot_quotes([symbol])
+    if row:
+        row = row[0]
+    else:
+        quotes = await coalesced_data_service.get_realtime_quote([symbol])
+        
+        if quotes.empty:
+            raise HTTPException(status_code=404, detail="股票不存在或无数据")
+        
+        row = quotes.iloc[0]
     return StockQuote(
         symbol=row.get("symbol", symbol),
         name=row.get("name", ""),
@@ -77,7 +115,11 @@ async def get_quote(symbol: str):
 async def get_quotes(symbols: str = Query(..., description="股票代码，逗号分隔")):
     """批量获取股票行情"""
     symbol_list = [s.strip() for s in symbols.split(",")]
-    quotes = await data_service.get_realtime_quote(symbol_list)
+    cached = _snapshot_quotes(symbol_list)
+    if cached is not None:
+        return cached
+    
+    quotes = await coalesced_data_service.get_realtime_quote(symbol_list)
     
     if quotes.empty:
         return []
@@ -88,7 +130,7 @@ async def get_quotes(symbols: str = Query(..., description="股票代码，逗
 @router.get("/minute/{symbol}")
 async def get_minute_data(symbol: str):
     """获取当天分时数据"""
-    df = await data_service.get_minute_data(symbol)
+    df = await coalesced_data_service.get_minute_data(symbol)
     
     if df.empty:
         return []
@@ -96,50 +138,112 @@ async def get_minute_data(symbol: str):
     return df.to_dict("records")
 
 
+@router.get("/history/bulk")
+async def get_bulk_history(
+    symbols: str = Query(..., description="股票代码，逗号分隔"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    period: str = "daily",
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔"),
+    format: Optional[str] = Query(None, description="ndjson (默认) / json")
+):
+    """批量获取历史K线 (逐只股票读取并流式输出，每行附带 symbol 字段)"""
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    field_list = parse_fields(fields)
+    ndjson = wants_ndjson(None, format or "ndjson")
+    
+    async def chunks():
+        for symbol in symbol_list:
+            df = await asyncio.to_thread(
+                get_history_frame, symbol, start_date=start_date, end_date=end_date, period=period
+            )
+            if df is None:
+                try:
+                    df = await coalesced_data_service.get_historical_data(
+                        symbol,
+                        start_date=start_date,
+                        end_date=end_date,
+                        period=period
+                    )
+                except Exception:
+                    continue
+            if df is None or df.empty:
+                continue
+            columns = {"symbol": np.full(len(df), symbol, dtype=object), **frame_columns(df)}
+            # 在线数据源可能缺少部分指标列，投影时忽略缺失字段
+            yield {name: columns[name] for name in field_list if name in columns} if field_list else columns
+    
+    return StreamingResponse(
+        aiter_encoded(chunks(), ndjson, settings.stream_batch_size),
+        media_type=NDJSON if ndjson else "application/json"
+    )
+
+
+def _history_columns(df: pd.DataFrame) -> dict:
+    """历史K线的 JSON 列 (字段同 HistoricalData，缺失的列输出 null，日期统一格式化)"""
+    columns = {}
+    for name in HistoricalData.model_fields:
+        if name == "date":
+            columns[name] = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]")
+        elif name in df.columns:
+            columns[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            columns[name] = np.full(len(df), np.nan)
+    return columns
+
+
 @router.get("/history/{symbol}", response_model=List[HistoricalData])
 async def get_history(
     symbol: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    period: str = "daily"
+    period: str = "daily",
+    limit: Optional[int] = Query(None, ge=1, description="返回条数"),
+    offset: int = Query(0, ge=0, description="跳过的条数 (按日期升序)"),
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔"),
+    format: Optional[str] = Query(None, description="json (默认) / arrow / parquet"),
+    accept: Optional[str] = Header(None)
 ):
-    """获取历史K线数据"""
-    df = await data_service.get_historical_data(
-        symbol,
-        start_date=start_date,
-        end_date=end_date,
-        period=period
-    )
-    
-    if df.empty:
-        return []
+    """获取历史K线数据 (优先读取本地列式存储；按 Accept 头或 format 参数可导出 Arrow IPC 流 / Parquet)"""
+    df = get_history_frame(symbol, start_date=start_date, end_date=end_date, period=period)
+    if df is None:
+        df = await coalesced_data_service.get_historical_data(
+            symbol,
+            start_date=start_date,
+            end_date=end_date,
+            period=period
+        )
     
-    # 转换为响应格式
-    result = []
-    for _, row in df.iterrows():
-        result.append(HistoricalData(
-            date=row["date"].strftime("%Y-%m-%d"),
-            open=row["open"],
-            high=row["high"],
-            low=row["low"],
-            close=row["close"],
-            volume=row["volume"],
-            amount=row.get("amount"),
-            change_pct=row.get("change_pct"),
-            ma5=row.get("ma5") if not (row.get("ma5") is None or (isinstance(row.get("ma5"), float) and row.get("ma5") != row.get("ma5"))) else None,
-            ma10=row.get("ma10") if not (row.get("ma10") is None or (isinstance(row.get("ma10"), float) and row.get("ma10") != row.get("ma10"))) else None,
-            ma20=row.get("ma20") if not (row.get("ma20") is None or (isinstance(row.get("ma20"), float) and row.get("ma20") != row.get("ma20"))) else None,
-            rsi=row.get("rsi") if not (row.get("rsi") is None or (isinstance(row.get("rsi"), float) and row.get("rsi") != row.get("rsi"))) else None,
-            macd=row.get("macd") if not (row.get("macd") is None or (isinstance(row.get("macd"), float) and row.get("macd") != row.get("macd"))) else None
-        ))
+    df = df.iloc[offset:(offset + limit) if limit else None]
+    media_type = negotiate(accept, format)
+    try:
+        if media_type:
+            columns = project(frame_columns(df), parse_fields(fields))
+            return await _columnar_response(columns, media_type, f"{symbol}_{period}")
+        
+        if df.empty:
+            return []
+        columns = project(_history_columns(df), parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return result
+    # 按列批量转换后直接编码，不逐行构建响应模型
+    return Response(content=encode_json(columns), media_type="application/json")
 
 
 @router.get("/hot")
 async def get_hot_stocks(limit: int = 20):
-    """获取热门股票"""
-    df = await data_service.get_hot_stocks(limit)
+    """获取热门股票 (数量不超过快照容量时读取市场快照，否则读取全市场行情表)"""
+    if limit <= market_snapshot.hot_size:
+        snapshot = await market_snapshot.get()
+        if snapshot.hot:
+            return list(snapshot.hot[:limit])
+    
+    table = await quote_table.get()
+    if table is not None:
+        return table.ranking("hot", limit)
+    
+    df = await coalesced_data_service.get_hot_stocks(limit)
     
     if df.empty:
         return []
@@ -159,10 +263,19 @@ async def screen_stocks(
     max_turnover: Optional[float] = None,
     min_change_pct: Optional[float] = None,
     max_change_pct: Optional[float] = None,
+    rsi_min: Optional[float] = Query(None, description="RSI 下限"),
+    rsi_max: Optional[float] = Query(None, description="RSI 上限"),
+    above_ma: Optional[int] = Query(None, description="价格在 N 日均线之上"),
+    below_ma: Optional[int] = Query(None, description="价格在 N 日均线之下"),
+    ma_cross: Optional[str] = Query(None, description="均线金叉，如 5,20"),
+    ma_cross_down: Optional[str] = Query(None, description="均线死叉，如 5,20"),
+    macd: Optional[str] = Query(None, description="golden / death / positive / negative"),
+    sort_by: Optional[str] = Query(None, description="排序字段，如 change_pct、amount、rsi"),
+    descending: bool = True,
     limit: int = 100
 ):
-    """股票筛选"""
-    df = await data_service.screen_stocks(
+    """股票筛选 (全市场行情表 + 技术指标，掩码计算)"""
+    ranges = dict(
         min_price=min_price,
         max_price=max_price,
         min_market_cap=min_market_cap,
@@ -174,6 +287,28 @@ async def screen_stocks(
         min_change_pct=min_change_pct,
         max_change_pct=max_change_pct
     )
+    try:
+        predicates = build_predicates(
+            rsi_min=rsi_min,
+            rsi_max=rsi_max,
+            above_ma=above_ma,
+            below_ma=below_ma,
+            ma_cross=_parse_pair(ma_cross),
+            ma_cross_down=_parse_pair(ma_cross_down),
+            macd=macd,
+            **ranges
+        )
+        table = await quote_table.get()
+        if table is not None:
+            return stock_screener.screen(table, predicates, sort_by, descending, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 全市场行情表不可用时回退到数据源筛选 (仅支持行情区间条件)
+    if any(p.column not in RANGE_FILTERS for p in predicates):
+        raise HTTPException(status_code=503, detail="全市场行情暂不可用，无法按技术指标筛选")
+    
+    df = await coalesced_data_service.screen_stocks(**ranges)
     
     if df.empty:
         return []
@@ -181,17 +316,34 @@ async def screen_stocks(
     return df.head(limit).to_dict("records")
 
 
+def _parse_pair(value: Optional[str]) -> Optional[tuple]:
+    """解析 "5,20" 形式的均线参数"""
+    if not value:
+        return None
+    try:
+        fast, slow = (int(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError(f"均线参数格式应为 快线,慢线: {value}")
+    return fast, slow
+
+
 @router.get("/indices")
 async def get_indices():
-    """获取主要指数行情"""
-    indices = await data_service.get_index_quote()
-    return indices
+    """获取主要指数行情 (读取市场快照)"""
+    snapshot = await market_snapshot.get()
+    if snapshot.indices:
+        return snapshot.indices
+    return await coalesced_data_service.get_index_quote()
 
 
 @router.get("/gainers")
 async def get_gainers(limit: int = 50):
     """获取涨幅榜"""
-    df = await data_service.get_gainers(limit)
+    table = await quote_table.get()
+    if table is not None:
+        return table.ranking("gainers", limit)
+    
+    df = await coalesced_data_service.get_gainers(limit)
     if df.empty:
         return []
     return df.to_dict("records")
@@ -200,7 +352,11 @@ async def get_gainers(limit: int = 50):
 @router.get("/losers")
 async def get_losers(limit: int = 50):
     """获取跌幅榜"""
-    df = await data_service.get_losers(limit)
+    table = await quote_table.get()
+    if table is not None:
+        return table.ranking("losers", limit)
+    
+    df = await coalesced_data_service.get_losers(limit)
     if df.empty:
         return []
     return df.to_dict("records")
@@ -209,7 +365,11 @@ async def get_losers(limit: int = 50):
 @router.get("/volume-leaders")
 async def get_volume_leaders(limit: int = 50):
     """获取成交量排行"""
-    df = await data_service.get_volume_leaders(limit)
+    table = await quote_table.get()
+    if table is not None:
+        return table.ranking("volume", limit)
+    
+    df = await coalesced_data_service.get_volume_leaders(limit)
     if df.empty:
         return []
     return df.to_dict("records")
@@ -218,37 +378,46 @@ async def get_volume_leaders(limit: int = 50):
 @router.get("/turnover-leaders")
 async def get_turnover_leaders(limit: int = 50):
     """获取换手率排行"""
-    df = await data_service.get_turnover_leaders(limit)
+    table = await quote_table.get()
+    if table is not None:
+        return table.ranking("turnover", limit)
+    
+    df = await coalesced_data_service.get_turnover_leaders(limit)
     if df.empty:
         return []
     return df.to_dict("records")
 
 
 @router.get("/all")
-async def get_all_stocks():
-    """获取全市场股票行情"""
-    df = await data_service.get_all_stocks_quote()
-    if df.empty:
-        return []
-    return df.to_dict("records")
-
-
-@router.get("/search")
-async def search_stocks(keyword: str):
-    """搜索股票"""
-    stocks = await data_service.get_stock_list()
+async def get_all_stocks(
+    fields: Optional[str] = Query(None, description="返回字段，逗号分隔"),
+    format: Optional[str] = Query(None, description="json (默认，分块 JSON 数组) / ndjson"),
+    accept: Optional[str] = Header(None)
+):
+    """获取全市场股票行情 (按行批次流式输出)"""
+    table = await quote_table.get()
+    if table is not None:
+        columns = table.columns
+    else:
+        df = await coalesced_data_service.get_all_stocks_quote()
+        columns = frame_columns(df) if not df.empty else {}
     
-    if stocks.empty:
-        return []
+    try:
+        columns = project(columns, parse_fields(fields)) if columns else columns
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # 简单搜索
-    mask = (
-        stocks["symbol"].str.contains(keyword, case=False, na=False) |
-        stocks["name"].str.contains(keyword, case=False, na=False)
+    ndjson = wants_ndjson(accept, format)
+    return StreamingResponse(
+        encode_stream(columns, ndjson, settings.stream_batch_size),
+        media_type=NDJSON if ndjson else "application/json"
     )
-    
-    result = stocks[mask].head(20)
-    return result.to_dict("records")
+
+
+@router.get("/search")
+async def search_stocks(keyword: str, limit: int = Query(20, ge=1, le=100)):
+    """搜索股票 (代码、名称、拼音首字母，读取内存搜索索引)"""
+    return await stock_search.search(keyword, limit)
 
 
 # ========== K线数据管理 ==========
@@ -269,7 +438,8 @@ async def get_kline_stats():
         "daily": {"stocks": daily_stocks, "records": daily_records},
         "weekly": {"stocks": weekly_stocks, "records": weekly_records},
         "monthly": {"stocks": monthly_stocks, "records": monthly_records},
-        "total_records": daily_records + weekly_records + monthly_records
+        "total_records": daily_records + weekly_records + monthly_records,
+        "columnar": {period: kline_store.stats(period) for period in PERIODS}
     }
 
 
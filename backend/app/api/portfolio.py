@@ -1,15 +1,20 @@
 """
 Lumina 明见量化 - 投资组合 API
 """
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
 from app.core.database import get_db
-from app.services.trading import TradingService
+from app.services.trading import TradingService, portfolio_state_store
+from app.services.trading.trading_service import ORDER_EXPORT_TYPES, PNL_EXPORT_TYPES
 from app.services.strategy import strategy_scheduler
+from app.services.export import ArrowUnavailableError, attachment, encode_columnar, negotiate
 
 router = APIRouter(prefix="/portfolio", tags=["Portfolio"])
 
@@ -49,6 +54,7 @@ class OrderResponse(BaseModel):
     filled_quantity: int
     status: str
     reason: Optional[str]
+    quote_age_ms: Optional[int] = None
     created_at: str
 
 
@@ -62,46 +68,106 @@ class PnLRecordResponse(BaseModel):
     total_pnl_ratio: float
 
 
-@router.get("/status", response_model=PortfolioResponse)
-async def get_portfolio_status(db: AsyncSession = Depends(get_db)):
-    """获取投资组合状态"""
-    trading_service = TradingService(db)
-    portfolio = await trading_service.get_or_create_portfolio()
-    status = await trading_service.get_portfolio_status(portfolio.id)
-    
+class PortfolioSummaryResponse(BaseModel):
+    id: int
+    name: str
+    initial_capital: float
+    total_value: float
+    is_active: bool
+
+
+class CreatePortfolioRequest(BaseModel):
+    name: str
+    initial_capital: Optional[float] = None
+
+
+async def _default_portfolio_id(db: AsyncSession) -> int:
+    """默认组合 ID (兼容未指定组合的旧接口)"""
+    portfolio = await TradingService(db).get_or_create_portfolio()
+    return portfolio.id
+
+
+async def _status(db: AsyncSession, portfolio_id: int) -> PortfolioResponse:
+    status = await TradingService(db).get_portfolio_status(portfolio_id)
     if not status:
         raise HTTPException(status_code=404, detail="投资组合不存在")
-    
     return PortfolioResponse(**status)
 
 
+async def _columnar_response(columns: dict, media_type: str, stem: str, types: Optional[dict] = None) -> Response:
+    """Arrow / Parquet 下载响应 (pyarrow 未安装时返回 406)"""
+    try:
+        body = await asyncio.to_thread(encode_columnar, columns, media_type, types)
+    except ArrowUnavailableError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(content=body, media_type=media_type, headers=attachment(stem, media_type))
+
+
+@router.get("/list", response_model=List[PortfolioSummaryResponse])
+async def list_portfolios(
+    include_inactive: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """列出投资组合"""
+    portfolios = await TradingService(db).list_portfolios(active_only=not include_inactive)
+    return [
+        PortfolioSummaryResponse(
+            id=p.id,
+            name=p.name,
+            initial_capital=p.initial_capital,
+            total_value=p.total_value,
+            is_active=bool(p.is_active)
+        )
+        for p in portfolios
+    ]
+
+
+@router.post("/create", response_model=PortfolioResponse)
+async def create_portfolio(
+    request: CreatePortfolioRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """创建投资组合 (创建后参与定时分析)"""
+    trading_service = TradingService(db)
+    portfolio = await trading_service.create_portfolio(request.name, request.initial_capital)
+    if not portfolio:
+        raise HTTPException(status_code=400, detail=f"投资组合已存在: {request.name}")
+    await db.commit()
+    await strategy_scheduler.refresh_portfolios()
+    return await _status(db, portfolio.id)
+
+
+@router.get("/status", response_model=PortfolioResponse)
+async def get_portfolio_status(db: AsyncSession = Depends(get_db)):
+    """获取默认投资组合状态"""
+    return await _status(db, await _default_portfolio_id(db))
+
+
 @router.get("/orders", response_model=List[OrderResponse])
 async def get_orders(
     limit: int = 50,
+    format: Optional[str] = Query(None, description="json (默认) / arrow / parquet"),
+    accept: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取订单历史"""
-    trading_service = TradingService(db)
-    portfolio = await trading_service.get_or_create_portfolio()
-    orders = await trading_service.get_orders(portfolio.id, limit)
-    return [OrderResponse(**o) for o in orders]
+    """获取默认投资组合订单历史"""
+    return await get_portfolio_orders(await _default_portfolio_id(db), limit, format, accept, db)
 
 
 @router.get("/pnl", response_model=List[PnLRecordResponse])
 async def get_pnl_history(
     days: int = 30,
+    format: Optional[str] = Query(None, description="json (默认) / arrow / parquet"),
+    accept: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取盈亏历史"""
-    trading_service = TradingService(db)
-    portfolio = await trading_service.get_or_create_portfolio()
-    records = await trading_service.get_pnl_history(portfolio.id, days)
-    return [PnLRecordResponse(**r) for r in records]
+    """获取默认投资组合盈亏历史"""
+    return await get_portfolio_pnl(await _default_portfolio_id(db), days, format, accept, db)
 
 
 @router.post("/analyze")
 async def trigger_analysis(db: AsyncSession = Depends(get_db)):
-    """手动触发分析"""
+    """手动触发默认投资组合分析"""
     status = await strategy_scheduler.manual_analysis()
     return {
         "status": "success",
@@ -112,7 +178,7 @@ async def trigger_analysis(db: AsyncSession = Depends(get_db)):
 
 @router.post("/reset")
 async def reset_portfolio(db: AsyncSession = Depends(get_db)):
-    """重置投资组合"""
+    """重置投资组合 (删除全部组合，重新创建默认组合)"""
     from app.models import Portfolio, Position, Order, PnLRecord
     from sqlalchemy import delete
     
@@ -122,10 +188,77 @@ async def reset_portfolio(db: AsyncSession = Depends(get_db)):
     await db.execute(delete(PnLRecord))
     await db.execute(delete(Portfolio))
     await db.commit()
+    portfolio_state_store.invalidate()
     
     # 创建新的投资组合
-    trading_service = TradingService(db)
-    await trading_service.get_or_create_portfolio()
+    strategy_scheduler.portfolio_id = await _default_portfolio_id(db)
     await db.commit()
+    await strategy_scheduler.refresh_portfolios()
     
     return {"status": "success", "message": "投资组合已重置"}
+
+
+@router.get("/{portfolio_id}/status", response_model=PortfolioResponse)
+async def get_portfolio_status_by_id(portfolio_id: int, db: AsyncSession = Depends(get_db)):
+    """获取指定投资组合状态"""
+    return await _status(db, portfolio_id)
+
+
+@router.get("/{portfolio_id}/orders", response_model=List[OrderResponse])
+async def get_portfolio_orders(
+    portfolio_id: int,
+    limit: int = 50,
+    format: Optional[str] = Query(None, description="json (默认) / arrow / parquet"),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取指定投资组合订单历史 (按 Accept 头或 format 参数可导出 Arrow IPC 流 / Parquet)"""
+    media_type = negotiate(accept, format)
+    if media_type:
+        columns = await TradingService(db).get_order_columns(portfolio_id, limit)
+        return await _columnar_response(columns, media_type, f"orders_{portfolio_id}", ORDER_EXPORT_TYPES)
+    
+    orders = await TradingService(db).get_orders(portfolio_id, limit)
+    return [OrderResponse(**o) for o in orders]
+
+
+@router.get("/{portfolio_id}/pnl", response_model=List[PnLRecordResponse])
+async def get_portfolio_pnl(
+    portfolio_id: int,
+    days: int = 30,
+    format: Optional[str] = Query(None, description="json (默认) / arrow / parquet"),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取指定投资组合盈亏历史 (按 Accept 头或 format 参数可导出 Arrow IPC 流 / Parquet)"""
+    media_type = negotiate(accept, format)
+    if media_type:
+        columns = await TradingService(db).get_pnl_columns(portfolio_id, days)
+        return await _columnar_response(columns, media_type, f"pnl_{portfolio_id}", PNL_EXPORT_TYPES)
+    
+    records = await TradingService(db).get_pnl_history(portfolio_id, days)
+    return [PnLRecordResponse(**r) for r in records]
+
+
+@router.post("/{portfolio_id}/analyze")
+async def trigger_portfolio_analysis(portfolio_id: int, db: AsyncSession = Depends(get_db)):
+    """手动触发指定投资组合分析"""
+    await _status(db, portfolio_id)
+    status = await strategy_scheduler.manual_analysis(portfolio_id)
+    return {
+        "status": "success",
+        "message": "分析已触发",
+        "portfolio": status
+    }
+
+
+@router.post("/{portfolio_id}/deactivate")
+async def deactivate_portfolio(portfolio_id: int, db: AsyncSession = Depends(get_db)):
+    """停用投资组合"""
+    if portfolio_id == strategy_scheduler.portfolio_id:
+        raise HTTPException(status_code=400, detail="默认投资组合不能停用")
+    if not await TradingService(db).deactivate_portfolio(portfolio_id):
+        raise HTTPException(status_code=404, detail="投资组合不存在或已停用")
+    await db.commit()
+    await strategy_scheduler.refresh_portfolios()
+    return {"status": "success", "message": "投资组合已停用"}
@@ -3,76 +3,226 @@ Lumina 明见量化 - WebSocket 实时推送
 """
 import asyncio
 import json
+from collections import deque
 from datetime import datetime
-from typing import Dict, Set
+from typing import Deque, Dict, Optional, Set, Tuple
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from loguru import logger
 
+from app.core.config import settings
 from app.core.database import async_session_factory
-from app.services.data import data_service
-from app.services.trading import TradingService
+from app.services.trading import TradingService, PortfolioState, portfolio_state_store
+from app.services.realtime import PortfolioFeed, quote_feed
 from app.services.strategy import strategy_scheduler
 
 router = APIRouter(tags=["WebSocket"])
 
 
+class ClientConnection:
+    """单个客户端连接：有界发送队列 + 独立写任务"""
+    
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.portfolio_id: Optional[int] = None  # 订阅的组合 (组合增量只推送给订阅该组合的连接)
+        self.queue: Deque[Tuple[str, str]] = deque()
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+    
+    def stop(self):
+        self.closed = True
+        if self._task and not self._task.done():
+            self._task.cancel()
+    
+    def enqueue(self, kind: str, text: str) -> bool:
+        """
+        将已编码的消息放入发送队列
+        
+        Returns:
+            False 表示客户端过慢且策略为断开连接
+        """
+        if self.closed:
+            return False
+        
+        if len(self.queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                return False
+            if self.policy == "coalesce":
+                # 同类型消息只保留最新一条
+                self.queue = deque(frame for frame in self.queue if frame[0] != kind)
+            while len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+        
+        self.queue.append((kind, text))
+        self._ready.set()
+        return True
+    
+    async def _writer(self):
+        """写任务：逐条发送队列中的消息"""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, text = self.queue.popleft()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket 发送失败: {e}")
+            self.closed = True
+
+
 class ConnectionManager:
     """WebSocket 连接管理器"""
     
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
         self.is_broadcasting = False
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.add(websocket)
+        client = ClientConnection(
+            websocket,
+            max_queue=settings.ws_send_queue_size,
+            policy=settings.ws_slow_consumer_policy
+        )
+        client.start()
+        self.active_connections[websocket] = client
         logger.info(f"WebSocket 连接: 当前连接数 {len(self.active_connections)}")
     
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        client.stop()
+        quote_feed.unsubscribe(websocket)
         logger.info(f"WebSocket 断开: 当前连接数 {len(self.active_connections)}")
     
-    async def broadcast(self, message: dict):
-        """广播消息给所有连接"""
+    @staticmethod
+    def encode(message: dict) -> str:
+        return json.dumps(message, ensure_ascii=False, default=str)
+    
+    async def send(self, websocket: WebSocket, message: dict):
+        """发送消息给单个连接 (经由该连接的发送队列)"""
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        if not client.enqueue(message.get("type", ""), self.encode(message)):
+            await self._drop_slow_client(client)
+    
+    async def broadcast(self, message: dict, portfolio_id: Optional[int] = None):
+        """
+        广播消息 (只编码一次，放入各连接队列后立即返回)
+        
+        Args:
+            portfolio_id: 指定时只发送给订阅该组合的连接
+        """
         if not self.active_connections:
             return
         
-        message_json = json.dumps(message, ensure_ascii=False, default=str)
+        kind = message.get("type", "")
+        message_json = self.encode(message)
         
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_json)
-            except Exception:
-                disconnected.add(connection)
+        slow_clients = [
+            client for client in list(self.active_connections.values())
+            if (portfolio_id is None or client.portfolio_id == portfolio_id)
+            and not client.enqueue(kind, message_json)
+        ]
         
-        # 清理断开的连接
-        for conn in disconnected:
-            self.active_connections.discard(conn)
+        # 清理过慢或已断开的连接
+        for client in slow_clients:
+            await self._drop_slow_client(client)
+    
+    def portfolio_ids(self) -> Set[int]:
+        """当前连接订阅的组合"""
+        return {
+            client.portfolio_id for client in self.active_connections.values()
+            if client.portfolio_id is not None
+        }
+    
+    async def _drop_slow_client(self, client: ClientConnection):
+        if not client.closed:
+            logger.warning(f"WebSocket 客户端过慢，断开连接 (队列 {len(client.queue)} 条)")
+        self.disconnect(client.websocket)
+        try:
+            await client.websocket.close(code=1013)
+        except Exception:
+            pass
 
 
 manager = ConnectionManager()
 
+# 版本化的组合快照推送源 (每个组合一个)
+portfolio_feeds: Dict[int, PortfolioFeed] = {}
+
+
+async def _resolve_portfolio_id(portfolio_id: Optional[int] = None) -> Optional[int]:
+    """确定连接订阅的组合 (未指定时使用调度器当前的默认组合)"""
+    portfolio_id = portfolio_id or strategy_scheduler.portfolio_id
+    if portfolio_id and portfolio_state_store.get(portfolio_id) is not None:
+        return portfolio_id
+    
+    async with async_session_factory() as db:
+        if portfolio_id is not None:
+            state = await portfolio_state_store.get_or_load(db, portfolio_id)
+            if state is not None:
+                return portfolio_id
+        
+        # 调度器尚未初始化或组合已被重置，回退到默认组合
+        trading_service = TradingService(db)
+        portfolio = await trading_service.get_or_create_portfolio()
+        await db.commit()
+        return portfolio.id
+
+
+async def _get_portfolio_state(portfolio_id: int) -> Optional[PortfolioState]:
+    """获取组合的内存状态 (未加载时从数据库读取)"""
+    state = portfolio_state_store.get(portfolio_id)
+    if state is not None:
+        return state
+    async with async_session_factory() as db:
+        return await portfolio_state_store.get_or_load(db, portfolio_id)
+
+
+async def _sync_portfolio_feed(portfolio_id: int) -> Optional[Dict]:
+    """将组合最新状态发布到其推送源，返回需要推送的增量消息"""
+    feed = portfolio_feeds.setdefault(portfolio_id, PortfolioFeed(portfolio_id))
+    state = await _get_portfolio_state(portfolio_id)
+    if not state or feed.is_current(state.version):
+        return None
+    return feed.publish(state.version, state.to_status())
+
+
+async def _sync_portfolio_feeds():
+    """同步全部被订阅组合的推送源，并把增量推送给各自的订阅者"""
+    watched = manager.portfolio_ids()
+    for portfolio_id in list(portfolio_feeds):
+        if portfolio_id not in watched:
+            del portfolio_feeds[portfolio_id]
+    
+    for portfolio_id in watched:
+        delta = await _sync_portfolio_feed(portfolio_id)
+        if delta:
+            await manager.broadcast(delta, portfolio_id)
+
 
 async def broadcast_loop():
-    """实时广播循环"""
+    """实时广播循环 (仅在组合版本变化时推送增量)"""
     while True:
         try:
             if manager.active_connections:
-                # 获取投资组合状态
-                async with async_session_factory() as db:
-                    trading_service = TradingService(db)
-                    portfolio = await trading_service.get_or_create_portfolio()
-                    status = await trading_service.get_portfolio_status(portfolio.id)
-                
-                # 广播状态更新
-                await manager.broadcast({
-                    "type": "portfolio_update",
-                    "timestamp": datetime.now().isoformat(),
-                    "data": status
-                })
+                await _sync_portfolio_feeds()
             
-            # 每 5 秒更新一次
+            # 每 5 秒检查一次
             await asyncio.sleep(5)
             
         except Exception as e:
@@ -80,26 +230,72 @@ async def broadcast_loop():
             await asyncio.sleep(10)
 
 
-@router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket 端点"""
-    await manager.connect(websocket)
+async def _send_initial_state(websocket: WebSocket, portfolio_id: int):
+    """订阅组合并发送其全量快照 (此后仅推送增量)"""
+    client = manager.active_connections.get(websocket)
+    if client is None:
+        return
+    client.portfolio_id = portfolio_id
     
-    try:
-        # 发送初始状态
+    delta = await _sync_portfolio_feed(portfolio_id)
+    if delta:
+        await manager.broadcast(delta, portfolio_id)
+    feed = portfolio_feeds[portfolio_id]
+    
+    pnl_history = []
+    if feed.snapshot:
         async with async_session_factory() as db:
             trading_service = TradingService(db)
-            portfolio = await trading_service.get_or_create_portfolio()
-            status = await trading_service.get_portfolio_status(portfolio.id)
-            pnl_history = await trading_service.get_pnl_history(portfolio.id, 30)
-        
-        await websocket.send_json({
-            "type": "initial_state",
-            "data": {
-                "portfolio": status,
-                "pnl_history": pnl_history
-            }
+            pnl_history = await trading_service.get_pnl_history(portfolio_id, 30)
+    
+    await manager.send(websocket, {
+        "type": "initial_state",
+        "portfolio_id": portfolio_id,
+        "seq": feed.version,
+        "data": {
+            "portfolio": feed.snapshot,
+            "pnl_history": pnl_history
+        }
+    })
+
+
+async def _push_quotes(updates: Dict[WebSocket, list]):
+    """推送变化的行情给对应订阅者"""
+    for websocket, quotes in updates.items():
+        await manager.send(websocket, {
+            "type": "quotes_update",
+            "data": quotes
         })
+
+
+async def quote_loop():
+    """共享行情轮询循环 (按订阅股票并集获取，与客户端数量无关)"""
+    while True:
+        try:
+            if quote_feed.symbols:
+                await _push_quotes(await quote_feed.poll())
+            
+            await asyncio.sleep(settings.quote_poll_interval)
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"行情轮询错误: {e}")
+            await asyncio.sleep(10)
+
+
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, portfolio_id: Optional[int] = None):
+    """
+    WebSocket 端点
+    
+    连接订阅一个组合 (查询参数 portfolio_id，默认为默认组合)，组合的快照与增量只推送给订阅该组合的连接；
+    发送 {"type": "subscribe_portfolio", "portfolio_id": N} 可切换订阅的组合，服务端回复该组合的 initial_state。
+    """
+    await manager.connect(websocket)
+    
+    try:
+        await _send_initial_state(websocket, await _resolve_portfolio_id(portfolio_id))
         
         # 保持连接并处理消息
         while True:
@@ -113,30 +309,56 @@ async def websocket_endpoint(websocket: WebSocket):
                 message = json.loads(data)
                 
                 if message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    await manager.send(websocket, {"type": "pong"})
+                
+                elif message.get("type") == "resync":
+                    # 客户端发现序号不连续，从指定版本重新同步
+                    client = manager.active_connections.get(websocket)
+                    feed = portfolio_feeds.get(client.portfolio_id) if client else None
+                    if feed is None:
+                        continue
+                    since = message.get("since")
+                    deltas = feed.deltas_since(since) if isinstance(since, int) else None
+                    if deltas is None:
+                        await manager.send(websocket, feed.snapshot_message())
+                    else:
+                        for delta in deltas:
+                            await manager.send(websocket, delta)
+                
+                elif message.get("type") == "subscribe_portfolio":
+                    # 切换订阅的组合
+                    target = message.get("portfolio_id")
+                    if isinstance(target, int):
+                        await _send_initial_state(websocket, await _resolve_portfolio_id(target))
                 
                 elif message.get("type") == "subscribe_quotes":
-                    # 订阅行情
+                    # 订阅行情 (由共享轮询器持续推送变化)
                     symbols = message.get("symbols", [])
                     if symbols:
-                        quotes = await data_service.get_realtime_quote(symbols)
-                        if not quotes.empty:
-                            await websocket.send_json({
+                        cached, missing = quote_feed.subscribe(websocket, symbols)
+                        if cached:
+                            await manager.send(websocket, {
                                 "type": "quotes_update",
-                                "data": quotes.to_dict("records")
+                                "data": cached
                             })
+                        if missing:
+                            await _push_quotes(await quote_feed.poll(missing))
+                
+                elif message.get("type") == "unsubscribe_quotes":
+                    # 取消订阅 (未指定股票时取消全部)
+                    quote_feed.unsubscribe(websocket, message.get("symbols") or None)
                 
                 elif message.get("type") == "trigger_analysis":
                     # 触发分析
                     await strategy_scheduler.manual_analysis()
-                    await websocket.send_json({
+                    await manager.send(websocket, {
                         "type": "analysis_triggered",
                         "message": "分析已触发"
                     })
                     
             except asyncio.TimeoutError:
                 # 发送心跳
-                await websocket.send_json({"type": "heartbeat"})
+                await manager.send(websocket, {"type": "heartbeat"})
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
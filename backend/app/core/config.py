@@ -46,12 +46,33 @@ class Settings(BaseSettings):
     # 默认 LLM 模型
     default_llm_model: str = "openai/gpt-4.1-mini"
     
+    # LLM HTTP 连接池配置
+    llm_http2: bool = True                   # 启用 HTTP/2
+    llm_timeout: float = 120.0               # 请求超时 (秒)
+    llm_max_connections: int = 10            # 最大连接数
+    llm_max_keepalive_connections: int = 5   # 最大保活连接数
+    llm_keepalive_expiry: float = 300.0      # 保活连接过期时间 (秒)
+    llm_max_concurrency: int = 4             # 多组合并发分析时同时进行的 LLM 调用上限
+    
+    # LLM 响应缓存 (相同提示词复用已解析结果，配置 redis_url 时启用 Redis 二级缓存)
+    llm_cache_enabled: bool = True
+    llm_cache_ttl: int = 300                 # 缓存有效期 (秒)
+    llm_cache_max_size: int = 256            # 内存缓存最大条目数
+    llm_cache_sqlite: bool = False           # 同时写入数据库 (单机部署无 Redis 时重启后仍可命中)
+    
+    # LLM 决策录制/回放: off / record (录制每次分析) / replay (只回放录制结果，未命中时使用本地桩模型)
+    llm_replay_mode: str = "off"
+    
     # 数据源配置
     tushare_token: Optional[str] = None
     
     # 数据库配置
     database_url: str = "sqlite:///./data/lumina.db"
     
+    # 列式 K 线存储目录
+    kline_store_dir: str = "./data/kline"
+    indicator_lookback: int = 500  # 指标引擎初始化时每只股票加载的 K 线条数
+    
     # Redis 配置
     redis_url: Optional[str] = None
     
@@ -62,11 +83,38 @@ class Settings(BaseSettings):
     max_holdings: int = 10               # 最大持股数量
     stop_loss_ratio: float = 0.08        # 止损比例
     take_profit_ratio: float = 0.20      # 止盈比例
+    risk_monitor_enabled: bool = True    # 每次持仓价格更新后按止损/止盈规则直接卖出
+    position_tick_interval: float = 5.0  # 交易时段持仓价格更新间隔 (秒)
     max_daily_trades: int = 10           # 每日最大交易次数
     
     # 决策配置
     decision_interval: int = 3600        # 决策间隔 (秒)
     
+    # 候选股票补全配置
+    candidate_pool_size: int = 20           # 候选股票数量
+    candidate_concurrency: int = 10         # 历史数据最大并发请求数
+    candidate_rate_limit: float = 20.0      # 单个数据源每秒最大请求数 (0 为不限速)
+    candidate_fetch_timeout: float = 8.0    # 单只股票获取超时 (秒)
+    execution_quote_max_age: float = 10.0   # 执行交易时可复用的候选行情最大时效 (秒，按下单时刻计算)
+    
+    # 市场快照 (指数、热门股票、行情、指标由单一生产者定时构建，调度任务 / API / WebSocket 共享)
+    market_snapshot_interval: float = 30.0  # 快照刷新间隔 (秒)
+    market_snapshot_hot_size: int = 50      # 快照中的热门股票数量
+    quote_table_ttl: float = 5.0            # 全市场行情表刷新间隔 (秒)，排行和筛选读取该表
+    search_index_ttl: float = 21600.0       # 股票搜索索引重建间隔 (秒)
+    screener_mask_cache_size: int = 256     # 选股条件掩码缓存条目数
+    stream_batch_size: int = 1000           # 流式响应每批编码的行数
+    
+    # 数据请求合并 (并发的相同请求共享一次上游调用，结果按方法短时缓存)
+    data_coalesce_enabled: bool = True
+    data_coalesce_max_entries: int = 1024   # 缓存结果最大条目数
+    
+    # WebSocket 推送配置
+    ws_send_queue_size: int = 100               # 每个连接的发送队列长度
+    ws_slow_consumer_policy: str = "coalesce"   # 队列满时的策略: drop_oldest / coalesce / disconnect
+    quote_poll_interval: float = 3.0            # 订阅行情轮询间隔 (秒)
+    quote_batch_size: int = 100                 # 每批获取的股票数量
+    
     # 日志配置
     log_level: str = "INFO"
     log_file: str = "./logs/lumina.log"
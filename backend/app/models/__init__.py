@@ -9,6 +9,8 @@ from app.models.models import (
     StockData,
     KlineData,
     LLMDecision,
+    LLMReplayRecord,
+    LLMCacheEntry,
     SystemLog,
     TradeAction,
     OrderStatus
@@ -22,6 +24,8 @@ __all__ = [
     "StockData",
     "KlineData",
     "LLMDecision",
+    "LLMReplayRecord",
+    "LLMCacheEntry",
     "SystemLog",
     "TradeAction",
     "OrderStatus"
@@ -1,7 +1,7 @@
 """
 Lumina 明见量化 - 数据模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -57,6 +57,7 @@ class Position(Base, TimestampMixin):
     unrealized_pnl = Column(Float, default=0)           # 未实现盈亏
     unrealized_pnl_ratio = Column(Float, default=0)     # 未实现盈亏比例
     last_buy_date = Column(String(10))                   # 最后买入日期 (YYYY-MM-DD), 用于T+1规则
+    profit_taken = Column(Boolean, default=False)        # 本轮持仓是否已触发过止盈 (清仓后随持仓删除)
     
     # 关联
     portfolio = relationship("Portfolio", back_populates="positions")
@@ -87,6 +88,7 @@ class Order(Base, TimestampMixin):
     filled_quantity = Column(Integer, default=0)        # 成交数量
     status = Column(String(20), default="pending")      # pending / filled / cancelled / failed
     reason = Column(Text)                               # 交易原因 (LLM 给出)
+    quote_age_ms = Column(Integer)                      # 成交所用行情的时效 (毫秒)
     
     # 关联
     portfolio = relationship("Portfolio", back_populates="orders")
@@ -191,6 +193,33 @@ class LLMDecision(Base, TimestampMixin):
     executed = Column(Boolean, default=False)           # 是否已执行
 
 
+class LLMReplayRecord(Base, TimestampMixin):
+    """LLM 决策回放记录 (按提示词哈希 + 模型唯一，用于回测和回归测试离线重放)"""
+    __tablename__ = "llm_replay_records"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_hash = Column(String(64), nullable=False)    # 提示词哈希
+    model = Column(String(100), nullable=False)         # 使用的模型
+    as_of = Column(String(10), index=True)              # 决策所依据行情的日期 (YYYY-MM-DD)，回测按此回放
+    messages = Column(JSON)                             # 完整提示消息
+    response = Column(Text)                             # 模型原始响应
+    result = Column(JSON)                               # 解析后的 AnalysisResult
+    tokens_used = Column(Integer, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("prompt_hash", "model", name="uq_llm_replay_prompt_model"),
+    )
+
+
+class LLMCacheEntry(Base):
+    """LLM 响应缓存条目 (SQLite 二级缓存，按提示词哈希)"""
+    __tablename__ = "llm_cache_entries"
+    
+    key = Column(String(64), primary_key=True)          # 提示词哈希
+    value = Column(JSON, nullable=False)                # 解析后的 AnalysisResult
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 class SystemLog(Base, TimestampMixin):
     """系统日志"""
     __tablename__ = "system_logs"
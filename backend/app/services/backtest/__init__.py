@@ -0,0 +1,35 @@
+"""
+Lumina 明见量化 - 回测模块
+"""
+from app.services.backtest.panel import Panel, load_panel
+from app.services.backtest.engine import (
+    BacktestEngine,
+    BacktestResult,
+    BarContext,
+    Strategy,
+    MovingAverageCrossStrategy
+)
+from app.services.backtest.llm_replay import LLMReplayStrategy
+from app.services.backtest.sweep import (
+    SweepRunner,
+    grid_search,
+    random_search,
+    walk_forward_windows,
+    write_results
+)
+
+__all__ = [
+    "Panel",
+    "load_panel",
+    "BacktestEngine",
+    "BacktestResult",
+    "BarContext",
+    "Strategy",
+    "MovingAverageCrossStrategy",
+    "LLMReplayStrategy",
+    "SweepRunner",
+    "grid_search",
+    "random_search",
+    "walk_forward_windows",
+    "write_results"
+]
@@ -0,0 +1,333 @@
+"""
+Lumina 明见量化 - 回测引擎
+逐根 K 线回放历史行情，由策略生成订单，在以 NumPy 数组记账的模拟账户上按与模拟交易相同的规则撮合：
+佣金 / 最低佣金 / 印花税、整手交易、单只股票最大持仓比例、最大持股数量、T+1，
+并在每根 K 线按止损 / 止盈规则强制卖出 (与实盘风控监控相同)。
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.backtest.panel import Panel
+from app.services.kline.indicators import sma
+from app.services.trading.rules import TradingRules, trading_rules
+
+
+# 订单: (股票下标数组, 数量数组)，数量为正表示买入、为负表示卖出
+Orders = Tuple[np.ndarray, np.ndarray]
+
+TRADE_DTYPE = np.dtype([
+    ("bar", "<i8"),
+    ("symbol", "<i8"),
+    ("quantity", "<i8"),        # 正为买入，负为卖出
+    ("price", "<f8"),
+    ("fee", "<f8"),
+    ("realized_pnl", "<f8"),
+    ("exit", "<i1"),            # 0 策略订单，1 止损，2 止盈
+])
+
+EXIT_REASONS = {0: "strategy", 1: "stop_loss", 2: "take_profit"}
+
+TRADING_DAYS = 252
+
+
+@dataclass
+class BarContext:
+    """策略在每根 K 线看到的账户与行情状态 (数组均为只读视图)"""
+    t: int
+    panel: Panel
+    price: np.ndarray        # 当前成交价 (停牌为 NaN)
+    cash: float
+    total_value: float
+    quantity: np.ndarray     # 持仓数量
+    avg_cost: np.ndarray     # 持仓成本
+    can_sell: np.ndarray     # T+1: 是否可卖出
+    holdings: int            # 当前持股数量
+    rules: TradingRules
+
+    @property
+    def date(self) -> np.datetime64:
+        return self.panel.dates[self.t]
+
+
+class Strategy:
+    """
+    回测策略基类
+
+    prepare 在回测开始前调用一次，可对整个 (股票 × 时间) 矩阵做向量化预计算；
+    on_bar 每根 K 线调用一次，返回本根 K 线的订单。
+    """
+
+    def prepare(self, panel: Panel):
+        pass
+
+    def on_bar(self, ctx: BarContext) -> Optional[Orders]:
+        raise NotImplementedError
+
+
+@dataclass
+class BacktestResult:
+    """回测结果"""
+    dates: np.ndarray
+    equity: np.ndarray
+    cash: np.ndarray
+    trades: np.ndarray
+    symbols: List[str]
+    initial_capital: float
+    rejected: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        """收益率、年化收益、最大回撤、夏普比率、交易统计"""
+        if not len(self.equity):
+            return {}
+
+        equity = self.equity
+        returns = np.diff(equity, prepend=self.initial_capital) / np.concatenate([[self.initial_capital], equity[:-1]])
+        total_return = equity[-1] / self.initial_capital - 1
+        years = len(equity) / TRADING_DAYS
+        peak = np.maximum.accumulate(np.concatenate([[self.initial_capital], equity]))[1:]
+        std = returns.std()
+        sells = self.trades[self.trades["quantity"] < 0]
+
+        return {
+            "total_return": float(total_return),
+            "annual_return": float((1 + total_return) ** (1 / years) - 1) if years > 0 and total_return > -1 else -1.0,
+            "max_drawdown": float((1 - equity / peak).max()),
+            "sharpe": float(returns.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else 0.0,
+            "trades": int(len(self.trades)),
+            "win_rate": float((sells["realized_pnl"] > 0).mean()) if len(sells) else 0.0,
+            "fees": float(self.trades["fee"].sum()),
+            "final_value": float(equity[-1]),
+        }
+
+    def trade_records(self) -> List[Dict]:
+        """交易明细"""
+        return [
+            {
+                "date": str(self.dates[t["bar"]]),
+                "symbol": self.symbols[t["symbol"]],
+                "action": "buy" if t["quantity"] > 0 else "sell",
+                "quantity": int(abs(t["quantity"])),
+                "price": float(t["price"]),
+                "fee": float(t["fee"]),
+                "realized_pnl": float(t["realized_pnl"]),
+                "reason": EXIT_REASONS[int(t["exit"])],
+            }
+            for t in self.trades
+        ]
+
+    def to_dict(self) -> Dict:
+        return {
+            "metrics": self.metrics,
+            "rejected": self.rejected,
+            "equity_curve": [
+                {"date": str(d), "total_value": float(v), "cash": float(c)}
+                for d, v, c in zip(self.dates, self.equity, self.cash)
+            ],
+            "trades": self.trade_records(),
+        }
+
+
+class BacktestEngine:
+    """事件驱动回测引擎 (NumPy 账本)"""
+
+    def __init__(
+        self,
+        initial_capital: Optional[float] = None,
+        rules: Optional[TradingRules] = None,
+        fill: str = "close",
+        decision_interval: int = 1,
+        risk_exits: bool = True
+    ):
+        """
+        Args:
+            initial_capital: 初始资金，默认取配置
+            rules: 交易规则，默认与模拟交易相同
+            fill: 成交价字段 (close 为当根收盘价，open 为当根开盘价)
+            decision_interval: 策略决策间隔 (K 线根数)，止损止盈仍每根检查
+            risk_exits: 是否按止损 / 止盈比例强制卖出
+        """
+        self.initial_capital = initial_capital or settings.initial_capital
+        self.rules = rules or trading_rules
+        self.fill = fill
+        self.decision_interval = max(1, int(decision_interval))
+        self.risk_exits = risk_exits
+
+    def run(self, panel: Panel, strategy: Strategy) -> BacktestResult:
+        """运行回测"""
+        rules = self.rules
+        n, steps = panel.shape
+        fill_prices = getattr(panel, self.fill)
+        days = panel.dates.astype("int64")
+
+        # 账本
+        cash = float(self.initial_capital)
+        quantity = np.zeros(n, dtype=np.int64)
+        avg_cost = np.zeros(n)
+        last_buy_day = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+        mark = np.zeros(n)  # 最近有效收盘价 (停牌沿用)
+        profit_taken = np.zeros(n, dtype=bool)  # 本轮持仓是否已止盈
+        holdings = 0
+
+        equity = np.empty(steps)
+        cash_curve = np.empty(steps)
+        trades: List[Tuple] = []
+        rejected: Dict[str, int] = {}
+
+        def reject(reason: str):
+            rejected[reason] = rejected.get(reason, 0) + 1
+
+        strategy.prepare(panel)
+        quantity_view, cost_view = quantity.view(), avg_cost.view()
+        quantity_view.flags.writeable = False
+        cost_view.flags.writeable = False
+
+        for t in range(steps):
+            close = panel.close[:, t]
+            np.copyto(mark, close, where=~np.isnan(close))
+            price = fill_prices[:, t]
+            day = days[t]
+            total_value = cash + float(quantity @ mark)
+
+            can_sell = (quantity > 0) & (last_buy_day < day)
+
+            # 止损止盈：不经过策略，按当根价格强制卖出
+            exits = np.zeros(0, dtype=np.int64)
+            exit_kind = np.zeros(n, dtype=np.int8)
+            if self.risk_exits and holdings:
+                stop, take = rules.exit_signals(price, avg_cost)
+                exit_qty = rules.exit_quantities(quantity, stop & can_sell, take & can_sell, profit_taken)
+                exit_kind[exit_qty > 0] = np.where(stop[exit_qty > 0], 1, 2)
+                exits = np.flatnonzero(exit_kind)
+                can_sell = can_sell & (exit_kind == 0)
+
+            orders = None
+            if t % self.decision_interval == 0:
+                ctx = BarContext(
+                    t=t, panel=panel, price=price, cash=cash, total_value=total_value,
+                    quantity=quantity_view, avg_cost=cost_view, can_sell=can_sell,
+                    holdings=holdings, rules=rules
+                )
+                orders = strategy.on_bar(ctx)
+            if len(exits):
+                exit_orders = (exits, -exit_qty[exits])
+                if orders is None or not len(orders[0]):
+                    orders = exit_orders
+                else:
+                    # 已触发止损止盈的股票忽略策略订单
+                    idx, qty = (np.asarray(a) for a in orders)
+                    keep = exit_kind[idx] == 0
+                    orders = (np.concatenate([exits, idx[keep]]), np.concatenate([exit_orders[1], qty[keep]]))
+
+            if orders is not None and len(orders[0]):
+                idx, qty = (np.asarray(a) for a in orders)
+                # 先卖后买，卖出释放的资金可用于同根 K 线的买入
+                order = np.argsort(qty, kind="stable")
+                for i, q in zip(idx[order].tolist(), qty[order].tolist()):
+                    p = price[i]
+                    if q == 0:
+                        continue
+                    if np.isnan(p) or p <= 0:
+                        reject("suspended")
+                        continue
+
+                    if q < 0:
+                        q = -q
+                        if quantity[i] == 0:
+                            reject("no_position")
+                            continue
+                        if last_buy_day[i] >= day:
+                            reject("t_plus_1")
+                            continue
+                        if quantity[i] < q:
+                            reject("insufficient_position")
+                            continue
+                        _, commission, stamp_duty, net_income = rules.sell_proceeds(p, q)
+                        realized = (p - avg_cost[i]) * q - commission - stamp_duty
+                        cash += net_income
+                        quantity[i] -= q
+                        if exit_kind[i] == 2:
+                            profit_taken[i] = True
+                        if quantity[i] == 0:
+                            avg_cost[i] = 0.0
+                            profit_taken[i] = False
+                            holdings -= 1
+                        trades.append((t, i, -q, p, commission + stamp_duty, realized, exit_kind[i]))
+                        continue
+
+                    q = q // rules.lot_size * rules.lot_size
+                    if q <= 0:
+                        reject("lot_size")
+                        continue
+                    amount, commission, total_cost = rules.buy_cost(p, q)
+                    if cash < total_cost:
+                        q = rules.affordable_quantity(cash, p)
+                        if q <= 0:
+                            reject("insufficient_cash")
+                            continue
+                        amount, commission, total_cost = rules.buy_cost(p, q)
+                    if amount > rules.max_position_value(total_value):
+                        reject("max_position_ratio")
+                        continue
+                    if quantity[i] == 0 and holdings >= rules.max_holdings:
+                        reject("max_holdings")
+                        continue
+
+                    if quantity[i] == 0:
+                        holdings += 1
+                    avg_cost[i] = (avg_cost[i] * quantity[i] + p * q) / (quantity[i] + q)
+                    quantity[i] += q
+                    last_buy_day[i] = day
+                    cash -= total_cost
+                    trades.append((t, i, q, p, commission, 0.0, 0))
+
+            equity[t] = cash + float(quantity @ mark)
+            cash_curve[t] = cash
+
+        return BacktestResult(
+            dates=panel.dates,
+            equity=equity,
+            cash=cash_curve,
+            trades=np.array(trades, dtype=TRADE_DTYPE),
+            symbols=panel.symbols,
+            initial_capital=self.initial_capital,
+            rejected=rejected
+        )
+
+
+class MovingAverageCrossStrategy(Strategy):
+    """均线交叉策略：快线上穿慢线买入，下穿卖出"""
+
+    def __init__(self, fast: int = 5, slow: int = 20, position_ratio: Optional[float] = None):
+        self.fast = fast
+        self.slow = slow
+        self.position_ratio = position_ratio
+
+    def prepare(self, panel: Panel):
+        fast, slow = sma(panel.close, self.fast), sma(panel.close, self.slow)
+        above = fast > slow
+        prev = np.concatenate([np.zeros((above.shape[0], 1), dtype=bool), above[:, :-1]], axis=1)
+        valid = ~np.isnan(slow)
+        self.golden = above & ~prev & valid
+        self.death = ~above & prev & valid
+
+    def on_bar(self, ctx: BarContext) -> Optional[Orders]:
+        t = ctx.t
+        sell = np.flatnonzero(self.death[:, t] & ctx.can_sell)
+        buy = np.flatnonzero(self.golden[:, t] & (ctx.quantity == 0))
+        if not len(sell) and not len(buy):
+            return None
+
+        ratio = self.position_ratio or ctx.rules.max_position_ratio
+        budget = ctx.total_value * ratio
+        lot = ctx.rules.lot_size
+        with np.errstate(invalid="ignore", divide="ignore"):
+            buy_qty = np.nan_to_num(np.floor(budget / ctx.price[buy] / lot)) * lot
+
+        return (
+            np.concatenate([sell, buy]),
+            np.concatenate([-ctx.quantity[sell], buy_qty.astype(np.int64)])
+        )
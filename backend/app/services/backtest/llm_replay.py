@@ -0,0 +1,105 @@
+"""
+Lumina 明见量化 - LLM 决策回放策略
+回测前一次性从录制存储 (llm_replay_records) 读取区间内的 LLM 交易决策，按 (股票, 决策日期) 映射到面板的时间下标，
+回测时 on_bar 只查表返回订单，不访问网络也不调用模型。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.backtest.engine import BarContext, Orders, Strategy
+from app.services.backtest.panel import Panel
+from app.services.kline.columnar_store import DateLike, to_day
+from app.services.llm.replay import ReplayStore
+
+
+def _iso(value: DateLike) -> Optional[str]:
+    if value is None:
+        return None
+    return str(np.datetime64(to_day(value), "D"))
+
+
+class LLMReplayStrategy(Strategy):
+    """
+    回放录制的 LLM 决策
+
+    决策在其日期 (非交易日顺延到下一交易日) 的 K 线上执行，同一股票同一天有多次决策时以最后一次为准；
+    卖出数量为 0 或超过持仓时卖出全部持仓。引擎的 decision_interval 应为 1，否则间隔内的决策会被跳过。
+    """
+
+    def __init__(self, decisions: Sequence[Dict[str, Any]], min_confidence: float = 0.0):
+        """
+        Args:
+            decisions: ReplayStore.decisions 返回的决策列表
+            min_confidence: 忽略置信度低于该值的决策
+        """
+        self.decisions = [d for d in decisions if d.get("confidence", 0.0) >= min_confidence]
+        self._orders: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}  # 时间下标 -> (股票下标, 方向, 数量)
+        self.skipped = 0  # 面板中没有对应股票或日期超出面板范围的决策
+
+    @classmethod
+    async def load(
+        cls,
+        panel: Optional[Panel] = None,
+        start_date: DateLike = None,
+        end_date: DateLike = None,
+        model: Optional[str] = None,
+        store: Optional[ReplayStore] = None,
+        **kwargs
+    ) -> "LLMReplayStrategy":
+        """
+        从录制存储读取决策 (在回测前调用，回测过程本身是同步的)
+
+        Args:
+            panel: 回测面板，指定时只读取面板内股票、面板日期区间内的决策
+            start_date / end_date: 决策日期区间，默认取面板的首尾日期
+            model: 只回放该模型的录制
+            store: 录制存储，默认数据库表
+        """
+        if panel is not None and len(panel.dates):
+            start_date = start_date if start_date is not None else panel.dates[0]
+            end_date = end_date if end_date is not None else panel.dates[-1]
+        decisions = await (store or ReplayStore()).decisions(
+            start_date=_iso(start_date),
+            end_date=_iso(end_date),
+            model=model,
+            symbols=panel.symbols if panel is not None else None
+        )
+        return cls(decisions, **kwargs)
+
+    def prepare(self, panel: Panel):
+        days = panel.dates.astype("int64")
+        index = {symbol: i for i, symbol in enumerate(panel.symbols)}
+
+        # (时间下标, 股票下标) -> (买卖方向, 数量)，后出现的决策覆盖先前的
+        latest: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self.skipped = 0
+        for d in self.decisions:
+            i = index.get(d["symbol"])
+            t = int(np.searchsorted(days, to_day(d["as_of"]), side="left"))
+            if i is None or t >= len(days) or d["action"] not in ("buy", "sell"):
+                self.skipped += 1
+                continue
+            latest[(t, i)] = (1 if d["action"] == "buy" else -1, max(int(d["quantity"]), 0))
+
+        by_bar: Dict[int, List[Tuple[int, int, int]]] = {}
+        for (t, i), (side, quantity) in latest.items():
+            by_bar.setdefault(t, []).append((i, side, quantity))
+        self._orders = {
+            t: tuple(np.array(column, dtype=np.int64) for column in zip(*rows))
+            for t, rows in by_bar.items()
+        }
+
+    def on_bar(self, ctx: BarContext) -> Optional[Orders]:
+        orders = self._orders.get(ctx.t)
+        if orders is None:
+            return None
+
+        idx, side, quantity = orders
+        held = ctx.quantity[idx]
+        sell = side < 0
+        # 卖出数量为 0 或超过持仓时卖出全部
+        sell_qty = np.where((quantity == 0) | (quantity > held), held, quantity)
+        qty = np.where(sell, -sell_qty, quantity)
+        keep = qty != 0
+        return idx[keep], qty[keep]
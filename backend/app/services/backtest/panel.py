@@ -0,0 +1,86 @@
+"""
+Lumina 明见量化 - 回测行情面板
+将列式存储中多只股票的 K 线按日期对齐为 (股票 × 时间) 矩阵，停牌或未上市的位置为 NaN
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.kline.columnar_store import ColumnarKlineStore, kline_store, to_day, DateLike
+
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+@dataclass
+class Panel:
+    """按日期对齐的多股票 K 线矩阵"""
+    symbols: List[str]
+    dates: np.ndarray                  # datetime64[D]，长度 T
+    open: np.ndarray                   # (N × T)
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    names: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def slice(self, start: int, stop: int) -> "Panel":
+        """按时间下标截取 (视图，不复制数据)"""
+        return Panel(
+            symbols=self.symbols,
+            dates=self.dates[start:stop],
+            names=self.names,
+            **{name: getattr(self, name)[:, start:stop] for name in PRICE_FIELDS}
+        )
+
+    def date_index(self, value: DateLike, side: str = "left") -> int:
+        """日期对应的时间下标"""
+        return int(np.searchsorted(self.dates.astype("int64"), to_day(value), side=side))
+
+
+def load_panel(
+    symbols: Optional[List[str]] = None,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    period: str = "daily",
+    store: Optional[ColumnarKlineStore] = None
+) -> Panel:
+    """
+    从列式存储加载回测面板
+
+    Args:
+        symbols: 股票列表，默认存储中的全部股票
+        start_date: 开始日期
+        end_date: 结束日期
+        period: K 线周期
+        store: 列式存储，默认全局存储
+    """
+    store = store or kline_store
+    symbols = list(symbols) if symbols is not None else store.symbols(period)
+
+    frames = {}
+    for symbol in symbols:
+        arrays = store.read(symbol, period, start_date, end_date)
+        if arrays and len(arrays["date"]):
+            frames[symbol] = arrays
+    symbols = [s for s in symbols if s in frames]
+
+    if not frames:
+        empty = np.empty((0, 0))
+        return Panel(symbols=[], dates=np.array([], dtype="datetime64[D]"), **{f: empty for f in PRICE_FIELDS})
+
+    # 全部交易日并集
+    days = np.unique(np.concatenate([frames[s]["date"].view("int64") for s in symbols]))
+    matrices = {name: np.full((len(symbols), len(days)), np.nan) for name in PRICE_FIELDS}
+    for i, symbol in enumerate(symbols):
+        arrays = frames[symbol]
+        columns = np.searchsorted(days, arrays["date"].view("int64"))
+        for name in PRICE_FIELDS:
+            matrices[name][i, columns] = arrays[name]
+
+    return Panel(symbols=symbols, dates=days.view("datetime64[D]"), **matrices)
@@ -0,0 +1,283 @@
+"""
+Lumina 明见量化 - 参数扫描与滚动前进回测
+在进程池中并行运行大量回测：父进程将对齐后的行情面板写为 .npy 文件，子进程以只读内存映射打开，
+各进程共享操作系统页缓存中的同一份数据；支持网格搜索、随机搜索和滚动前进 (walk-forward) 窗口，结果写出为 CSV。
+"""
+import csv
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from app.services.backtest.engine import BacktestEngine, MovingAverageCrossStrategy, Strategy
+from app.services.backtest.panel import Panel, PRICE_FIELDS
+from app.services.trading.rules import TradingRules, trading_rules
+
+
+# 交易规则参数与回测引擎参数，其余参数传给策略
+RULE_PARAMS = tuple(f.name for f in fields(TradingRules))
+ENGINE_PARAMS = ("initial_capital", "decision_interval", "fill", "risk_exits")
+
+# 时间窗口: (开始下标, 结束下标)
+Window = Tuple[int, int]
+
+
+# ========== 参数空间 ==========
+
+def grid_search(space: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """网格搜索：参数取值的笛卡尔积"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_search(
+    space: Dict[str, Union[Sequence[Any], Tuple[float, float]]],
+    n_iter: int,
+    seed: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    随机搜索
+
+    Args:
+        space: 参数空间；列表表示离散取值，(low, high) 元组表示均匀分布区间 (两端均为整数时取整数)
+        n_iter: 采样次数
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(n_iter):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple) and len(values) == 2:
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    config[name] = rng.randint(low, high)
+                else:
+                    config[name] = rng.uniform(low, high)
+            else:
+                config[name] = rng.choice(list(values))
+        configs.append(config)
+    return configs
+
+
+def walk_forward_windows(
+    length: int,
+    train: int,
+    test: int,
+    step: Optional[int] = None
+) -> List[Tuple[Window, Window]]:
+    """
+    滚动前进窗口
+
+    Args:
+        length: K 线总数
+        train: 样本内 (训练) 长度
+        test: 样本外 (检验) 长度
+        step: 窗口滚动步长，默认等于 test
+
+    Returns:
+        [((训练开始, 训练结束), (检验开始, 检验结束)), ...]
+    """
+    step = step or test
+    windows = []
+    start = 0
+    while start + train + test <= length:
+        windows.append(((start, start + train), (start + train, start + train + test)))
+        start += step
+    return windows
+
+
+# ========== 共享行情面板 ==========
+
+def share_panel(panel: Panel, directory: Union[str, Path]) -> Path:
+    """将行情面板写为 .npy 文件供子进程内存映射"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in PRICE_FIELDS:
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(getattr(panel, name)))
+    np.save(directory / "dates.npy", panel.dates.astype("int64"))
+    with open(directory / "symbols.json", "w", encoding="utf-8") as f:
+        json.dump(panel.symbols, f)
+    return directory
+
+
+def open_shared_panel(directory: Union[str, Path]) -> Panel:
+    """以只读内存映射打开共享的行情面板"""
+    directory = Path(directory)
+    with open(directory / "symbols.json", "r", encoding="utf-8") as f:
+        symbols = json.load(f)
+    return Panel(
+        symbols=symbols,
+        dates=np.load(directory / "dates.npy").view("datetime64[D]"),
+        **{name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in PRICE_FIELDS}
+    )
+
+
+def default_strategy(params: Dict[str, Any]) -> Strategy:
+    """默认策略工厂：均线交叉 (参数 fast / slow)"""
+    return MovingAverageCrossStrategy(**params)
+
+
+# 子进程中打开的面板
+_worker_panel: Optional[Panel] = None
+
+
+def _init_worker(directory: str):
+    global _worker_panel
+    _worker_panel = open_shared_panel(directory)
+
+
+def run_config(
+    panel: Panel,
+    params: Dict[str, Any],
+    window: Optional[Window] = None,
+    strategy_factory: Callable[[Dict[str, Any]], Strategy] = default_strategy,
+    base_rules: TradingRules = trading_rules
+) -> Dict[str, Any]:
+    """按一组参数在指定时间窗口上运行回测，返回指标"""
+    rule_params = {k: v for k, v in params.items() if k in RULE_PARAMS}
+    engine_params = {k: v for k, v in params.items() if k in ENGINE_PARAMS}
+    strategy_params = {k: v for k, v in params.items() if k not in RULE_PARAMS and k not in ENGINE_PARAMS}
+
+    if window is not None:
+        panel = panel.slice(*window)
+    engine = BacktestEngine(rules=replace(base_rules, **rule_params), **engine_params)
+    result = engine.run(panel, strategy_factory(strategy_params))
+    return result.metrics
+
+
+def _run_job(job: Tuple[Dict[str, Any], Optional[Window], Callable, TradingRules]) -> Dict[str, Any]:
+    params, window, strategy_factory, base_rules = job
+    return run_config(_worker_panel, params, window, strategy_factory, base_rules)
+
+
+class SweepRunner:
+    """并行参数扫描"""
+
+    def __init__(
+        self,
+        panel: Panel,
+        strategy_factory: Callable[[Dict[str, Any]], Strategy] = default_strategy,
+        processes: Optional[int] = None,
+        base_rules: Optional[TradingRules] = None
+    ):
+        """
+        Args:
+            panel: 行情面板
+            strategy_factory: 由策略参数创建策略的函数 (需可被子进程导入，不能是 lambda)
+            processes: 进程数，默认 CPU 核数
+            base_rules: 未被扫描覆盖的交易规则，默认与模拟交易相同
+        """
+        self.panel = panel
+        self.strategy_factory = strategy_factory
+        self.processes = processes or os.cpu_count() or 1
+        self.base_rules = base_rules or trading_rules
+
+    def run(
+        self,
+        configs: Iterable[Dict[str, Any]],
+        windows: Optional[Sequence[Optional[Window]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        在每个时间窗口上运行每组参数
+
+        Returns:
+            结果行列表 (参数 + 窗口 + 指标)
+        """
+        configs = list(configs)
+        windows = list(windows) if windows else [None]
+        pairs = [(params, window) for window in windows for params in configs]
+        logger.info(f"参数扫描: {len(configs)} 组参数 × {len(windows)} 个窗口, {self.processes} 个进程")
+        return [
+            {**params, **self._window_columns(window), **metrics}
+            for (params, window), metrics in zip(pairs, self.run_pairs(pairs))
+        ]
+
+    def walk_forward(
+        self,
+        configs: Iterable[Dict[str, Any]],
+        train: int,
+        test: int,
+        step: Optional[int] = None,
+        metric: str = "sharpe"
+    ) -> List[Dict[str, Any]]:
+        """
+        滚动前进优化：在每个训练窗口选出 metric 最优的参数，再在紧随其后的检验窗口评估
+
+        Returns:
+            每个窗口一行 (最优参数 + 样本内指标 + 样本外指标，样本外指标带 oos_ 前缀)
+        """
+        configs = list(configs)
+        windows = walk_forward_windows(self.panel.shape[1], train, test, step)
+        if not windows or not configs:
+            return []
+
+        in_sample = self.run(configs, [train_window for train_window, _ in windows])
+        best = []
+        for i, (train_window, test_window) in enumerate(windows):
+            rows = in_sample[i * len(configs):(i + 1) * len(configs)]
+            index = max(range(len(rows)), key=lambda k: rows[k].get(metric, float("-inf")))
+            best.append((configs[index], rows[index], test_window))
+
+        out_of_sample = self.run_pairs([(params, window) for params, _, window in best])
+        results = []
+        for (params, train_row, test_window), oos in zip(best, out_of_sample):
+            row = dict(train_row)
+            row.update(self._window_columns(test_window, prefix="test"))
+            row.update({f"oos_{k}": v for k, v in oos.items()})
+            results.append(row)
+        return results
+
+    def run_pairs(self, pairs: Sequence[Tuple[Dict[str, Any], Optional[Window]]]) -> List[Dict[str, Any]]:
+        """在进程池中运行 (参数, 窗口) 对，返回各自的指标"""
+        if not pairs:
+            return []
+
+        jobs = [(params, window, self.strategy_factory, self.base_rules) for params, window in pairs]
+        processes = min(self.processes, len(jobs))
+        directory = tempfile.mkdtemp(prefix="lumina-sweep-")
+        try:
+            share_panel(self.panel, directory)
+            with ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=_init_worker,
+                initargs=(directory,)
+            ) as executor:
+                return list(executor.map(_run_job, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _window_columns(self, window: Optional[Window], prefix: str = "window") -> Dict[str, Any]:
+        if window is None:
+            return {}
+        start, stop = window
+        dates = self.panel.dates
+        return {
+            f"{prefix}_start": str(dates[start]) if start < len(dates) else None,
+            f"{prefix}_end": str(dates[stop - 1]) if 0 < stop <= len(dates) else None
+        }
+
+
+def write_results(rows: List[Dict[str, Any]], path: Union[str, Path]) -> Path:
+    """将结果行写为 CSV"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    columns: List[str] = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
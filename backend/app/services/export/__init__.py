@@ -0,0 +1,38 @@
+"""
+Lumina 明见量化 - 数据导出与响应编码模块
+"""
+from app.services.export.arrow import (
+    ARROW_STREAM,
+    PARQUET,
+    ArrowUnavailableError,
+    attachment,
+    encode as encode_columnar,
+    negotiate
+)
+from app.services.export.streaming import (
+    NDJSON,
+    aiter_encoded,
+    encode_json,
+    encode_stream,
+    frame_columns,
+    parse_fields,
+    project,
+    wants_ndjson
+)
+
+__all__ = [
+    "ARROW_STREAM",
+    "PARQUET",
+    "ArrowUnavailableError",
+    "attachment",
+    "encode_columnar",
+    "negotiate",
+    "NDJSON",
+    "aiter_encoded",
+    "encode_json",
+    "encode_stream",
+    "frame_columns",
+    "parse_fields",
+    "project",
+    "wants_ndjson"
+]
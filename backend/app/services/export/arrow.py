@@ -0,0 +1,125 @@
+"""
+Lumina 明见量化 - Arrow / Parquet 导出
+将列式数据 (NumPy 列数组或列表) 直接构建为 Arrow 表，编码为 Arrow IPC 流或 Parquet，
+研究端可按列批量读取历史 K 线、订单和盈亏记录，不经过逐行的 Python 对象。
+依赖可选的 pyarrow，未安装时请求这两种格式会得到 406。
+"""
+import io
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+# format 参数 / Accept 媒体类型 -> 响应媒体类型
+FORMATS: Dict[str, str] = {
+    "arrow": ARROW_STREAM,
+    "parquet": PARQUET,
+}
+MEDIA_TYPES: Dict[str, str] = {
+    ARROW_STREAM: ARROW_STREAM,
+    "application/vnd.apache.arrow.file": ARROW_STREAM,
+    PARQUET: PARQUET,
+    "application/x-parquet": PARQUET,
+}
+
+# Python 类型 -> Arrow 类型名 (指定字段类型时使用)
+ARROW_TYPES = {
+    int: "int64",
+    float: "float64",
+    bool: "bool_",
+    str: "string",
+    datetime: "timestamp_us",
+    date: "date32",
+}
+
+# 下载文件扩展名
+EXTENSIONS = {ARROW_STREAM: "arrows", PARQUET: "parquet"}
+
+
+class ArrowUnavailableError(ImportError):
+    """pyarrow 未安装"""
+
+
+def negotiate(accept: Optional[str], format: Optional[str] = None) -> Optional[str]:
+    """
+    按 format 参数或 Accept 头协商列式格式
+
+    Returns:
+        Arrow / Parquet 媒体类型，未请求列式格式时返回 None
+    """
+    if format:
+        return FORMATS.get(format.lower())
+    if not accept:
+        return None
+    for part in accept.split(","):
+        media_type = MEDIA_TYPES.get(part.split(";")[0].strip().lower())
+        if media_type:
+            return media_type
+    return None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ArrowUnavailableError("pyarrow 未安装，不支持 Arrow / Parquet 导出")
+    return pyarrow
+
+
+def _arrow_type(pa, py_type: type):
+    name = ARROW_TYPES.get(py_type)
+    if name == "timestamp_us":
+        return pa.timestamp("us")
+    return getattr(pa, name)() if name else None
+
+
+def to_table(columns: Dict[str, Sequence[Any]], types: Optional[Dict[str, type]] = None):
+    """
+    列式数据转为 Arrow 表 (浮点 NaN 转为 null)
+
+    Args:
+        columns: 字段名 -> NumPy 数组或值列表
+        types: 字段的 Python 类型，结果为空或全为 null 时仍按该类型输出
+    """
+    pa = _pyarrow()
+    arrays = {}
+    for name, values in columns.items():
+        arrow_type = _arrow_type(pa, types[name]) if types and name in types else None
+        if isinstance(values, np.ndarray):
+            arrays[name] = pa.array(values, type=arrow_type, from_pandas=True)
+        else:
+            arrays[name] = pa.array(list(values), type=arrow_type)
+    return pa.table(arrays)
+
+
+def encode(
+    columns: Dict[str, Sequence[Any]],
+    media_type: str,
+    types: Optional[Dict[str, type]] = None
+) -> bytes:
+    """
+    编码为 Arrow IPC 流或 Parquet
+
+    Raises:
+        ArrowUnavailableError: pyarrow 未安装
+    """
+    pa = _pyarrow()
+    table = to_table(columns, types)
+    sink = io.BytesIO()
+    if media_type == PARQUET:
+        pa.parquet.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+def attachment(stem: str, media_type: str) -> Dict[str, str]:
+    """下载响应头 (文件名按格式加扩展名)"""
+    return {"Content-Disposition": f'attachment; filename="{stem}.{EXTENSIONS[media_type]}"'}
@@ -0,0 +1,157 @@
+"""
+Lumina 明见量化 - 流式响应编码
+将列式数据 (NumPy 列数组) 按行批次编码为 NDJSON 或分块的 JSON 数组，
+每次只转换和编码一批行，响应的峰值内存与首字节时间不随股票数量或 K 线数量增长。
+按列批量完成 NaN 转 null 和日期格式化，编码优先使用可选的 orjson，未安装时回退到标准库 json。
+"""
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+NDJSON = "application/x-ndjson"
+
+# 列式数据: 字段名 -> 等长数组
+Columns = Dict[str, np.ndarray]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的字段列表 (为空表示全部字段)"""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    return names or None
+
+
+def wants_ndjson(accept: Optional[str], format: Optional[str] = None) -> bool:
+    """按 format 参数或 Accept 头判断是否输出 NDJSON"""
+    if format:
+        return format.lower() == "ndjson"
+    return bool(accept) and NDJSON in accept
+
+
+def project(columns: Columns, fields: Optional[Sequence[str]] = None) -> Columns:
+    """
+    字段投影
+
+    Raises:
+        ValueError: 请求了不存在的字段
+    """
+    if not fields:
+        return columns
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    return {name: columns[name] for name in fields}
+
+
+def frame_columns(df: pd.DataFrame) -> Columns:
+    """DataFrame 转为列数组 (不复制数据)"""
+    return {str(name): df[name].to_numpy() for name in df.columns}
+
+
+def column_length(columns: Columns) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def to_list(values: np.ndarray) -> List[Any]:
+    """数组转为可 JSON 编码的列表 (NaN / NaT 转为 null，日期格式化为 YYYY-MM-DD)"""
+    if values.dtype.kind == "M":
+        text = np.datetime_as_string(values, unit="D")
+        return np.where(np.isnat(values), None, text).tolist()
+    if values.dtype.kind == "f":
+        return np.where(np.isnan(values), None, values).tolist()
+    if values.dtype.kind == "O":
+        return [None if isinstance(v, float) and v != v else v for v in values.tolist()]
+    return values.tolist()
+
+
+def to_rows(columns: Columns) -> List[Dict[str, Any]]:
+    """列式数据转为行字典列表 (逐列转换后按行拼装)"""
+    names = list(columns)
+    lists = [to_list(np.asarray(columns[name])) for name in names]
+    return [dict(zip(names, row)) for row in zip(*lists)]
+
+
+def iter_rows(columns: Columns, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """按批次生成行字典列表"""
+    for start in range(0, column_length(columns), batch_size):
+        yield to_rows({name: values[start:start + batch_size] for name, values in columns.items()})
+
+
+def dumps(value: Any) -> bytes:
+    """JSON 编码为 UTF-8 字节 (优先 orjson)"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def encode_json(columns: Columns) -> bytes:
+    """列式数据一次性编码为 JSON 数组"""
+    return dumps(to_rows(columns))
+
+
+def iter_ndjson(chunks: Iterable[Columns], batch_size: int = 1000) -> Iterator[bytes]:
+    """NDJSON: 每行一个 JSON 对象"""
+    for columns in chunks:
+        for rows in iter_rows(columns, batch_size):
+            yield b"\n".join(dumps(row) for row in rows) + b"\n"
+
+
+def _array_body(chunks: Iterable[Columns], batch_size: int) -> Iterator[bytes]:
+    """JSON 数组元素部分 (不含方括号，批次之间以逗号分隔)"""
+    first = True
+    for columns in chunks:
+        for rows in iter_rows(columns, batch_size):
+            if not rows:
+                continue
+            body = b",".join(dumps(row) for row in rows)
+            yield body if first else b"," + body
+            first = False
+
+
+def iter_json_array(chunks: Iterable[Columns], batch_size: int = 1000) -> Iterator[bytes]:
+    """分块输出的 JSON 数组 (与一次性返回的 JSON 数组内容相同)"""
+    yield b"["
+    yield from _array_body(chunks, batch_size)
+    yield b"]"
+
+
+async def aiter_encoded(
+    chunks: AsyncIterable[Columns],
+    ndjson: bool,
+    batch_size: int = 1000
+) -> AsyncIterator[bytes]:
+    """异步逐块产生列式数据时的流式编码 (如逐只股票读取历史)"""
+    if not ndjson:
+        yield b"["
+    first = True
+    async for columns in chunks:
+        if ndjson:
+            for data in iter_ndjson([columns], batch_size):
+                yield data
+            continue
+        for i, data in enumerate(_array_body([columns], batch_size)):
+            # 新一块的首批数据前补逗号，块内后续批次已自带逗号
+            yield b"," + data if i == 0 and not first else data
+            first = False
+    if not ndjson:
+        yield b"]"
+
+
+def encode_stream(
+    chunks: Union[Iterable[Columns], Columns],
+    ndjson: bool,
+    batch_size: int = 1000
+) -> Iterator[bytes]:
+    """同步列式数据的流式编码"""
+    if isinstance(chunks, dict):
+        chunks = [chunks]
+    return iter_ndjson(chunks, batch_size) if ndjson else iter_json_array(chunks, batch_size)
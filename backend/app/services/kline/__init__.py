@@ -0,0 +1,15 @@
+"""
+Lumina 明见量化 - K 线存储与指标模块
+"""
+from app.services.kline.columnar_store import ColumnarKlineStore, kline_store
+from app.services.kline.indicators import IndicatorEngine, compute_indicators, indicator_engine
+from app.services.kline.history import get_history_frame
+
+__all__ = [
+    "ColumnarKlineStore",
+    "kline_store",
+    "IndicatorEngine",
+    "compute_indicators",
+    "indicator_engine",
+    "get_history_frame"
+]
@@ -0,0 +1,380 @@
+"""
+Lumina 明见量化 - 列式 K 线存储
+按 股票/周期 将 日期/开/高/低/收/量/额 分别存为连续的二进制列文件，读取时以 NumPy 内存映射零拷贝返回
+
+目录结构:
+    {root}/{period}/{symbol}/{column}.bin
+    {root}/{period}/{symbol}/meta.json   # 有效行数、更新时间、完整历史首日
+"""
+import gc
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.core.config import settings
+
+
+# 列定义 (日期以 int64 存储自 1970-01-01 起的天数，读取时视图化为 datetime64[D])
+COLUMNS: Dict[str, str] = {
+    "date": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<f8",
+    "amount": "<f8",
+}
+
+PERIODS = ("daily", "weekly", "monthly")
+
+DateLike = Union[str, date, datetime, np.datetime64, None]
+
+
+def to_day(value: DateLike) -> Optional[int]:
+    """日期转为天数 (支持 YYYYMMDD / YYYY-MM-DD / date / datetime)"""
+    if value is None:
+        return None
+    if isinstance(value, str) and len(value) == 8 and value.isdigit():
+        value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return int(np.datetime64(value, "D").astype("int64"))
+
+
+def _iso_day(day: int) -> str:
+    """天数转为 YYYY-MM-DD"""
+    return str(np.datetime64(day, "D"))
+
+
+class ColumnarKlineStore:
+    """列式内存映射 K 线存储"""
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self._maps: Dict[Tuple[str, str], Tuple[int, Dict[str, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol: str, period: str) -> Path:
+        return self.root / period / symbol
+
+    @staticmethod
+    def _aside(directory: Path) -> Path:
+        """整体重写时旧数据目录的临时位置"""
+        return directory.with_name(directory.name + ".old")
+
+    def _recover(self, directory: Path):
+        """上次整体重写在替换目录时中断：恢复旧数据目录"""
+        old = self._aside(directory)
+        if not directory.exists() and old.exists():
+            os.replace(old, directory)
+            logger.warning(f"已恢复中断重写前的 K 线数据: {directory}")
+
+    def _release(self, symbol: str, period: str):
+        """释放缓存的内存映射 (Windows 上文件被映射时无法删除、重命名或截断)"""
+        if self._maps.pop((symbol, period), None) is not None:
+            gc.collect()
+
+    def _read_meta(self, symbol: str, period: str) -> Dict:
+        self._recover(self._dir(symbol, period))
+        path = self._dir(symbol, period) / "meta.json"
+        if not path.exists():
+            return {"length": 0}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, directory: Path, length: int, history_start: Optional[str] = None):
+        meta = {
+            "length": length,
+            "columns": list(COLUMNS),
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        if history_start:
+            # 已写入数据源的完整历史 (首日)；只有日常增量追加建立的存储没有该标记
+            meta["history_start"] = history_start
+        tmp = directory / "meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, directory / "meta.json")
+
+    def length(self, symbol: str, period: str = "daily") -> int:
+        """已存储的 K 线条数"""
+        return int(self._read_meta(symbol, period).get("length", 0))
+
+    def has_history(self, symbol: str, period: str = "daily") -> bool:
+        """是否已写入完整历史 (而不只是日常增量追加的最近几根 K 线)"""
+        return bool(self._read_meta(symbol, period).get("history_start"))
+
+    # ========== 读取 ==========
+
+    def columns(self, symbol: str, period: str = "daily") -> Dict[str, np.ndarray]:
+        """
+        获取全部列的只读内存映射
+
+        Returns:
+            {列名: ndarray}，date 列为 datetime64[D]；无数据时返回空字典
+        """
+        meta = self._read_meta(symbol, period)
+        length = int(meta.get("length", 0))
+        if length <= 0:
+            return {}
+
+        key = (symbol, period)
+        cached = self._maps.get(key)
+        if cached and cached[0] == length:
+            return cached[1]
+
+        directory = self._dir(symbol, period)
+        arrays = {}
+        for name, dtype in COLUMNS.items():
+            arrays[name] = np.memmap(directory / f"{name}.bin", dtype=dtype, mode="r", shape=(length,))
+        arrays["date"] = arrays["date"].view("datetime64[D]")
+
+        self._maps[key] = (length, arrays)
+        return arrays
+
+    def read(
+        self,
+        symbol: str,
+        period: str = "daily",
+        start_date: DateLike = None,
+        end_date: DateLike = None
+    ) -> Dict[str, np.ndarray]:
+        """按日期区间读取 K 线 (返回内存映射的切片视图，不复制数据)"""
+        arrays = self.columns(symbol, period)
+        if not arrays:
+            return {}
+
+        days = arrays["date"].view("int64")
+        lo = 0 if start_date is None else int(np.searchsorted(days, to_day(start_date), side="left"))
+        hi = len(days) if end_date is None else int(np.searchsorted(days, to_day(end_date), side="right"))
+        return {name: array[lo:hi] for name, array in arrays.items()}
+
+    def read_frame(
+        self,
+        symbol: str,
+        period: str = "daily",
+        start_date: DateLike = None,
+        end_date: DateLike = None
+    ) -> pd.DataFrame:
+        """按日期区间读取为 DataFrame (列与 get_historical_data 一致)"""
+        arrays = self.read(symbol, period, start_date, end_date)
+        if not arrays:
+            return pd.DataFrame()
+
+        df = pd.DataFrame({name: array for name, array in arrays.items() if name != "date"}, copy=False)
+        df.insert(0, "date", pd.to_datetime(arrays["date"]))
+        return df
+
+    def date_range(self, symbol: str, period: str = "daily") -> Optional[Tuple[np.datetime64, np.datetime64]]:
+        """已存储的首尾日期"""
+        arrays = self.columns(symbol, period)
+        if not arrays:
+            return None
+        return arrays["date"][0], arrays["date"][-1]
+
+    def covers(
+        self,
+        symbol: str,
+        period: str = "daily",
+        start_date: DateLike = None,
+        end_date: DateLike = None
+    ) -> bool:
+        """
+        本地数据是否覆盖请求区间
+
+        未指定开始日期时，要求已写入过完整历史 (meta.json 中有 history_start)，
+        仅由日常增量追加建立的存储只有最近几根 K 线，不视为覆盖；
+        未指定结束日期时，要求最后一根 K 线就是今天，或今天收盘后已完成过更新。
+        """
+        meta = self._read_meta(symbol, period)
+        span = self.date_range(symbol, period)
+        if not span:
+            return False
+
+        first, last = (int(d.astype("int64")) for d in span)
+        if start_date is None and not meta.get("history_start"):
+            return False
+        if start_date is not None and to_day(start_date) < first:
+            return False
+        if end_date is not None:
+            return to_day(end_date) <= last
+
+        today = date.today()
+        updated_at = meta.get("updated_at") or ""
+        return last >= to_day(today) or updated_at >= f"{today.isoformat()}T15:00"
+
+    # ========== 写入 ==========
+
+    @staticmethod
+    def _normalize(data: Union[pd.DataFrame, Dict]) -> Dict[str, np.ndarray]:
+        """整理输入数据为按日期升序、日期唯一的列数组"""
+        days = np.asarray(data["date"], dtype="datetime64[D]").astype("int64")
+        arrays = {"date": days}
+        for name, dtype in COLUMNS.items():
+            if name == "date":
+                continue
+            if name in data:
+                arrays[name] = np.asarray(data[name], dtype=dtype)
+            else:
+                arrays[name] = np.zeros(len(days), dtype=dtype)
+
+        # 排序并去重 (同一日期保留最后一条)
+        order = np.argsort(days, kind="stable")
+        sorted_days = days[order]
+        keep = np.append(sorted_days[1:] != sorted_days[:-1], True) if len(days) else np.array([], dtype=bool)
+        index = order[keep]
+        return {name: array[index] for name, array in arrays.items()}
+
+    def append(
+        self,
+        symbol: str,
+        period: str,
+        data: Union[pd.DataFrame, Dict],
+        full_history: bool = False
+    ) -> int:
+        """
+        追加 K 线 (日常增量更新)
+
+        - 日期晚于已存储最后一根的行追加到列尾
+        - 与最后一根同日期的行原地覆盖 (盘中数据被收盘数据修正)
+        - 早于最后一根的行视为回补历史，整体重写
+
+        Args:
+            full_history: data 是数据源返回的完整历史 (不限开始日期)，写入后记录 history_start
+
+        Returns:
+            新增的 K 线条数
+        """
+        if data is None or len(data["date"]) == 0:
+            return 0
+
+        incoming = self._normalize(data)
+        with self._lock:
+            existing = self.columns(symbol, period)
+            if not existing:
+                self.write(symbol, period, incoming, full_history=full_history)
+                return len(incoming["date"])
+
+            history_start = self._read_meta(symbol, period).get("history_start")
+            if full_history:
+                history_start = _iso_day(min(int(existing["date"].view("int64")[0]), int(incoming["date"][0])))
+
+            existing_days = existing["date"].view("int64")
+            last_day = int(existing_days[-1])
+            new_days = incoming["date"]
+
+            if new_days[0] < last_day and not np.isin(new_days[new_days < last_day], existing_days).all():
+                # 回补历史：合并后整体重写
+                merged = {
+                    name: np.concatenate([np.asarray(existing[name]).view(COLUMNS[name]), incoming[name]])
+                    for name in COLUMNS
+                }
+                before = len(existing_days)
+                self._write(symbol, period, self._normalize(merged), history_start)
+                return self.length(symbol, period) - before
+
+            directory = self._dir(symbol, period)
+            length = len(existing_days)
+
+            same = new_days == last_day
+            if same.any():
+                self._release(symbol, period)
+                row = int(np.flatnonzero(same)[-1])
+                for name, dtype in COLUMNS.items():
+                    column = np.memmap(directory / f"{name}.bin", dtype=dtype, mode="r+", shape=(length,))
+                    column[-1] = incoming[name][row]
+                    column.flush()
+                    del column
+
+            newer = new_days > last_day
+            count = int(newer.sum())
+            if count:
+                self._release(symbol, period)
+                for name, dtype in COLUMNS.items():
+                    path = directory / f"{name}.bin"
+                    size = length * np.dtype(dtype).itemsize
+                    with open(path, "r+b") as f:
+                        # 截掉上次未完成追加可能残留的尾部数据，保证各列对齐
+                        if os.path.getsize(path) != size:
+                            f.truncate(size)
+                        f.seek(0, os.SEEK_END)
+                        f.write(np.ascontiguousarray(incoming[name][newer]).tobytes())
+            self._write_meta(directory, length + count, history_start)
+            self._maps.pop((symbol, period), None)
+            return count
+
+    def write(
+        self,
+        symbol: str,
+        period: str,
+        data: Union[pd.DataFrame, Dict],
+        full_history: bool = False
+    ):
+        """
+        整体写入 (覆盖已有数据)
+
+        新数据先完整写入临时目录，再将旧目录移到一旁、新目录替换到位，最后删除旧目录；
+        任一步骤中断时旧数据仍完整保留 (移到一旁的旧目录在下次读取时恢复)。
+
+        Args:
+            full_history: data 是数据源返回的完整历史，记录 history_start 供不限开始日期的读取判断覆盖
+        """
+        arrays = self._normalize(data)
+        history_start = _iso_day(int(arrays["date"][0])) if full_history and len(arrays["date"]) else None
+        self._write(symbol, period, arrays, history_start)
+
+    def _write(self, symbol: str, period: str, arrays: Dict[str, np.ndarray], history_start: Optional[str]):
+        directory = self._dir(symbol, period)
+        tmp = directory.with_name(directory.name + ".tmp")
+        old = self._aside(directory)
+        self._recover(directory)
+        for leftover in (tmp, old):
+            if leftover.exists():
+                shutil.rmtree(leftover, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        for name in COLUMNS:
+            arrays[name].astype(COLUMNS[name]).tofile(tmp / f"{name}.bin")
+        self._write_meta(tmp, len(arrays["date"]), history_start)
+
+        self._release(symbol, period)
+        if directory.exists():
+            try:
+                os.replace(directory, old)
+            except PermissionError:
+                # 调用方仍持有旧数据的内存映射 (Windows)，保留旧数据，本次写入作废
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        os.replace(tmp, directory)
+        # 旧目录仍被映射时删除失败，留待下次写入时清理
+        shutil.rmtree(old, ignore_errors=True)
+
+    # ========== 统计 ==========
+
+    def symbols(self, period: str = "daily") -> List[str]:
+        """已存储的股票列表"""
+        directory = self.root / period
+        if not directory.exists():
+            return []
+        return sorted(
+            p.name for p in directory.iterdir()
+            if p.is_dir() and p.suffix not in (".tmp", ".old") and (p / "meta.json").exists()
+        )
+
+    def stats(self, period: str = "daily") -> Dict[str, int]:
+        """股票数与 K 线总条数"""
+        symbols = self.symbols(period)
+        return {
+            "stocks": len(symbols),
+            "records": sum(self.length(s, period) for s in symbols)
+        }
+
+
+# 全局列式 K 线存储
+kline_store = ColumnarKlineStore(settings.kline_store_dir)
@@ -0,0 +1,46 @@
+"""
+Lumina 明见量化 - 本地 K 线历史
+从列式存储读取 K 线并附加技术指标，本地数据不足时由调用方回退到在线数据源
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.kline.columnar_store import kline_store, to_day, DateLike
+from app.services.kline.indicators import compute_indicators
+
+
+def get_history_frame(
+    symbol: str,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    period: str = "daily"
+) -> Optional[pd.DataFrame]:
+    """
+    读取本地 K 线历史 (列与 get_historical_data 一致，含技术指标)
+
+    Returns:
+        DataFrame；本地数据未覆盖请求区间时返回 None
+    """
+    if not kline_store.covers(symbol, period, start_date, end_date):
+        return None
+
+    arrays = kline_store.columns(symbol, period)
+    days = arrays["date"].view("int64")
+    lo = 0 if start_date is None else int(np.searchsorted(days, to_day(start_date), side="left"))
+    hi = len(days) if end_date is None else int(np.searchsorted(days, to_day(end_date), side="right"))
+
+    # 指标基于完整历史计算后再截取区间，避免区间起点附近的指标缺失
+    close = arrays["close"]
+    prev_close = np.concatenate([[np.nan], close[:-1]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change_pct = (close / prev_close - 1.0) * 100.0
+
+    columns = {name: array[lo:hi] for name, array in arrays.items() if name != "date"}
+    columns["change_pct"] = change_pct[lo:hi]
+    columns.update({name: values[lo:hi] for name, values in compute_indicators(close).items()})
+
+    df = pd.DataFrame(columns, copy=False)
+    df.insert(0, "date", pd.to_datetime(arrays["date"][lo:hi]))
+    return df
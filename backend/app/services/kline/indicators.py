@@ -0,0 +1,463 @@
+"""
+Lumina 明见量化 - 技术指标计算
+所有函数沿最后一个轴 (时间轴) 计算，既可用于单只股票的一维数组，也可用于 (股票 × 时间) 的二维矩阵；
+缺失值 (NaN) 不参与计算。IndicatorEngine 在此基础上维护全市场的增量指标状态。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 均线周期
+MA_WINDOWS = (5, 10, 20, 60)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均 (窗口内有缺失值时结果为 NaN)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return out
+
+    valid = ~np.isnan(values)
+    csum = np.cumsum(np.where(valid, values, 0.0), axis=-1)
+    ccount = np.cumsum(valid, axis=-1)
+
+    pad = np.zeros(values.shape[:-1] + (1,))
+    csum = np.concatenate([pad, csum], axis=-1)
+    ccount = np.concatenate([pad, ccount], axis=-1)
+
+    window_sum = csum[..., window:] - csum[..., :-window]
+    window_count = ccount[..., window:] - ccount[..., :-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[..., window - 1:] = np.where(window_count == window, window_sum / window, np.nan)
+    return out
+
+
+def smooth(values: np.ndarray, alpha: float) -> np.ndarray:
+    """指数平滑 (以第一个有效值为初值，缺失值沿用上一个平滑值)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    prev = np.full(values.shape[:-1], np.nan)
+    for t in range(values.shape[-1]):
+        x = values[..., t]
+        prev = np.where(
+            np.isnan(prev),
+            x,
+            np.where(np.isnan(x), prev, alpha * x + (1 - alpha) * prev)
+        )
+        out[..., t] = prev
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """指数移动平均"""
+    return smooth(values, 2.0 / (span + 1))
+
+
+def rsi(values: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """相对强弱指标 (Wilder 平滑)，前 period 根 K 线为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    delta = np.diff(values, axis=-1, prepend=np.nan)
+    gain = np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0))
+    loss = np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0))
+
+    avg_gain = smooth(gain, 1.0 / period)
+    avg_loss = smooth(loss, 1.0 / period)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    out = np.where(np.isnan(avg_gain) | np.isnan(avg_loss), np.nan, out)
+
+    # 有效样本不足 period 个时不输出
+    count = np.cumsum(~np.isnan(delta), axis=-1)
+    return np.where(count >= period, out, np.nan)
+
+
+def macd(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """MACD (DIF / DEA / 柱)"""
+    dif = ema(values, MACD_FAST) - ema(values, MACD_SLOW)
+    dea = ema(dif, MACD_SIGNAL)
+    return {"macd": dif, "macd_signal": dea, "macd_hist": dif - dea}
+
+
+def compute_indicators(close: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    计算全部技术指标
+
+    Returns:
+        {ma5, ma10, ma20, ma60, rsi, macd, macd_signal, macd_hist}，形状与 close 相同
+    """
+    close = np.asarray(close, dtype=np.float64)
+    result = {f"ma{window}": sma(close, window) for window in MA_WINDOWS}
+    result["rsi"] = rsi(close)
+    result.update(macd(close))
+    return result
+
+
+def _latest_valid(values: np.ndarray) -> np.ndarray:
+    """每行最后一个有效值 (整行缺失时为 NaN)"""
+    valid = ~np.isnan(values)
+    last = values.shape[-1] - 1 - np.argmax(valid[:, ::-1], axis=-1)
+    out = values[np.arange(values.shape[0]), last]
+    return np.where(valid.any(axis=-1), out, np.nan)
+
+
+class IndicatorEngine:
+    """
+    全市场技术指标引擎
+
+    - bootstrap: 对 (股票 × 时间) 收盘价矩阵一次向量化计算，得到各股票的指标状态
+    - append: 新增一根 K 线时基于保存的 EMA / RSI / 均线滑窗状态 O(1) 更新，无需回扫历史
+    - peek: 用盘中价格试算当前指标，不改变状态
+    """
+
+    RING = max(MA_WINDOWS) + 1  # 多保留一根，用于回看上一根 K 线的均线
+
+    def __init__(self):
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._init_arrays(0)
+        self.version = 0  # 状态每次变化时递增，供下游缓存判断是否失效
+
+    def _init_arrays(self, n: int):
+        nan = lambda: np.full(n, np.nan)
+        self._ring = np.full((n, self.RING), np.nan)   # 最近 RING 根收盘价 (环形缓冲)
+        self._count = np.zeros(n, dtype=np.int64)      # 已处理的有效 K 线数
+        self._sums = {w: np.zeros(n) for w in MA_WINDOWS}
+        self._ema_fast, self._ema_slow, self._dea = nan(), nan(), nan()
+        self._prev_close, self._avg_gain, self._avg_loss = nan(), nan(), nan()
+        self._deltas = np.zeros(n, dtype=np.int64)     # RSI 已处理的涨跌样本数
+        self._last_day = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    # ========== 批量初始化 ==========
+
+    def bootstrap(self, symbols: List[str], close: np.ndarray, last_days: Optional[np.ndarray] = None):
+        """
+        由收盘价矩阵初始化全部股票的指标状态
+
+        Args:
+            symbols: 股票代码 (与矩阵行对应)
+            close: (股票 × 时间) 收盘价矩阵，按时间升序，缺失值为 NaN
+            last_days: 每只股票最后一根 K 线的日期 (天数)，用于识别重复追加
+        """
+        close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+        n = len(symbols)
+        self.symbols = list(symbols)
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+        self._init_arrays(n)
+        self.version += 1
+        if n == 0:
+            return
+
+        # 均线滑窗：每行最后 RING 个有效收盘价右对齐
+        valid = ~np.isnan(close)
+        self._count = valid.sum(axis=-1).astype(np.int64)
+        for i in range(n):
+            values = close[i, valid[i]][-self.RING:]
+            count = int(self._count[i])
+            # 环形缓冲中第 k 根 K 线位于 k % RING
+            for k, value in zip(range(count - len(values), count), values):
+                self._ring[i, k % self.RING] = value
+            for w in MA_WINDOWS:
+                self._sums[w][i] = values[-w:].sum() if len(values) else 0.0
+
+        # EMA / MACD 状态
+        ema_fast = ema(close, MACD_FAST)
+        ema_slow = ema(close, MACD_SLOW)
+        self._ema_fast = _latest_valid(ema_fast)
+        self._ema_slow = _latest_valid(ema_slow)
+        self._dea = _latest_valid(ema(ema_fast - ema_slow, MACD_SIGNAL))
+
+        # RSI 状态
+        delta = np.diff(close, axis=-1, prepend=np.nan)
+        gain = np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0))
+        loss = np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0))
+        self._avg_gain = _latest_valid(smooth(gain, 1.0 / RSI_PERIOD))
+        self._avg_loss = _latest_valid(smooth(loss, 1.0 / RSI_PERIOD))
+        self._deltas = (~np.isnan(delta)).sum(axis=-1).astype(np.int64)
+        self._prev_close = _latest_valid(close)
+
+        if last_days is not None:
+            self._last_day = np.asarray(last_days, dtype=np.int64)
+
+    def bootstrap_from_store(self, store, period: str = "daily", lookback: int = 500):
+        """从列式 K 线存储加载最近 lookback 根 K 线并初始化 (跳过尚未写入完整历史的股票)"""
+        symbols = [symbol for symbol in store.symbols(period) if store.has_history(symbol, period)]
+        close = np.full((len(symbols), lookback), np.nan)
+        last_days = np.full(len(symbols), np.iinfo(np.int64).min, dtype=np.int64)
+        for i, symbol in enumerate(symbols):
+            arrays = store.columns(symbol, period)
+            if not arrays:
+                continue
+            values = arrays["close"][-lookback:]
+            close[i, lookback - len(values):] = values
+            last_days[i] = int(arrays["date"][-1].astype("int64"))
+        self.bootstrap(symbols, close, last_days)
+
+    def add_symbol(self, symbol: str, close: np.ndarray, last_day: Optional[int] = None):
+        """新增或重建单只股票的指标状态"""
+        other = IndicatorEngine()
+        other.bootstrap(
+            [symbol],
+            np.asarray(close, dtype=np.float64)[None, :],
+            None if last_day is None else np.array([last_day])
+        )
+
+        self.version += 1
+        if symbol not in self._index:
+            self._index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self._ring = np.vstack([self._ring, other._ring])
+            for name in self._state_names():
+                setattr(self, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+            for w in MA_WINDOWS:
+                self._sums[w] = np.concatenate([self._sums[w], other._sums[w]])
+        else:
+            i = self._index[symbol]
+            self._ring[i] = other._ring[0]
+            for name in self._state_names():
+                getattr(self, name)[i] = getattr(other, name)[0]
+            for w in MA_WINDOWS:
+                self._sums[w][i] = other._sums[w][0]
+
+    def sync_symbol(self, store, symbol: str, period: str = "daily", lookback: int = 500) -> bool:
+        """
+        存储追加 K 线后同步单只股票的指标状态
+
+        存储中倒数第二根 K 线恰为已处理的最后一根时增量追加，否则 (新股票、同日修正、缺口) 从存储重建。
+        尚未写入完整历史的股票不建立状态，指标由调用方回退到在线数据源计算。
+
+        Returns:
+            是否为增量更新
+        """
+        arrays = store.columns(symbol, period)
+        if not arrays or not store.has_history(symbol, period):
+            return False
+
+        days = arrays["date"].view("int64")
+        i = self._index.get(symbol)
+        if i is not None and len(days) >= 2 and int(days[-2]) == self._last_day[i]:
+            self.append({symbol: float(arrays["close"][-1])}, day=int(days[-1]))
+            return True
+
+        self.add_symbol(symbol, np.asarray(arrays["close"][-lookback:]), last_day=int(days[-1]))
+        return False
+
+    @staticmethod
+    def _state_names() -> Tuple[str, ...]:
+        return (
+            "_count", "_ema_fast", "_ema_slow", "_dea",
+            "_prev_close", "_avg_gain", "_avg_loss", "_deltas", "_last_day"
+        )
+
+    # ========== 增量更新 ==========
+
+    def _step(self, idx: np.ndarray, x: np.ndarray, commit: bool) -> Dict[str, np.ndarray]:
+        """对指定股票追加一根收盘价为 x 的 K 线，返回追加后的指标"""
+        count = self._count[idx]
+        result = {}
+
+        sums = {}
+        for w in MA_WINDOWS:
+            leaving = np.where(count >= w, self._ring[idx, (count - w) % self.RING], 0.0)
+            sums[w] = self._sums[w][idx] + x - leaving
+            result[f"ma{w}"] = np.where(count + 1 >= w, sums[w] / w, np.nan)
+
+        a_fast, a_slow, a_signal = 2.0 / (MACD_FAST + 1), 2.0 / (MACD_SLOW + 1), 2.0 / (MACD_SIGNAL + 1)
+        prev_fast, prev_slow = self._ema_fast[idx], self._ema_slow[idx]
+        ema_fast = np.where(np.isnan(prev_fast), x, a_fast * x + (1 - a_fast) * prev_fast)
+        ema_slow = np.where(np.isnan(prev_slow), x, a_slow * x + (1 - a_slow) * prev_slow)
+        dif = ema_fast - ema_slow
+        prev_dea = self._dea[idx]
+        dea = np.where(np.isnan(prev_dea), dif, a_signal * dif + (1 - a_signal) * prev_dea)
+        result.update({"macd": dif, "macd_signal": dea, "macd_hist": dif - dea})
+
+        prev_close = self._prev_close[idx]
+        delta = x - prev_close
+        has_delta = ~np.isnan(delta)
+        gain = np.where(has_delta, np.maximum(delta, 0.0), np.nan)
+        loss = np.where(has_delta, np.maximum(-delta, 0.0), np.nan)
+        alpha = 1.0 / RSI_PERIOD
+        prev_gain, prev_loss = self._avg_gain[idx], self._avg_loss[idx]
+        avg_gain = np.where(np.isnan(prev_gain), gain, np.where(has_delta, alpha * gain + (1 - alpha) * prev_gain, prev_gain))
+        avg_loss = np.where(np.isnan(prev_loss), loss, np.where(has_delta, alpha * loss + (1 - alpha) * prev_loss, prev_loss))
+        deltas = self._deltas[idx] + has_delta
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        result["rsi"] = np.where((deltas >= RSI_PERIOD) & ~np.isnan(avg_gain), value, np.nan)
+
+        if commit:
+            self._ring[idx, count % self.RING] = x
+            self._count[idx] = count + 1
+            for w in MA_WINDOWS:
+                self._sums[w][idx] = sums[w]
+            self._ema_fast[idx], self._ema_slow[idx], self._dea[idx] = ema_fast, ema_slow, dea
+            self._prev_close[idx] = x
+            self._avg_gain[idx], self._avg_loss[idx] = avg_gain, avg_loss
+            self._deltas[idx] = deltas
+
+        return result
+
+    def _prepare(self, closes: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        symbols = [s for s, v in closes.items() if s in self._index and v is not None and not np.isnan(v)]
+        idx = np.array([self._index[s] for s in symbols], dtype=np.int64)
+        x = np.array([closes[s] for s in symbols], dtype=np.float64)
+        return idx, x, symbols
+
+    def append(self, closes: Dict[str, float], day: Optional[int] = None) -> List[str]:
+        """
+        追加一根新 K 线 (收盘后调用)
+
+        Args:
+            closes: {symbol: 收盘价}
+            day: K 线日期 (天数)；不晚于已处理的最后一根时跳过，避免重复追加
+
+        Returns:
+            实际更新的股票列表
+        """
+        idx, x, symbols = self._prepare(closes)
+        if day is not None and len(idx):
+            fresh = self._last_day[idx] < day
+            idx, x = idx[fresh], x[fresh]
+            symbols = [s for s, keep in zip(symbols, fresh) if keep]
+        if len(idx):
+            self._step(idx, x, commit=True)
+            self.version += 1
+            if day is not None:
+                self._last_day[idx] = day
+        return symbols
+
+    def peek(self, prices: Dict[str, float], day: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """
+        以盘中价格作为当日收盘价试算指标 (不改变状态)
+
+        Args:
+            prices: {symbol: 当前价格}
+            day: 当日日期 (天数)；当日 K 线已入库的股票直接返回已收盘指标
+        """
+        idx, x, symbols = self._prepare(prices)
+        if not len(idx):
+            return {}
+        if day is not None:
+            closed = self._last_day[idx] >= day
+            latest = self.latest_all()
+            result = {
+                name: np.where(closed, latest[name][idx], values)
+                for name, values in self._step(idx, x, commit=False).items()
+            }
+        else:
+            result = self._step(idx, x, commit=False)
+        return {
+            symbol: {name: _to_float(values[i]) for name, values in result.items()}
+            for i, symbol in enumerate(symbols)
+        }
+
+    def columns(
+        self,
+        symbols: Sequence[str],
+        prices: Optional[np.ndarray] = None,
+        day: Optional[int] = None
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        按给定股票顺序返回列式指标 (引擎中没有的股票为 NaN)
+
+        Args:
+            symbols: 股票代码
+            prices: 与 symbols 对应的盘中价格；给出时按该价格试算当日指标
+            day: 当日日期 (天数)；当日 K 线已入库的股票使用已收盘指标
+
+        Returns:
+            (当前指标, 上一根 K 线的指标)，后者用于判断均线 / MACD 交叉
+        """
+        n = len(symbols)
+        rows = np.fromiter((self._index.get(s, -1) for s in symbols), dtype=np.int64, count=n)
+        known = rows >= 0
+        idx = rows[known]
+
+        latest = self.latest_all()
+        current = {name: values[idx] for name, values in latest.items()}
+        previous = self._previous(idx)
+
+        if prices is not None and len(idx):
+            x = np.asarray(prices, dtype=np.float64)[known]
+            with np.errstate(invalid="ignore"):
+                live = (x > 0) & (self._count[idx] > 0)
+            if day is not None:
+                live &= self._last_day[idx] < day
+            if live.any():
+                for name, values in self._step(idx[live], x[live], commit=False).items():
+                    current[name][live] = values
+                    previous[name][live] = latest[name][idx[live]]
+
+        def expand(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+            result = {}
+            for name, values in columns.items():
+                full = np.full(n, np.nan)
+                full[known] = values
+                result[name] = full
+            return result
+
+        return expand(current), expand(previous)
+
+    def _previous(self, idx: np.ndarray) -> Dict[str, np.ndarray]:
+        """最后一根已处理 K 线之前的均线与 MACD (由滑窗与 EMA 递推反推，RSI 不回看)"""
+        count = self._count[idx]
+        last = self._ring[idx, (count - 1) % self.RING]
+        result = {}
+        for w in MA_WINDOWS:
+            has = count - 1 >= w
+            leaving = np.where(has, self._ring[idx, (count - 1 - w) % self.RING], 0.0)
+            result[f"ma{w}"] = np.where(has, (self._sums[w][idx] - last + leaving) / w, np.nan)
+
+        a_fast, a_slow, a_signal = 2.0 / (MACD_FAST + 1), 2.0 / (MACD_SLOW + 1), 2.0 / (MACD_SIGNAL + 1)
+        ema_fast, ema_slow = self._ema_fast[idx], self._ema_slow[idx]
+        prev_fast = (ema_fast - a_fast * last) / (1 - a_fast)
+        prev_slow = (ema_slow - a_slow * last) / (1 - a_slow)
+        dif = prev_fast - prev_slow
+        dea = (self._dea[idx] - a_signal * (ema_fast - ema_slow)) / (1 - a_signal)
+        has = count >= 2
+        result.update({
+            "macd": np.where(has, dif, np.nan),
+            "macd_signal": np.where(has, dea, np.nan),
+            "macd_hist": np.where(has, dif - dea, np.nan)
+        })
+        result["rsi"] = np.full(len(idx), np.nan)
+        return result
+
+    def latest(self, symbol: str) -> Optional[Dict[str, float]]:
+        """已收盘 K 线的最新指标"""
+        i = self._index.get(symbol)
+        if i is None or self._count[i] == 0:
+            return None
+        return {name: _to_float(values[i]) for name, values in self.latest_all().items()}
+
+    def latest_all(self) -> Dict[str, np.ndarray]:
+        """全部股票的最新指标 (按 self.symbols 顺序的列数组)"""
+        count = self._count
+        result = {}
+        for w in MA_WINDOWS:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[f"ma{w}"] = np.where(count >= w, self._sums[w] / w, np.nan)
+        dif = self._ema_fast - self._ema_slow
+        result.update({"macd": dif, "macd_signal": self._dea, "macd_hist": dif - self._dea})
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = np.where(self._avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss))
+        result["rsi"] = np.where((self._deltas >= RSI_PERIOD) & ~np.isnan(self._avg_gain), value, np.nan)
+        return result
+
+
+def _to_float(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+# 全局指标引擎
+indicator_engine = IndicatorEngine()
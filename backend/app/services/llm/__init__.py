@@ -3,14 +3,20 @@ Lumina 明见量化 - LLM 服务模块
 """
 from app.services.llm.decision_engine import (
     LLMDecisionEngine,
+    LLMClient,
+    StubLLMClient,
     llm_engine,
     TradingDecision,
     AnalysisResult
 )
+from app.services.llm.replay import ReplayStore
 
 __all__ = [
     "LLMDecisionEngine",
+    "LLMClient",
+    "StubLLMClient",
     "llm_engine",
     "TradingDecision",
-    "AnalysisResult"
+    "AnalysisResult",
+    "ReplayStore"
 ]
@@ -3,14 +3,18 @@ Lumina 明见量化 - LLM 决策引擎
 使用大模型进行选股和持仓策略决策
 """
 import json
+import re
 import asyncio
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+from dataclasses import dataclass, asdict
 from loguru import logger
 import httpx
 
 from app.core.config import settings
+from app.core.database import async_session_factory
+from app.services.llm.response_cache import ResponseCache, prompt_key
+from app.services.llm.replay import ReplayStore, REPLAY_MODES
 
 
 @dataclass
@@ -36,23 +40,44 @@ class AnalysisResult:
     model_used: str
     tokens_used: int
     latency_ms: int
+    cached: bool = False  # 是否命中响应缓存
+    replayed: bool = False  # 是否来自录制回放
 
 
 class LLMClient:
     """LLM 客户端基类"""
     
-    def __init__(self, model: str):
+    def __init__(self, model: str, http_client: Optional[httpx.AsyncClient] = None):
         self.model = model
+        self.http_client = http_client  # 由 LLMDecisionEngine 注入的共享连接池
+        self.requests_total = 0
+        self.errors_total = 0
     
     async def chat(self, messages: List[Dict], **kwargs) -> Dict:
         raise NotImplementedError
+    
+    async def _post(self, url: str, headers: Dict, payload: Dict) -> Dict:
+        """发送请求，优先复用共享连接池"""
+        self.requests_total += 1
+        try:
+            if self.http_client is not None and not self.http_client.is_closed:
+                response = await self.http_client.post(url, headers=headers, json=payload)
+            else:
+                # 未在应用生命周期内打开连接池时（如脚本调用），退化为一次性客户端
+                async with httpx.AsyncClient(timeout=settings.llm_timeout) as client:
+                    response = await client.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            self.errors_total += 1
+            raise
 
 
 class GitHubModelsClient(LLMClient):
     """GitHub Models 客户端 (推荐 - 免费)"""
     
-    def __init__(self, model: str = "openai/gpt-4.1-mini"):
-        super().__init__(model)
+    def __init__(self, model: str = "openai/gpt-4.1-mini", http_client: Optional[httpx.AsyncClient] = None):
+        super().__init__(model, http_client)
         self.endpoint = settings.github_models_endpoint
     
     async def chat(self, messages: List[Dict], **kwargs) -> Dict:
@@ -72,21 +97,19 @@ class GitHubModelsClient(LLMClient):
             "max_tokens": kwargs.get("max_tokens", 4096),
         }
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.endpoint}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post(f"{self.endpoint}/chat/completions", headers, payload)
 
 
 class OpenAIClient(LLMClient):
     """OpenAI / DeepSeek 兼容客户端"""
     
-    def __init__(self, model: str = "gpt-4o", base_url: str = None):
-        super().__init__(model)
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        base_url: str = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        super().__init__(model, http_client)
         self.base_url = base_url or settings.openai_base_url
     
     async def chat(self, messages: List[Dict], **kwargs) -> Dict:
@@ -107,14 +130,35 @@ class OpenAIClient(LLMClient):
             "max_tokens": kwargs.get("max_tokens", 4096),
         }
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post(f"{self.base_url}/chat/completions", headers, payload)
+
+
+class StubLLMClient(LLMClient):
+    """本地桩模型：不访问网络，由 responder 根据消息生成分析结果 (默认不做任何交易)"""
+    
+    def __init__(
+        self,
+        responder: Optional[Callable[[List[Dict]], Dict]] = None,
+        model: str = "stub"
+    ):
+        super().__init__(model)
+        self.responder = responder
+    
+    async def chat(self, messages: List[Dict], **kwargs) -> Dict:
+        self.requests_total += 1
+        if self.responder is not None:
+            result = self.responder(messages)
+        else:
+            result = {
+                "market_sentiment": "neutral",
+                "market_summary": "本地桩模型：无录制结果，不做交易",
+                "risk_assessment": "无法评估",
+                "decisions": []
+            }
+        return {
+            "choices": [{"message": {"content": json.dumps(result, ensure_ascii=False)}}],
+            "usage": {"total_tokens": 0}
+        }
 
 
 class LLMDecisionEngine:
@@ -166,9 +210,131 @@ class LLMDecisionEngine:
 - 要考虑当前持仓和可用资金
 """
 
-    def __init__(self, model: Optional[str] = None):
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        client: Optional[LLMClient] = None,
+        replay_mode: Optional[str] = None,
+        replay_store: Optional[ReplayStore] = None,
+        fallback_client: Optional[LLMClient] = None
+    ):
+        """
+        Args:
+            model: 模型名称，默认取配置
+            client: 自定义 LLM 客户端，默认按配置的提供商创建
+            replay_mode: off / record / replay，默认取配置
+            replay_store: 录制存储，默认数据库表
+            fallback_client: 回放未命中时使用的本地模型，默认 StubLLMClient
+        """
         self.model = model or settings.default_llm_model
-        self.client = self._create_client()
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.client = client or self._create_client()
+        
+        self.replay_mode = (replay_mode or settings.llm_replay_mode).lower()
+        if self.replay_mode not in REPLAY_MODES:
+            raise ValueError(f"未知的回放模式: {self.replay_mode}")
+        self.replay: Optional[ReplayStore] = None
+        if self.replay_mode != "off":
+            self.replay = replay_store or ReplayStore()
+        self.fallback_client = fallback_client or StubLLMClient()
+        self.cache: Optional[ResponseCache] = None
+        if settings.llm_cache_enabled:
+            self.cache = ResponseCache(
+                max_size=settings.llm_cache_max_size,
+                ttl=settings.llm_cache_ttl,
+                redis_url=settings.redis_url,
+                session_factory=async_session_factory if settings.llm_cache_sqlite else None
+            )
+    
+    async def open(self):
+        """打开共享 HTTP 连接池 (在应用启动时调用)"""
+        if self.http_client is not None and not self.http_client.is_closed:
+            return
+        
+        limits = httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry
+        )
+        try:
+            self.http_client = httpx.AsyncClient(
+                timeout=settings.llm_timeout,
+                limits=limits,
+                http2=settings.llm_http2
+            )
+        except ImportError:
+            # 未安装 h2 时回退到 HTTP/1.1
+            logger.warning("未安装 h2，LLM 连接池回退到 HTTP/1.1")
+            self.http_client = httpx.AsyncClient(timeout=settings.llm_timeout, limits=limits)
+        
+        self.client.http_client = self.http_client
+        logger.info(
+            f"LLM 连接池已打开: max_connections={settings.llm_max_connections}, "
+            f"keepalive={settings.llm_max_keepalive_connections}"
+        )
+    
+    async def close(self):
+        """关闭共享 HTTP 连接池和缓存连接 (在应用关闭时调用)"""
+        if self.cache:
+            await self.cache.close()
+        if self.http_client is None:
+            return
+        
+        await self.http_client.aclose()
+        self.http_client = None
+        self.client.http_client = None
+        logger.info("LLM 连接池已关闭")
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        stats = {
+            "open": self.http_client is not None and not self.http_client.is_closed,
+            "http2": settings.llm_http2,
+            "max_connections": settings.llm_max_connections,
+            "max_keepalive_connections": settings.llm_max_keepalive_connections,
+            "requests_total": self.client.requests_total,
+            "errors_total": self.client.errors_total,
+            "connections": 0,
+            "idle_connections": 0,
+            "http2_connections": 0
+        }
+        
+        if not stats["open"]:
+            return stats
+        
+        # httpx 未公开连接池对象，这里尽力读取 httpcore 连接池状态；
+        # 内部结构变化时只返回配置项，不影响健康检查
+        try:
+            pool = getattr(getattr(self.http_client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", None) or [])
+        except Exception:
+            return stats
+        
+        stats["connections"] = len(connections)
+        for conn in connections:
+            try:
+                is_idle = getattr(conn, "is_idle", None)
+                info = getattr(conn, "info", None)
+                if callable(is_idle) and is_idle():
+                    stats["idle_connections"] += 1
+                if callable(info) and "HTTP/2" in str(info()):
+                    stats["http2_connections"] += 1
+            except Exception:
+                continue
+        
+        return stats
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取响应缓存统计信息"""
+        if not self.cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+    
+    def replay_stats(self) -> Dict[str, Any]:
+        """获取录制/回放统计信息"""
+        if not self.replay:
+            return {"mode": self.replay_mode}
+        return {"mode": self.replay_mode, **self.replay.stats()}
     
     def _create_client(self) -> LLMClient:
         """根据配置创建 LLM 客户端"""
@@ -176,31 +342,33 @@ class LLMDecisionEngine:
         
         if provider == "github":
             # GitHub Models
-            return GitHubModelsClient(self.model)
+            return GitHubModelsClient(self.model, self.http_client)
         elif provider == "deepseek":
             # DeepSeek API
-            return OpenAIClient(self.model, settings.deepseek_base_url)
+            return OpenAIClient(self.model, settings.deepseek_base_url, self.http_client)
         elif provider == "openai":
             # OpenAI API
-            return OpenAIClient(self.model, settings.openai_base_url)
+            return OpenAIClient(self.model, settings.openai_base_url, self.http_client)
         elif provider == "azure":
             # Azure OpenAI (使用 OpenAI 兼容客户端)
-            return OpenAIClient(self.model, settings.azure_openai_endpoint)
+            return OpenAIClient(self.model, settings.azure_openai_endpoint, self.http_client)
         else:
             # 默认使用 DeepSeek
-            return OpenAIClient(self.model, settings.deepseek_base_url)
+            return OpenAIClient(self.model, settings.deepseek_base_url, self.http_client)
     
     def _build_analysis_prompt(
         self,
         market_data: Dict,
         portfolio: Dict,
-        candidates: List[Dict]
+        candidates: List[Dict],
+        as_of: Optional[datetime] = None
     ) -> str:
-        """构建分析提示词"""
+        """构建分析提示词 (指定 as_of 时以该时间代替当前时间，回测时提示词可复现)"""
         
         # 当前日期
-        current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-        today = datetime.now().strftime("%Y-%m-%d")
+        now = as_of or datetime.now()
+        current_date = now.strftime("%Y-%m-%d %H:%M")
+        today = now.strftime("%Y-%m-%d")
         
         # 持仓情况 (包含T+1可卖出状态)
         positions_str = ""
@@ -281,7 +449,8 @@ class LLMDecisionEngine:
         self,
         market_data: Dict,
         portfolio: Dict,
-        candidates: List[Dict]
+        candidates: List[Dict],
+        as_of: Optional[datetime] = None
     ) -> AnalysisResult:
         """
         分析市场数据并做出交易决策
@@ -290,6 +459,7 @@ class LLMDecisionEngine:
             market_data: 市场数据（指数、情绪等）
             portfolio: 当前投资组合状态
             candidates: 候选股票列表
+            as_of: 决策时间 (回测时传入历史时间)，默认当前时间
         
         Returns:
             AnalysisResult: 分析结果和交易决策
@@ -298,50 +468,79 @@ class LLMDecisionEngine:
         
         try:
             # 构建消息
-            user_prompt = self._build_analysis_prompt(market_data, portfolio, candidates)
+            user_prompt = self._build_analysis_prompt(market_data, portfolio, candidates, as_of)
             messages = [
                 {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt}
             ]
             
+            client = self.client
+            replay_key = prompt_key(self.model, messages)
+            if self.replay_mode == "replay":
+                # 回放模式：只读取录制结果，未命中时使用本地模型，不发起网络请求
+                record = await self.replay.get(replay_key, self.model)
+                if record is not None:
+                    latency = int((datetime.now() - start_time).total_seconds() * 1000)
+                    return self._result_from_dict(
+                        record["result"],
+                        tokens_used=record["tokens_used"],
+                        latency_ms=latency,
+                        replayed=True
+                    )
+                logger.debug(f"LLM 回放未命中: {replay_key[:12]}，使用本地模型")
+                client = self.fallback_client
+            
+            # 查询响应缓存 (相同提示词直接返回已解析结果；时间戳不参与哈希，由 TTL 控制时效)
+            # 录制模式不读写缓存：缓存键忽略当前时间，命中会跳过录制，使不同日期的相同提示词漏录
+            cache_key = prompt_key(self.model, self._cache_messages(messages))
+            use_cache = self.cache is not None and client is self.client and self.replay_mode != "record"
+            if use_cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    latency = int((datetime.now() - start_time).total_seconds() * 1000)
+                    logger.info(f"LLM 缓存命中: {cache_key[:12]}")
+                    return self._result_from_dict(cached, tokens_used=0, latency_ms=latency, cached=True)
+            
             # 调用 LLM
-            logger.info(f"调用 LLM: {self.model}")
-            response = await self.client.chat(messages, temperature=0.3)
+            logger.info(f"调用 LLM: {client.model}")
+            response = await client.chat(messages, temperature=0.3)
             
             # 解析响应
             content = response["choices"][0]["message"]["content"]
             usage = response.get("usage", {})
             
             # 提取 JSON
-            result = self._parse_response(content)
+            parsed = self._extract_json(content)
+            if parsed is None:
+                logger.warning(f"无法解析 LLM 响应: {content[:500]}")
+                parsed = {"market_sentiment": "neutral", "decisions": []}
             
             # 计算延迟
             latency = int((datetime.now() - start_time).total_seconds() * 1000)
             
-            # 构建决策列表
-            decisions = []
-            for d in result.get("decisions", []):
-                decisions.append(TradingDecision(
-                    symbol=d["symbol"],
-                    name=d.get("name", ""),
-                    action=d["action"],
-                    quantity=d.get("quantity", 0),
-                    reason=d.get("reason", ""),
-                    confidence=d.get("confidence", 0.5),
-                    target_price=d.get("target_price"),
-                    stop_loss=d.get("stop_loss")
-                ))
-            
-            return AnalysisResult(
-                market_sentiment=result.get("market_sentiment", "neutral"),
-                market_summary=result.get("market_summary", ""),
-                decisions=decisions,
-                risk_assessment=result.get("risk_assessment", ""),
-                model_used=self.model,
+            result = self._result_from_dict(
+                parsed,
                 tokens_used=usage.get("total_tokens", 0),
                 latency_ms=latency
             )
             
+            # 仅缓存/录制成功解析的真实模型响应
+            if client is self.client and parsed.get("decisions") is not None and "market_summary" in parsed:
+                if use_cache:
+                    await self.cache.set(cache_key, self._result_to_dict(result))
+                if self.replay_mode == "record":
+                    await self.replay.put(
+                        replay_key,
+                        self.model,
+                        messages,
+                        content,
+                        self._result_to_dict(result),
+                        tokens_used=result.tokens_used,
+                        as_of=as_of.strftime("%Y-%m-%d") if as_of else None
+                    )
+            
+            return result
+            
         except Exception as e:
             logger.error(f"LLM 分析失败: {e}")
             latency = int((datetime.now() - start_time).total_seconds() * 1000)
@@ -356,8 +555,66 @@ class LLMDecisionEngine:
                 latency_ms=latency
             )
     
+    def _result_from_dict(
+        self,
+        result: Dict,
+        tokens_used: int,
+        latency_ms: int,
+        cached: bool = False,
+        replayed: bool = False
+    ) -> AnalysisResult:
+        """由解析后的 JSON 构建分析结果"""
+        decisions = []
+        for d in result.get("decisions", []):
+            decisions.append(TradingDecision(
+                symbol=d["symbol"],
+                name=d.get("name", ""),
+                action=d["action"],
+                quantity=d.get("quantity", 0),
+                reason=d.get("reason", ""),
+                confidence=d.get("confidence", 0.5),
+                target_price=d.get("target_price"),
+                stop_loss=d.get("stop_loss")
+            ))
+        
+        return AnalysisResult(
+            market_sentiment=result.get("market_sentiment", "neutral"),
+            market_summary=result.get("market_summary", ""),
+            decisions=decisions,
+            risk_assessment=result.get("risk_assessment", ""),
+            model_used=self.model,
+            tokens_used=tokens_used,
+            latency_ms=latency_ms,
+            cached=cached,
+            replayed=replayed
+        )
+    
+    @staticmethod
+    def _cache_messages(messages: List[Dict]) -> List[Dict]:
+        """去除提示词中的当前时间，使同一行情快照在 TTL 内得到相同的缓存键"""
+        return [
+            {**m, "content": re.sub(r"## 当前时间\n[^\n]*\n", "", m["content"])}
+            for m in messages
+        ]
+    
+    @staticmethod
+    def _result_to_dict(result: AnalysisResult) -> Dict:
+        """分析结果转为可缓存的字典"""
+        data = asdict(result)
+        for key in ("model_used", "tokens_used", "latency_ms", "cached", "replayed"):
+            data.pop(key, None)
+        return data
+    
     def _parse_response(self, content: str) -> Dict:
         """解析 LLM 响应"""
+        result = self._extract_json(content)
+        if result is None:
+            logger.warning(f"无法解析 LLM 响应: {content[:500]}")
+            return {"market_sentiment": "neutral", "decisions": []}
+        return result
+    
+    def _extract_json(self, content: str) -> Optional[Dict]:
+        """从 LLM 响应中提取 JSON，失败返回 None"""
         try:
             # 尝试直接解析
             return json.loads(content)
@@ -365,7 +622,6 @@ class LLMDecisionEngine:
             pass
         
         # 尝试提取 JSON 块
-        import re
         json_match = re.search(r'```json\s*(.*?)\s*```', content, re.DOTALL)
         if json_match:
             try:
@@ -381,8 +637,7 @@ class LLMDecisionEngine:
             except json.JSONDecodeError:
                 pass
         
-        logger.warning(f"无法解析 LLM 响应: {content[:500]}")
-        return {"market_sentiment": "neutral", "decisions": []}
+        return None
     
     async def evaluate_position(
         self,
@@ -401,27 +656,31 @@ class LLMDecisionEngine:
         Returns:
             TradingDecision: 持仓调整建议
         """
-        # 计算盈亏比例
+        # 止损 / 止盈规则与风控监控、回测引擎共用 (trading 模块依赖本模块，延迟导入)
+        from app.services.trading.rules import trading_rules
+        
         pnl_ratio = (current_price - position["avg_cost"]) / position["avg_cost"]
+        stop, take = trading_rules.exit_signals(current_price, position["avg_cost"])
+        quantity = int(trading_rules.exit_quantities(position["quantity"], stop, take))
         
         # 触发止损
-        if pnl_ratio <= -settings.stop_loss_ratio:
+        if stop:
             return TradingDecision(
                 symbol=position["symbol"],
                 name=position.get("name", ""),
                 action="sell",
-                quantity=position["quantity"],
+                quantity=quantity,
                 reason=f"触发止损 (亏损 {pnl_ratio*100:.2f}%)",
                 confidence=0.9
             )
         
         # 触发止盈
-        if pnl_ratio >= settings.take_profit_ratio:
+        if take:
             return TradingDecision(
                 symbol=position["symbol"],
                 name=position.get("name", ""),
                 action="sell",
-                quantity=position["quantity"] // 2,  # 先卖一半
+                quantity=quantity,  # 先卖一半
                 reason=f"触发止盈 (盈利 {pnl_ratio*100:.2f}%)",
                 confidence=0.8
             )
@@ -0,0 +1,158 @@
+"""
+Lumina 明见量化 - LLM 决策录制与回放
+录制模式下持久化每次分析的完整提示词、原始响应和解析结果 (按提示词哈希 + 模型唯一)；
+回放模式下只读取录制结果，不发起任何网络请求，供回测和回归测试离线重放。
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Sequence
+from loguru import logger
+from sqlalchemy import and_, or_, select
+
+from app.core.database import async_session_factory
+from app.models import LLMReplayRecord
+
+
+# 录制/回放模式
+REPLAY_MODES = ("off", "record", "replay")
+
+
+class ReplayStore:
+    """LLM 决策录制存储 (数据库表 llm_replay_records)"""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or async_session_factory
+        self.hits = 0
+        self.misses = 0
+        self.records = 0
+
+    async def get(self, prompt_hash: str, model: str) -> Optional[Dict[str, Any]]:
+        """
+        读取录制结果
+
+        Returns:
+            {"response", "result", "tokens_used"}；未录制或读取失败时返回 None
+        """
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(LLMReplayRecord).where(
+                        LLMReplayRecord.prompt_hash == prompt_hash,
+                        LLMReplayRecord.model == model
+                    )
+                )
+                record = result.scalar_one_or_none()
+        except Exception as e:
+            logger.warning(f"读取 LLM 回放记录失败: {e}")
+            record = None
+
+        if record is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {
+            "response": record.response,
+            "result": record.result,
+            "tokens_used": record.tokens_used or 0
+        }
+
+    async def put(
+        self,
+        prompt_hash: str,
+        model: str,
+        messages: List[Dict],
+        response: str,
+        result: Dict[str, Any],
+        tokens_used: int = 0,
+        as_of: Optional[str] = None
+    ):
+        """
+        录制一次分析 (同一提示词和模型覆盖旧记录)
+
+        Args:
+            as_of: 决策所依据行情的日期 (YYYY-MM-DD)，默认当天
+        """
+        try:
+            async with self.session_factory() as db:
+                existing = await db.execute(
+                    select(LLMReplayRecord).where(
+                        LLMReplayRecord.prompt_hash == prompt_hash,
+                        LLMReplayRecord.model == model
+                    )
+                )
+                record = existing.scalar_one_or_none()
+                if record is None:
+                    record = LLMReplayRecord(prompt_hash=prompt_hash, model=model)
+                    db.add(record)
+                record.messages = messages
+                record.response = response
+                record.result = result
+                record.tokens_used = tokens_used
+                record.as_of = as_of or date.today().isoformat()
+                await db.commit()
+            self.records += 1
+        except Exception as e:
+            logger.warning(f"录制 LLM 响应失败: {e}")
+
+    async def decisions(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        model: Optional[str] = None,
+        symbols: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按日期读取录制的交易决策 (供回测回放)
+
+        Args:
+            start_date / end_date: 决策日期区间 (YYYY-MM-DD，含两端)
+            model: 只读取该模型的录制
+            symbols: 只保留这些股票的决策
+
+        Returns:
+            [{"as_of", "symbol", "action", "quantity", "confidence"}]，按日期和录制时间排序
+        """
+        query = select(LLMReplayRecord)
+        if model:
+            query = query.where(LLMReplayRecord.model == model)
+        # 旧记录没有 as_of，按录制时间的日期计算
+        if start_date:
+            query = query.where(or_(
+                LLMReplayRecord.as_of >= start_date,
+                and_(LLMReplayRecord.as_of.is_(None), LLMReplayRecord.created_at >= datetime.fromisoformat(start_date))
+            ))
+        if end_date:
+            query = query.where(or_(
+                LLMReplayRecord.as_of <= end_date,
+                and_(
+                    LLMReplayRecord.as_of.is_(None),
+                    LLMReplayRecord.created_at < datetime.fromisoformat(end_date) + timedelta(days=1)
+                )
+            ))
+
+        async with self.session_factory() as db:
+            records = (await db.execute(query.order_by(LLMReplayRecord.created_at))).scalars().all()
+
+        wanted = set(symbols) if symbols is not None else None
+        decisions = []
+        for record in records:
+            as_of = record.as_of or record.created_at.date().isoformat()
+            for d in (record.result or {}).get("decisions", []):
+                if wanted is not None and d.get("symbol") not in wanted:
+                    continue
+                decisions.append({
+                    "as_of": as_of,
+                    "symbol": d.get("symbol"),
+                    "action": d.get("action"),
+                    "quantity": int(d.get("quantity") or 0),
+                    "confidence": float(d.get("confidence", 0.5) or 0.0)
+                })
+        decisions.sort(key=lambda d: d["as_of"])
+        return decisions
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "records": self.records
+        }
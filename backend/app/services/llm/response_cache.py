@@ -0,0 +1,193 @@
+"""
+Lumina 明见量化 - LLM 响应缓存
+按提示词内容哈希缓存解析后的分析结果，重复的分析请求无需再次调用大模型
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+from sqlalchemy import delete, select
+
+from app.models import LLMCacheEntry
+
+
+def prompt_key(model: str, messages: List[Dict]) -> str:
+    """根据模型和消息内容计算缓存键 (SHA-256)"""
+    raw = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM 响应缓存
+
+    - 内存层: LRU + TTL
+    - Redis 层 (可选): 配置 redis_url 后启用，多进程/重启后仍可命中
+    - 数据库层 (可选): 传入 session_factory 后启用，单机部署无 Redis 时重启后仍可命中
+    """
+
+    KEY_PREFIX = "lumina:llm:"
+    PRUNE_EVERY = 100  # 每写入多少次数据库层清理一次过期条目
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: int = 300,
+        redis_url: Optional[str] = None,
+        session_factory=None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.session_factory = session_factory
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._redis = None
+        self._redis_failed = False
+        self._db_failed = False
+        self._db_writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.db_hits = 0
+
+    def _get_redis(self):
+        """懒加载 Redis 客户端，连接失败后不再重试"""
+        if not self.redis_url or self._redis_failed:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            except Exception as e:
+                logger.warning(f"Redis 缓存不可用，仅使用内存缓存: {e}")
+                self._redis_failed = True
+                return None
+        return self._redis
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中返回 None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(self.KEY_PREFIX + key)
+                if raw:
+                    value = json.loads(raw)
+                    self._set_memory(key, value)
+                    self.hits += 1
+                    self.redis_hits += 1
+                    return value
+            except Exception as e:
+                logger.warning(f"读取 Redis 缓存失败: {e}")
+                self._redis_failed = True
+
+        value = await self._get_db(key)
+        if value is not None:
+            self._set_memory(key, value)
+            self.hits += 1
+            self.db_hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        self._set_memory(key, value)
+
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(
+                    self.KEY_PREFIX + key,
+                    json.dumps(value, ensure_ascii=False, default=str),
+                    ex=self.ttl
+                )
+            except Exception as e:
+                logger.warning(f"写入 Redis 缓存失败: {e}")
+                self._redis_failed = True
+
+        await self._set_db(key, value)
+
+    async def _get_db(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.session_factory is None or self._db_failed:
+            return None
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(LLMCacheEntry.value).where(
+                        LLMCacheEntry.key == key,
+                        LLMCacheEntry.expires_at > datetime.utcnow()
+                    )
+                )
+                return result.scalar_one_or_none()
+        except Exception as e:
+            logger.warning(f"读取数据库缓存失败: {e}")
+            self._db_failed = True
+            return None
+
+    async def _set_db(self, key: str, value: Dict[str, Any]):
+        if self.session_factory is None or self._db_failed:
+            return
+        now = datetime.utcnow()
+        try:
+            async with self.session_factory() as db:
+                await db.merge(LLMCacheEntry(
+                    key=key,
+                    value=json.loads(json.dumps(value, ensure_ascii=False, default=str)),
+                    expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                self._db_writes += 1
+                if self._db_writes % self.PRUNE_EVERY == 0:
+                    await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= now))
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"写入数据库缓存失败: {e}")
+            self._db_failed = True
+
+    def _set_memory(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = (time.monotonic() + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空内存缓存"""
+        self._memory.clear()
+
+    async def close(self):
+        """关闭 Redis 连接"""
+        if self._redis is not None:
+            try:
+                await self._redis.close()
+            except Exception:
+                pass
+            self._redis = None
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._memory),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "redis_enabled": bool(self.redis_url) and not self._redis_failed,
+            "db_enabled": self.session_factory is not None and not self._db_failed,
+            "hits": self.hits,
+            "misses": self.misses,
+            "redis_hits": self.redis_hits,
+            "db_hits": self.db_hits,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
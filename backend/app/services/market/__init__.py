@@ -0,0 +1,18 @@
+"""
+Lumina 明见量化 - 市场数据服务模块
+"""
+from app.services.market.coalesce import CoalescedDataService, SingleFlight, coalesced_data_service
+from app.services.market.quote_table import QuoteTable, QuoteTableCache, quote_table, top_k
+from app.services.market.screener import Predicate, StockScreener, stock_screener
+from app.services.market.search import StockSearch, StockSearchIndex, stock_search
+from app.services.market.session import MARKET_TZ, is_trading_session
+from app.services.market.snapshot import MarketSnapshot, MarketSnapshotProducer, market_snapshot
+
+__all__ = [
+    "CoalescedDataService", "SingleFlight", "coalesced_data_service",
+    "QuoteTable", "QuoteTableCache", "quote_table", "top_k",
+    "Predicate", "StockScreener", "stock_screener",
+    "StockSearch", "StockSearchIndex", "stock_search",
+    "MARKET_TZ", "is_trading_session",
+    "MarketSnapshot", "MarketSnapshotProducer", "market_snapshot"
+]
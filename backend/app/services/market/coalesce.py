@@ -0,0 +1,183 @@
+"""
+Lumina 明见量化 - 数据请求合并
+对数据服务的同名同参调用做单飞 (single-flight) 合并：并发的相同请求共享同一个进行中的上游调用，
+结果按方法配置的有效期短暂缓存，多个看板、API 和调度任务同时请求时只触发一次上游请求。
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.data import data_service
+
+
+# 各方法的结果缓存有效期 (秒)，0 表示只合并并发请求不缓存结果；未列出的方法直接透传
+COALESCE_TTL: Dict[str, float] = {
+    "get_realtime_quote": 1.0,
+    "get_index_quote": 2.0,
+    "get_hot_stocks": 3.0,
+    "get_gainers": 3.0,
+    "get_losers": 3.0,
+    "get_volume_leaders": 3.0,
+    "get_turnover_leaders": 3.0,
+    "get_all_stocks_quote": 3.0,
+    "screen_stocks": 3.0,
+    "get_minute_data": 5.0,
+    "get_index_daily": 60.0,
+    "get_stock_list": 3600.0,
+    "get_historical_data": 0.0,
+}
+
+
+def _freeze(value: Any) -> Hashable:
+    """将参数转换为可哈希的键 (列表、字典等转为元组)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
+def _share(result: Any) -> Any:
+    """返回给单个调用方的结果 (DataFrame / 字典浅复制，避免调用方增删列或键影响其他调用方)"""
+    if hasattr(result, "copy"):
+        try:
+            return result.copy(deep=False)
+        except TypeError:
+            return result.copy()
+    return result
+
+
+class SingleFlight:
+    """按键合并并发调用，并缓存成功结果"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}  # 键 -> (过期时间, 结果)
+        self.calls = 0
+        self.upstream = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], ttl: float = 0.0) -> Any:
+        """
+        执行调用
+
+        Args:
+            key: 请求键，相同键的并发调用只执行一次 fn
+            fn: 实际发起请求的协程函数
+            ttl: 成功结果的缓存有效期 (秒)
+        """
+        self.calls += 1
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+            del self._results[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            self.upstream += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f, ttl))
+        else:
+            self.coalesced += 1
+
+        # 单个调用方取消不影响其他等待同一请求的调用方
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future, ttl: float):
+        self._inflight.pop(key, None)
+        if ttl <= 0 or future.cancelled() or future.exception() is not None:
+            return
+        if len(self._results) >= self.max_entries:
+            self._prune()
+        self._results[key] = (time.monotonic() + ttl, future.result())
+
+    def _prune(self):
+        """清理过期结果，仍超出上限时丢弃最早写入的一半"""
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._results.items() if expires <= now]:
+            del self._results[key]
+        if len(self._results) >= self.max_entries:
+            for key in list(self._results)[:len(self._results) // 2]:
+                del self._results[key]
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "upstream": self.upstream,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "cached": len(self._results)
+        }
+
+
+class CoalescedDataService:
+    """
+    数据服务代理
+
+    COALESCE_TTL 中列出的方法经单飞合并和短时缓存后调用底层数据服务，其余属性直接透传。
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        ttl: Optional[Dict[str, float]] = None,
+        enabled: Optional[bool] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.service = service
+        self.ttl = dict(COALESCE_TTL if ttl is None else ttl)
+        self.enabled = settings.data_coalesce_enabled if enabled is None else enabled
+        self.flight = SingleFlight(max_entries or settings.data_coalesce_max_entries)
+        self._methods: Dict[str, Callable[..., Awaitable[Any]]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.service, name)
+        if not self.enabled or name not in self.ttl or not callable(attr):
+            return attr
+
+        method = self._methods.get(name)
+        if method is None:
+            method = self._wrap(name)
+            self._methods[name] = method
+        return method
+
+    def _wrap(self, name: str) -> Callable[..., Awaitable[Any]]:
+        ttl = self.ttl[name]
+
+        async def call(*args, **kwargs):
+            fn = getattr(self.service, name)
+            try:
+                key = (name, _freeze(args), _freeze(kwargs))
+            except TypeError:
+                # 参数不可哈希时不合并
+                logger.debug(f"请求参数不可合并，直接调用: {name}")
+                return await fn(*args, **kwargs)
+            return _share(await self.flight.do(key, lambda: fn(*args, **kwargs), ttl))
+
+        call.__name__ = name
+        return call
+
+    def invalidate(self):
+        """丢弃全部缓存结果"""
+        self.flight.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self.flight.stats()
+
+
+# 全局合并后的数据服务
+coalesced_data_service = CoalescedDataService(data_service)
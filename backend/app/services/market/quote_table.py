@@ -0,0 +1,193 @@
+"""
+Lumina 明见量化 - 全市场行情表
+全市场约 5000 只 A 股的行情以列式 NumPy 数组缓存在内存中并定时刷新；
+涨幅榜、跌幅榜、成交量 / 换手率 / 成交额排行以 argpartition 取前 k 名，全市场行情与条件筛选 (见 screener) 也直接读取该表，
+每次排行请求只需微秒级计算，不再重新获取全市场数据并整体排序。
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.core.config import settings
+from app.services.market.coalesce import SingleFlight, coalesced_data_service
+
+
+# 文本列与数值列
+TEXT_COLUMNS = ("symbol", "name")
+NUMERIC_COLUMNS = (
+    "price", "change_pct", "change", "volume", "amount",
+    "open", "high", "low", "prev_close",
+    "turnover_rate", "pe_ratio", "pb_ratio", "market_cap"
+)
+
+# 排行: 名称 -> (排序列, 是否降序)
+RANKINGS: Dict[str, Tuple[str, bool]] = {
+    "gainers": ("change_pct", True),
+    "losers": ("change_pct", False),
+    "volume": ("volume", True),
+    "turnover": ("turnover_rate", True),
+    "hot": ("amount", True),  # 热门股票按成交额排序
+}
+
+# 区间筛选参数: 列名 -> (最小值参数, 最大值参数)
+RANGE_FILTERS: Dict[str, Tuple[str, str]] = {
+    "price": ("min_price", "max_price"),
+    "market_cap": ("min_market_cap", "max_market_cap"),
+    "pe_ratio": ("min_pe", "max_pe"),
+    "turnover_rate": ("min_turnover", "max_turnover"),
+    "change_pct": ("min_change_pct", "max_change_pct"),
+}
+
+
+def top_k(values: np.ndarray, k: int, descending: bool = True, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    取排序后的前 k 个下标 (argpartition 选出前 k 个后只对这 k 个排序)
+
+    Args:
+        values: 排序值，NaN 不参与排序
+        k: 数量
+        descending: 是否降序
+        mask: 额外的候选行掩码
+    """
+    valid = ~np.isnan(values)
+    if mask is not None:
+        valid &= mask
+    candidates = np.flatnonzero(valid)
+    if k <= 0 or not len(candidates):
+        return candidates[:0]
+
+    keys = -values[candidates] if descending else values[candidates]
+    if k < len(candidates):
+        part = np.argpartition(keys, k - 1)[:k]
+        candidates, keys = candidates[part], keys[part]
+    return candidates[np.argsort(keys, kind="stable")]
+
+
+@dataclass(frozen=True)
+class QuoteTable:
+    """全市场行情表 (列式，构建后只读)"""
+    timestamp: float
+    columns: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, timestamp: Optional[float] = None) -> "QuoteTable":
+        columns: Dict[str, np.ndarray] = {}
+        for name in TEXT_COLUMNS:
+            if name in df.columns:
+                columns[name] = df[name].astype(str).to_numpy(dtype=object)
+        for name in NUMERIC_COLUMNS:
+            if name in df.columns:
+                columns[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+        return cls(timestamp=timestamp or time.time(), columns=columns)
+
+    def __len__(self) -> int:
+        symbols = self.columns.get("symbol")
+        return 0 if symbols is None else len(symbols)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.timestamp
+
+    def column(self, name: str) -> np.ndarray:
+        """数值列 (表中没有该列时返回全 NaN)"""
+        values = self.columns.get(name)
+        if values is None:
+            return np.full(len(self), np.nan)
+        return values
+
+    @property
+    def trading(self) -> np.ndarray:
+        """有有效价格 (未停牌) 的行"""
+        return self.column("price") > 0
+
+    def rank(self, column: str, k: int, descending: bool = True, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """按列取前 k 名的行下标 (排除停牌股票)"""
+        base = self.trading if mask is None else self.trading & mask
+        return top_k(self.column(column), k, descending, base)
+
+    def ranking(self, name: str, k: int) -> List[Dict[str, Any]]:
+        """预定义排行 (见 RANKINGS)"""
+        column, descending = RANKINGS[name]
+        return self.records(self.rank(column, k, descending))
+
+    def records(self, rows: Optional[Iterable[int]] = None, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        将行转换为字典列表 (NaN 转为 None)
+
+        Args:
+            rows: 行下标，默认全部
+            fields: 输出字段，默认全部列
+        """
+        names = [f for f in (fields or self.columns) if f in self.columns]
+        if rows is None:
+            selected = {name: self.columns[name] for name in names}
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            selected = {name: self.columns[name][rows] for name in names}
+
+        lists = []
+        for name in names:
+            values = selected[name]
+            if values.dtype == np.float64:
+                values = np.where(np.isnan(values), None, values)
+            lists.append(values.tolist())
+        return [dict(zip(names, row)) for row in zip(*lists)]
+
+
+class QuoteTableCache:
+    """全市场行情表缓存 (过期时刷新，并发刷新合并为一次全市场请求)"""
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl or settings.quote_table_ttl
+        self._table: Optional[QuoteTable] = None
+        self._flight = SingleFlight(max_entries=1)
+        self.refreshes = 0
+
+    @property
+    def current(self) -> Optional[QuoteTable]:
+        return self._table
+
+    async def get(self, max_age: Optional[float] = None) -> Optional[QuoteTable]:
+        """
+        获取行情表
+
+        Returns:
+            未超过 max_age (默认 ttl) 的行情表；刷新失败时返回上一次的行情表 (可能为 None)
+        """
+        max_age = self.ttl if max_age is None else max_age
+        table = self._table
+        if table is not None and table.age <= max_age:
+            return table
+
+        try:
+            table = await self._flight.do("all", self._load)
+        except Exception as e:
+            logger.warning(f"刷新全市场行情表失败: {e}")
+            return self._table
+
+        if table is not None and (self._table is None or table.timestamp > self._table.timestamp):
+            self._table = table
+        return self._table
+
+    async def _load(self) -> Optional[QuoteTable]:
+        df = await coalesced_data_service.get_all_stocks_quote()
+        if df is None or df.empty:
+            return None
+        self.refreshes += 1
+        return QuoteTable.from_frame(df)
+
+    def stats(self) -> Dict[str, Any]:
+        table = self._table
+        return {
+            "rows": len(table) if table else 0,
+            "age": round(table.age, 2) if table else None,
+            "refreshes": self.refreshes
+        }
+
+
+# 全局全市场行情表
+quote_table = QuoteTableCache()
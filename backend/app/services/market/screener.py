@@ -0,0 +1,248 @@
+"""
+Lumina 明见量化 - 选股引擎
+在全市场行情表与指标引擎的列式数据上，将每个筛选条件计算为 NumPy 布尔掩码后按位与，
+支持行情区间、RSI 阈值、价格相对均线、均线交叉与 MACD 金叉 / 死叉，结果按指定列取前 k 名；
+单个条件和条件组合的掩码按 (行情表时间戳, 指标版本) 缓存，热门筛选组合直接复用。
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.kline import indicator_engine
+from app.services.kline.columnar_store import to_day
+from app.services.market.quote_table import QuoteTable, RANGE_FILTERS, top_k
+
+
+# 比较运算
+COMPARE_OPS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+}
+CROSS_OPS = ("cross_above", "cross_below")
+
+# 结果中附带的指标字段
+INDICATOR_FIELDS = ("ma5", "ma10", "ma20", "ma60", "rsi", "macd", "macd_signal", "macd_hist")
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """
+    筛选条件: column op value
+
+    value 为数值时与常数比较，为字符串时与另一列比较；
+    cross_above / cross_below 表示本根 K 线 column 上穿 / 下穿 value 列 (上一根在另一侧或相等)。
+    """
+    column: str
+    op: str
+    value: Union[float, str]
+
+    def __post_init__(self):
+        if self.op not in COMPARE_OPS and self.op not in CROSS_OPS:
+            raise ValueError(f"不支持的筛选运算: {self.op}")
+        if self.op in CROSS_OPS and not isinstance(self.value, str):
+            raise ValueError(f"交叉条件需要比较列: {self.column} {self.op} {self.value}")
+
+
+def build_predicates(
+    rsi_min: Optional[float] = None,
+    rsi_max: Optional[float] = None,
+    above_ma: Optional[int] = None,
+    below_ma: Optional[int] = None,
+    ma_cross: Optional[Tuple[int, int]] = None,
+    ma_cross_down: Optional[Tuple[int, int]] = None,
+    macd: Optional[str] = None,
+    **ranges: Optional[float]
+) -> List[Predicate]:
+    """
+    由筛选参数构建条件
+
+    Args:
+        rsi_min / rsi_max: RSI 区间
+        above_ma / below_ma: 价格在 N 日均线之上 / 之下
+        ma_cross / ma_cross_down: (快线, 慢线) 金叉 / 死叉
+        macd: golden (金叉) / death (死叉) / positive (DIF > 0) / negative (DIF < 0)
+        ranges: 行情区间参数 (见 RANGE_FILTERS)
+    """
+    predicates = []
+    for column, (min_name, max_name) in RANGE_FILTERS.items():
+        if ranges.get(min_name) is not None:
+            predicates.append(Predicate(column, ">=", float(ranges[min_name])))
+        if ranges.get(max_name) is not None:
+            predicates.append(Predicate(column, "<=", float(ranges[max_name])))
+
+    if rsi_min is not None:
+        predicates.append(Predicate("rsi", ">=", float(rsi_min)))
+    if rsi_max is not None:
+        predicates.append(Predicate("rsi", "<=", float(rsi_max)))
+    if above_ma is not None:
+        predicates.append(Predicate("price", ">", f"ma{above_ma}"))
+    if below_ma is not None:
+        predicates.append(Predicate("price", "<", f"ma{below_ma}"))
+    if ma_cross is not None:
+        predicates.append(Predicate(f"ma{ma_cross[0]}", "cross_above", f"ma{ma_cross[1]}"))
+    if ma_cross_down is not None:
+        predicates.append(Predicate(f"ma{ma_cross_down[0]}", "cross_below", f"ma{ma_cross_down[1]}"))
+
+    if macd == "golden":
+        predicates.append(Predicate("macd", "cross_above", "macd_signal"))
+    elif macd == "death":
+        predicates.append(Predicate("macd", "cross_below", "macd_signal"))
+    elif macd == "positive":
+        predicates.append(Predicate("macd", ">", 0.0))
+    elif macd == "negative":
+        predicates.append(Predicate("macd", "<", 0.0))
+    elif macd is not None:
+        raise ValueError(f"不支持的 MACD 条件: {macd}")
+    return predicates
+
+
+class ScreenFrame:
+    """选股用的列式数据: 全市场行情列 + 当前指标列 + 上一根 K 线指标列 (构建后只读)"""
+
+    def __init__(self, table: QuoteTable, indicator_version: int):
+        self.table = table
+        self.key = (table.timestamp, indicator_version)
+        current, previous = indicator_engine.columns(
+            table.columns.get("symbol", np.empty(0, dtype=object)),
+            table.column("price"),
+            day=to_day(date.today())
+        )
+        self.columns: Dict[str, np.ndarray] = {**table.columns, **current}
+        self.previous = previous
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def column(self, name: str, previous: bool = False) -> np.ndarray:
+        source = self.previous if previous else self.columns
+        values = source.get(name)
+        if values is None:
+            if name in self.columns or name in self.table.columns:
+                # 行情列没有上一根数据
+                return np.full(len(self), np.nan)
+            raise ValueError(f"未知的筛选字段: {name}")
+        return values
+
+    def evaluate(self, predicate: Predicate) -> np.ndarray:
+        left = self.column(predicate.column)
+        if predicate.op in COMPARE_OPS:
+            right = self.column(predicate.value) if isinstance(predicate.value, str) else predicate.value
+            with np.errstate(invalid="ignore"):
+                return COMPARE_OPS[predicate.op](left, right)
+
+        right = self.column(predicate.value)
+        prev_left = self.column(predicate.column, previous=True)
+        prev_right = self.column(predicate.value, previous=True)
+        with np.errstate(invalid="ignore"):
+            if predicate.op == "cross_above":
+                return (left > right) & (prev_left <= prev_right)
+            return (left < right) & (prev_left >= prev_right)
+
+
+class StockScreener:
+    """选股引擎 (掩码按行情表与指标版本缓存)"""
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size or settings.screener_mask_cache_size
+        self._frame: Optional[ScreenFrame] = None
+        self._masks: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def frame(self, table: QuoteTable) -> ScreenFrame:
+        """当前行情表对应的列式数据 (行情表或指标更新后重建，并清空掩码缓存)"""
+        key = (table.timestamp, indicator_engine.version)
+        if self._frame is None or self._frame.key != key:
+            self._frame = ScreenFrame(table, indicator_engine.version)
+            self._masks.clear()
+        return self._frame
+
+    def mask(self, frame: ScreenFrame, predicates: Sequence[Predicate]) -> np.ndarray:
+        """条件组合的掩码 (组合与单个条件分别缓存)"""
+        if not predicates:
+            return np.ones(len(frame), dtype=bool)
+
+        combo = tuple(sorted(set(predicates), key=repr))
+        cached = self._cached(combo)
+        if cached is not None:
+            return cached
+
+        mask = np.ones(len(frame), dtype=bool)
+        for predicate in combo:
+            single = self._cached((predicate,))
+            if single is None:
+                single = frame.evaluate(predicate)
+                self._store((predicate,), single)
+            mask &= single
+        self._store(combo, mask)
+        return mask
+
+    def _cached(self, key: Tuple) -> Optional[np.ndarray]:
+        mask = self._masks.get(key)
+        if mask is None:
+            self.misses += 1
+            return None
+        self._masks.move_to_end(key)
+        self.hits += 1
+        return mask
+
+    def _store(self, key: Tuple, mask: np.ndarray):
+        mask.flags.writeable = False
+        self._masks[key] = mask
+        while len(self._masks) > self.cache_size:
+            self._masks.popitem(last=False)
+
+    def screen(
+        self,
+        table: QuoteTable,
+        predicates: Sequence[Predicate],
+        sort_by: Optional[str] = None,
+        descending: bool = True,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        选股
+
+        Args:
+            table: 全市场行情表
+            predicates: 筛选条件 (全部满足)
+            sort_by: 排序字段 (行情或指标列)，为空时保持行情表顺序
+            descending: 是否降序
+            limit: 返回数量
+
+        Returns:
+            行情字段 + 当前指标字段的记录列表
+        """
+        frame = self.frame(table)
+        mask = self.mask(frame, predicates)
+        if sort_by:
+            rows = top_k(frame.column(sort_by), limit, descending, mask)
+        else:
+            rows = np.flatnonzero(mask)[:limit]
+
+        records = table.records(rows)
+        for name in INDICATOR_FIELDS:
+            values = frame.columns.get(name)
+            if values is None:
+                continue
+            selected = values[rows]
+            for record, value in zip(records, np.where(np.isnan(selected), None, np.round(selected, 4)).tolist()):
+                record[name] = value
+        return records
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached_masks": len(self._masks),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# 全局选股引擎
+stock_screener = StockScreener()
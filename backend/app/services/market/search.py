@@ -0,0 +1,211 @@
+"""
+Lumina 明见量化 - 股票搜索索引
+对股票代码、中文名称和拼音首字母预先建立前缀字典树 (trie) 与 n-gram (至多三字) 倒排索引，
+股票列表刷新时在后台线程重建；边输边搜的查询只读内存索引，不再访问上游股票列表。
+拼音首字母依赖可选的 pypinyin，未安装时仅索引代码和名称。
+"""
+import asyncio
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+from loguru import logger
+
+from app.core.config import settings
+from app.services.market.coalesce import coalesced_data_service
+
+
+# 索引字段 (按匹配优先级排序)
+FIELDS = ("symbol", "name", "pinyin")
+
+# 字典树节点中保存下标的键；每个节点最多保存的股票数
+IDS = ""
+MAX_NODE_IDS = 100
+
+# n-gram 最大长度
+GRAM = 3
+
+
+def _pinyin_initials():
+    """返回拼音首字母函数 (pypinyin 未安装时返回 None)"""
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        logger.warning("pypinyin 未安装，股票搜索不支持拼音首字母")
+        return None
+
+    def initials(name: str) -> str:
+        return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+
+    return initials
+
+
+def normalize(text: Any) -> str:
+    return str(text).strip().lower() if text is not None else ""
+
+
+class StockSearchIndex:
+    """股票搜索索引 (构建后只读)"""
+
+    def __init__(self, records: List[Dict[str, Any]], with_pinyin: bool = True):
+        self.records = records
+        initials = _pinyin_initials() if with_pinyin else None
+
+        self.keys: Dict[str, List[str]] = {
+            "symbol": [normalize(r.get("symbol")) for r in records],
+            "name": [normalize(r.get("name")) for r in records],
+            "pinyin": [initials(str(r.get("name") or "")) if initials else "" for r in records],
+        }
+        self._tries = {field: self._build_trie(keys) for field, keys in self.keys.items()}
+        self._grams = self._build_grams()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _build_trie(self, keys: List[str]) -> Dict:
+        """前缀字典树，每个节点保存以该前缀开头的股票 (按键长度、代码排序)"""
+        root: Dict = {IDS: []}
+        order = sorted(range(len(keys)), key=lambda i: (len(keys[i]), self.keys["symbol"][i]))
+        for i in order:
+            key = keys[i]
+            if not key:
+                continue
+            node = root
+            for ch in key:
+                node = node.setdefault(ch, {IDS: []})
+                if len(node[IDS]) < MAX_NODE_IDS:
+                    node[IDS].append(i)
+        return root
+
+    def _build_grams(self) -> Dict[str, Set[int]]:
+        """长度 1..GRAM 的子串 -> 包含该子串的股票"""
+        grams: Dict[str, Set[int]] = {}
+        for keys in self.keys.values():
+            for i, key in enumerate(keys):
+                for n in range(1, GRAM + 1):
+                    for start in range(len(key) - n + 1):
+                        grams.setdefault(key[start:start + n], set()).add(i)
+        return grams
+
+    def _prefix(self, field: str, query: str) -> List[int]:
+        node = self._tries[field]
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node[IDS]
+
+    def _substring(self, query: str) -> Set[int]:
+        """包含查询子串的候选股票 (超过 GRAM 的查询对各段 n-gram 求交集后需再校验)"""
+        if len(query) <= GRAM:
+            return self._grams.get(query, set())
+        sets = [self._grams.get(query[i:i + GRAM]) for i in range(len(query) - GRAM + 1)]
+        if not all(sets):
+            return set()
+        return set.intersection(*sorted(sets, key=len))
+
+    def search(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        搜索股票
+
+        排序: 完全匹配 > 前缀匹配 > 包含匹配；同级按字段 (代码 > 名称 > 拼音)、匹配位置、键长度排序。
+        """
+        query = normalize(keyword)
+        if not query or limit <= 0:
+            return []
+
+        ranked: List[Tuple] = []
+        for rank, field in enumerate(FIELDS):
+            keys = self.keys[field]
+            for i in self._prefix(field, query)[:limit]:
+                ranked.append((0 if keys[i] == query else 1, rank, 0, len(keys[i]), i))
+        ranked.sort()
+
+        results: List[int] = []
+        seen: Set[int] = set()
+        for *_, i in ranked:
+            if i not in seen:
+                seen.add(i)
+                results.append(i)
+                if len(results) >= limit:
+                    return [self.records[i] for i in results]
+
+        # 单个 ASCII 字符 (数字、拼音首字母) 只做前缀匹配，避免返回大量弱相关结果；
+        # 单个汉字 (如 "茅") 多出现在名称中间，仍做包含匹配
+        if len(query) > 1 or not query.isascii():
+            contains = []
+            for i in self._substring(query) - seen:
+                for rank, field in enumerate(FIELDS):
+                    position = self.keys[field][i].find(query)
+                    if position >= 0:
+                        contains.append((2, rank, position, len(self.keys[field][i]), i))
+                        break
+            results.extend(t[-1] for t in heapq.nsmallest(limit - len(results), contains))
+
+        return [self.records[i] for i in results]
+
+
+class StockSearch:
+    """股票搜索服务：持有当前索引，过期时后台重建 (重建期间继续使用旧索引)"""
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl or settings.search_index_ttl
+        self._index: Optional[StockSearchIndex] = None
+        self._built_at = 0.0
+        self._rebuilding: Optional[asyncio.Task] = None
+        self.rebuilds = 0
+
+    @property
+    def index(self) -> Optional[StockSearchIndex]:
+        return self._index
+
+    async def search(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
+        index = await self.get()
+        return index.search(keyword, limit) if index is not None else []
+
+    async def get(self) -> Optional[StockSearchIndex]:
+        """
+        获取索引
+
+        首次调用等待构建 (并发调用等待同一次构建)；过期时在后台重建并立即返回旧索引。
+        """
+        if self._index is None or time.time() - self._built_at > self.ttl:
+            if self._rebuilding is None or self._rebuilding.done():
+                self._rebuilding = asyncio.ensure_future(self.refresh())
+            if self._index is None:
+                await asyncio.shield(self._rebuilding)
+        return self._index
+
+    async def refresh(self) -> Optional[StockSearchIndex]:
+        """重新获取股票列表并重建索引"""
+        try:
+            stocks = await coalesced_data_service.get_stock_list()
+            if stocks is None or stocks.empty:
+                return self._index
+            index = await asyncio.to_thread(self.build, stocks)
+        except Exception as e:
+            logger.warning(f"重建股票搜索索引失败: {e}")
+            return self._index
+
+        self._index = index
+        self._built_at = time.time()
+        self.rebuilds += 1
+        logger.info(f"股票搜索索引已重建: {len(index)} 只股票")
+        return index
+
+    @staticmethod
+    def build(stocks: pd.DataFrame) -> StockSearchIndex:
+        stocks = stocks.astype(object).where(stocks.notna(), None)
+        return StockSearchIndex(stocks.to_dict("records"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stocks": len(self._index) if self._index else 0,
+            "rebuilds": self.rebuilds,
+            "age": round(time.time() - self._built_at, 1) if self._index else None
+        }
+
+
+# 全局股票搜索
+stock_search = StockSearch()
@@ -0,0 +1,21 @@
+"""
+Lumina 明见量化 - 交易时段
+A 股连续竞价时段判断，供市场快照刷新和持仓行情更新循环在非交易时段暂停定时刷新。
+"""
+from datetime import datetime, time as dtime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+
+# A 股连续竞价时段 (北京时间)
+MARKET_TZ = ZoneInfo("Asia/Shanghai")
+TRADING_SESSIONS = ((dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+
+
+def is_trading_session(now: Optional[datetime] = None) -> bool:
+    """当前是否处于交易时段 (工作日 9:30-11:30, 13:00-15:00)"""
+    now = now or datetime.now(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    current = now.time()
+    return any(start <= current <= end for start, end in TRADING_SESSIONS)
@@ -0,0 +1,279 @@
+"""
+Lumina 明见量化 - 市场快照
+由单一生产者在交易时段内按固定间隔构建带时间戳的不可变市场快照 (指数、热门股票、行情、技术指标、候选股票)，
+非交易时段只在读取到过期快照时按需构建。调度任务、市场 API 和 WebSocket 行情推送读取同一份快照，
+并发读取不会触发重复的上游请求。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.kline import indicator_engine
+from app.services.kline.columnar_store import to_day
+from app.services.market.coalesce import coalesced_data_service
+from app.services.market.quote_table import quote_table
+from app.services.market.session import is_trading_session
+from app.services.trading import portfolio_state_store
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    市场快照 (构建后只读)
+
+    字段中的字典和列表与其他消费者共享，读取方不得原地修改；需要修改时先复制 (如 candidate_list)。
+    """
+    timestamp: float                                   # 构建完成时间 (time.time())
+    market: Dict[str, Any]                             # 大盘概况 (上证指数、涨跌幅、情绪)
+    indices: Dict[str, Dict[str, Any]]                 # 主要指数行情
+    hot: Tuple[Dict[str, Any], ...]                    # 热门股票 (按热度排序)
+    quotes: Dict[str, Dict[str, Any]]                  # 热门股票 + 持仓股票的实时行情
+    indicators: Dict[str, Dict[str, Optional[float]]]  # 指标引擎按当前价格试算的技术指标
+    candidates: Tuple[Dict[str, Any], ...] = field(default=())  # 已补全指标的候选股票
+
+    @property
+    def age(self) -> float:
+        """快照时效 (秒)"""
+        return time.time() - self.timestamp
+
+    def is_fresh(self, max_age: float) -> bool:
+        return self.age <= max_age
+
+    def candidate_list(self) -> List[Dict[str, Any]]:
+        """候选股票的可修改副本"""
+        return [dict(stock) for stock in self.candidates]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "market": self.market,
+            "indices": self.indices,
+            "hot": list(self.hot),
+            "quote_count": len(self.quotes),
+            "indicators": self.indicators
+        }
+
+
+# 无可用数据时的大盘概况
+UNKNOWN_MARKET = {"sh_index": "N/A", "sh_change": "N/A", "sentiment": "unknown"}
+
+
+def _sentiment(change_pct: float) -> str:
+    return "bullish" if change_pct > 0.5 else ("bearish" if change_pct < -0.5 else "neutral")
+
+
+class MarketSnapshotProducer:
+    """市场快照生产者：后台任务按间隔刷新，读取方按最大时效取用"""
+
+    def __init__(self, interval: Optional[float] = None, hot_size: Optional[int] = None):
+        self.interval = interval or settings.market_snapshot_interval
+        self.hot_size = max(hot_size or settings.market_snapshot_hot_size, settings.candidate_pool_size)
+        self._snapshot: Optional[MarketSnapshot] = None
+        self._refreshing: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.builds = 0
+        self.reads = 0
+
+    @property
+    def current(self) -> Optional[MarketSnapshot]:
+        """最近一次发布的快照 (尚未构建时为 None)"""
+        return self._snapshot
+
+    async def get(self, max_age: Optional[float] = None) -> MarketSnapshot:
+        """
+        获取快照
+
+        最近一次快照未超过 max_age (默认刷新间隔) 时直接返回；否则刷新，
+        刷新进行中时所有调用方等待同一次刷新，不重复请求上游。
+        """
+        self.reads += 1
+        max_age = self.interval if max_age is None else max_age
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.is_fresh(max_age):
+            return snapshot
+        return await self.refresh()
+
+    async def refresh(self) -> MarketSnapshot:
+        """构建并发布新快照 (并发调用合并为一次构建)"""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._build())
+            self._refreshing.add_done_callback(self._publish)
+        return await asyncio.shield(self._refreshing)
+
+    def _publish(self, future: asyncio.Future):
+        self._refreshing = None
+        if not future.cancelled() and future.exception() is None:
+            self._snapshot = future.result()
+            self.builds += 1
+
+    async def _build(self) -> MarketSnapshot:
+        indices, hot = await asyncio.gather(self._get_indices(), self._get_hot())
+
+        quotes = {stock["symbol"]: stock for stock in hot}
+        held = [s for s in self._held_symbols() if s not in quotes]
+        quotes.update(await self._get_quotes(held))
+        now = time.time()
+
+        indicators = indicator_engine.peek({
+            symbol: quote.get("price")
+            for symbol, quote in quotes.items()
+            if isinstance(quote.get("price"), (int, float)) and quote.get("price") > 0
+        }, day=to_day(date.today()))
+
+        market = await self._market_summary(indices)
+        candidates = await self._build_candidates(hot[:settings.candidate_pool_size], now)
+
+        return MarketSnapshot(
+            timestamp=now,
+            market=market,
+            indices=indices,
+            hot=tuple(hot),
+            quotes=quotes,
+            indicators=indicators,
+            candidates=tuple(candidates)
+        )
+
+    async def _get_indices(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return await coalesced_data_service.get_index_quote() or {}
+        except Exception as e:
+            logger.warning(f"获取实时指数失败: {e}")
+            return {}
+
+    async def _get_hot(self) -> List[Dict[str, Any]]:
+        table = await quote_table.get()
+        if table is not None:
+            return table.ranking("hot", self.hot_size)
+
+        try:
+            hot_stocks = await coalesced_data_service.get_hot_stocks(self.hot_size)
+            return [] if hot_stocks.empty else hot_stocks.to_dict("records")
+        except Exception as e:
+            logger.warning(f"获取热门股票失败: {e}")
+            return []
+
+    @staticmethod
+    def _held_symbols() -> List[str]:
+        """已加载组合的持仓股票并集"""
+        symbols: Dict[str, None] = {}
+        for state in portfolio_state_store.states():
+            symbols.update(dict.fromkeys(state.positions))
+        return list(symbols)
+
+    async def _get_quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """分批并发获取行情"""
+        batch_size = settings.quote_batch_size
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+        results = await asyncio.gather(
+            *(coalesced_data_service.get_realtime_quote(batch) for batch in batches),
+            return_exceptions=True
+        )
+
+        quotes: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"获取快照行情失败: {result}")
+                continue
+            if not result.empty:
+                quotes.update((quote["symbol"], quote) for quote in result.to_dict("records"))
+        return quotes
+
+    @staticmethod
+    async def _market_summary(indices: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """大盘概况：优先使用实时指数，备选指数日线"""
+        sh_data = indices.get("s_sh000001")
+        if sh_data:
+            return {
+                "sh_index": sh_data["price"],
+                "sh_change": round(sh_data["change_pct"], 2),
+                "sentiment": _sentiment(sh_data["change_pct"])
+            }
+
+        try:
+            index_data = await coalesced_data_service.get_index_daily("000001")
+            if not index_data.empty:
+                latest = index_data.iloc[-1]
+                prev_close = index_data.iloc[-2]["close"] if len(index_data) > 1 else latest["close"]
+                change = (latest["close"] - prev_close) / prev_close * 100
+                return {
+                    "sh_index": latest["close"],
+                    "sh_change": round(change, 2),
+                    "sentiment": _sentiment(change)
+                }
+        except Exception as e:
+            logger.warning(f"获取指数日线失败: {e}")
+
+        return dict(UNKNOWN_MARKET)
+
+    @staticmethod
+    async def _build_candidates(hot: Iterable[Dict[str, Any]], quote_time: float) -> List[Dict[str, Any]]:
+        """由热门股票构建候选股票并补全技术指标"""
+        # 延迟导入: strategy 包在导入时依赖本模块
+        from app.services.strategy.enrichment import enrich_candidates
+
+        candidates = [
+            {
+                "symbol": row["symbol"],
+                "name": row.get("name", ""),
+                "price": row.get("price", 0),
+                "change_pct": row.get("change_pct", 0),
+                "amount": row.get("amount", 0),
+                "turnover_rate": row.get("turnover_rate", 0),
+                "pe_ratio": row.get("pe_ratio", 0),
+                "market_cap": row.get("market_cap", 0),
+                "quote_time": quote_time
+            }
+            for row in hot
+        ]
+        if not candidates:
+            return []
+        try:
+            # 并发补全技术指标（超时或失败的股票使用 N/A，不阻塞整批）
+            return await enrich_candidates(candidates)
+        except Exception as e:
+            logger.warning(f"补全候选股票指标失败: {e}")
+            return candidates
+
+    def start(self):
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        """交易时段内定时刷新；非交易时段行情不变，不再定时请求上游，由 get() 按需刷新"""
+        logger.info(f"市场快照刷新循环已启动，交易时段内间隔 {self.interval}s")
+        while True:
+            started = time.monotonic()
+            if not is_trading_session():
+                await asyncio.sleep(self.interval)
+                continue
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"构建市场快照失败: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "builds": self.builds,
+            "reads": self.reads,
+            "age": round(snapshot.age, 2) if snapshot else None,
+            "hot": len(snapshot.hot) if snapshot else 0,
+            "quotes": len(snapshot.quotes) if snapshot else 0
+        }
+
+
+# 全局市场快照
+market_snapshot = MarketSnapshotProducer()
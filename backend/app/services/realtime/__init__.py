@@ -0,0 +1,7 @@
+"""
+Lumina 明见量化 - 实时推送服务模块
+"""
+from app.services.realtime.portfolio_feed import PortfolioFeed, diff_status
+from app.services.realtime.quote_feed import QuoteFeed, quote_feed
+
+__all__ = ["PortfolioFeed", "diff_status", "QuoteFeed", "quote_feed"]
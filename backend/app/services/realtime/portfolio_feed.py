@@ -0,0 +1,110 @@
+"""
+Lumina 明见量化 - 组合状态推送源
+维护带版本号的组合快照，并计算相邻版本之间的 JSON Patch 风格增量
+"""
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+
+def diff_status(old: Dict, new: Dict) -> List[Dict]:
+    """
+    计算两个组合状态之间的增量操作
+
+    标量字段使用 "/field" 路径，持仓按股票代码使用 "/positions/{symbol}" 路径。
+    """
+    ops: List[Dict] = []
+
+    for key, value in new.items():
+        if key == "positions":
+            continue
+        if key not in old:
+            ops.append({"op": "add", "path": f"/{key}", "value": value})
+        elif old[key] != value:
+            ops.append({"op": "replace", "path": f"/{key}", "value": value})
+
+    old_positions = {p["symbol"]: p for p in old.get("positions", [])}
+    new_positions = {p["symbol"]: p for p in new.get("positions", [])}
+
+    for symbol in old_positions.keys() - new_positions.keys():
+        ops.append({"op": "remove", "path": f"/positions/{symbol}"})
+
+    for symbol, position in new_positions.items():
+        previous = old_positions.get(symbol)
+        if previous is None:
+            ops.append({"op": "add", "path": f"/positions/{symbol}", "value": position})
+        elif previous != position:
+            ops.append({"op": "replace", "path": f"/positions/{symbol}", "value": position})
+
+    return ops
+
+
+class PortfolioFeed:
+    """版本化的组合快照推送源"""
+
+    def __init__(self, portfolio_id: Optional[int] = None, history_size: int = 100):
+        self.portfolio_id = portfolio_id
+        self.version = 0                 # 已发布快照的版本号 (即消息序号)
+        self.snapshot: Optional[Dict] = None
+        self._source_version = 0         # 最近一次处理的状态版本
+        self._deltas: Deque[Dict] = deque(maxlen=history_size)
+
+    def is_current(self, version: int) -> bool:
+        """该状态版本是否已处理过"""
+        return self.snapshot is not None and version == self._source_version
+
+    def publish(self, version: int, status: Dict) -> Optional[Dict]:
+        """
+        发布新版本的组合状态
+
+        Returns:
+            增量消息；版本未变化、首次发布或内容无变化时返回 None
+        """
+        if self.is_current(version):
+            return None
+        self._source_version = version
+
+        if self.snapshot is None:
+            self.snapshot, self.version = status, version
+            return None
+
+        ops = diff_status(self.snapshot, status)
+        if not ops:
+            return None
+
+        message = {
+            "type": "portfolio_delta",
+            "portfolio_id": self.portfolio_id,
+            "seq": version,
+            "base": self.version,
+            "timestamp": datetime.now().isoformat(),
+            "ops": ops
+        }
+        self.snapshot, self.version = status, version
+        self._deltas.append(message)
+        return message
+
+    def deltas_since(self, version: int) -> Optional[List[Dict]]:
+        """
+        获取某版本之后的全部增量
+
+        Returns:
+            增量列表 (已是最新时为空列表)；历史不足以衔接时返回 None，需发送全量快照
+        """
+        if version == self.version:
+            return []
+
+        result = [message for message in self._deltas if message["seq"] > version]
+        if not result or result[0]["base"] != version:
+            return None
+        return result
+
+    def snapshot_message(self) -> Dict:
+        """全量快照消息"""
+        return {
+            "type": "portfolio_snapshot",
+            "portfolio_id": self.portfolio_id,
+            "seq": self.version,
+            "timestamp": datetime.now().isoformat(),
+            "data": self.snapshot
+        }
@@ -0,0 +1,136 @@
+"""
+Lumina 明见量化 - 共享行情订阅
+所有客户端共享一个轮询器：按订阅股票的并集分批获取行情，只把变化的行情推送给订阅者
+"""
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.market import market_snapshot, coalesced_data_service
+
+
+# 判断行情是否变化的字段
+CHANGE_FIELDS = ("price", "change_pct", "volume", "amount")
+
+
+class QuoteFeed:
+    """行情订阅注册表 + 共享轮询器"""
+
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._subscribers: Dict[str, Set[Hashable]] = {}   # symbol -> 订阅者
+        self._client_symbols: Dict[Hashable, Set[str]] = {}  # 订阅者 -> symbols
+        self._quotes: Dict[str, Dict[str, Any]] = {}        # 最近一次行情
+        self.fetch_count = 0
+
+    @property
+    def symbols(self) -> List[str]:
+        """当前被订阅的全部股票"""
+        return list(self._subscribers.keys())
+
+    def subscribe(self, client: Hashable, symbols: Iterable[str]) -> Tuple[List[Dict], List[str]]:
+        """
+        订阅行情
+
+        Returns:
+            (已缓存的行情, 尚无缓存需要立即获取的股票)
+        """
+        cached, missing = [], []
+        client_symbols = self._client_symbols.setdefault(client, set())
+        for symbol in symbols:
+            self._subscribers.setdefault(symbol, set()).add(client)
+            client_symbols.add(symbol)
+            if symbol in self._quotes:
+                cached.append(self._quotes[symbol])
+            else:
+                missing.append(symbol)
+        return cached, missing
+
+    def unsubscribe(self, client: Hashable, symbols: Optional[Iterable[str]] = None):
+        """取消订阅 (不指定股票时取消该客户端的全部订阅)"""
+        client_symbols = self._client_symbols.get(client)
+        if not client_symbols:
+            self._client_symbols.pop(client, None)
+            return
+
+        for symbol in list(symbols) if symbols is not None else list(client_symbols):
+            client_symbols.discard(symbol)
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(client)
+            if not subscribers:
+                # 无人订阅的股票不再轮询
+                del self._subscribers[symbol]
+                self._quotes.pop(symbol, None)
+
+        if not client_symbols:
+            del self._client_symbols[client]
+
+    async def fetch(self, symbols: List[str]) -> List[Dict]:
+        """分批获取行情，返回相对上次发生变化的行情 (足够新的市场快照中已有的股票不再请求)"""
+        snapshot = market_snapshot.current
+        from_snapshot = []
+        if snapshot is not None and snapshot.is_fresh(settings.quote_poll_interval):
+            from_snapshot = [snapshot.quotes[s] for s in symbols if s in snapshot.quotes]
+            symbols = [s for s in symbols if s not in snapshot.quotes]
+
+        batches = [
+            symbols[i:i + self.batch_size]
+            for i in range(0, len(symbols), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *(coalesced_data_service.get_realtime_quote(batch) for batch in batches),
+            return_exceptions=True
+        )
+        self.fetch_count += len(batches)
+
+        quotes = list(from_snapshot)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"轮询行情失败: {result}")
+                continue
+            if not result.empty:
+                quotes.extend(result.to_dict("records"))
+
+        changed = []
+        for quote in quotes:
+            symbol = quote.get("symbol")
+            if symbol not in self._subscribers:
+                continue
+            previous = self._quotes.get(symbol)
+            if previous is None or any(
+                previous.get(f) != quote.get(f) for f in CHANGE_FIELDS
+            ):
+                self._quotes[symbol] = quote
+                changed.append(quote)
+        return changed
+
+    async def poll(self, symbols: Optional[List[str]] = None) -> Dict[Hashable, List[Dict]]:
+        """
+        轮询一次订阅股票 (默认全部)
+
+        Returns:
+            {订阅者: 变化的行情列表}
+        """
+        symbols = self.symbols if symbols is None else symbols
+        if not symbols:
+            return {}
+
+        updates: Dict[Hashable, List[Dict]] = {}
+        for quote in await self.fetch(symbols):
+            for client in self._subscribers.get(quote["symbol"], ()):
+                updates.setdefault(client, []).append(quote)
+        return updates
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "symbols": len(self._subscribers),
+            "subscribers": len(self._client_symbols),
+            "fetch_count": self.fetch_count
+        }
+
+
+# 全局行情订阅
+quote_feed = QuoteFeed(batch_size=settings.quote_batch_size)
@@ -2,5 +2,6 @@
 Lumina 明见量化 - 策略服务模块
 """
 from app.services.strategy.scheduler import StrategyScheduler, strategy_scheduler
+from app.services.strategy.risk_monitor import RiskMonitor, risk_monitor
 
-__all__ = ["StrategyScheduler", "strategy_scheduler"]
+__all__ = ["StrategyScheduler", "strategy_scheduler", "RiskMonitor", "risk_monitor"]
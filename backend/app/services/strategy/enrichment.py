@@ -0,0 +1,116 @@
+"""
+Lumina 明见量化 - 候选股票并发补全
+优先由指标引擎以盘中价格 O(1) 试算技术指标；引擎中没有的股票再以有界并发 + 数据源限速 + 单只超时的方式获取历史数据
+"""
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.services.kline import indicator_engine
+from app.services.market.coalesce import coalesced_data_service
+from app.services.kline.columnar_store import to_day
+
+
+# 补全的技术指标字段
+INDICATOR_FIELDS = ("ma5", "ma20", "rsi", "macd")
+
+
+class RateLimiter:
+    """异步速率限制器 (按最小请求间隔放行)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """等待直到允许发出下一个请求"""
+        if not self.interval:
+            return
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            wait = self._next_time - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                now = self._next_time
+            self._next_time = now + self.interval
+
+
+# 各数据源的限速器
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(source: str) -> RateLimiter:
+    """获取数据源对应的限速器"""
+    limiter = _rate_limiters.get(source)
+    if limiter is None:
+        limiter = RateLimiter(settings.candidate_rate_limit)
+        _rate_limiters[source] = limiter
+    return limiter
+
+
+async def enrich_candidates(
+    candidates: List[Dict],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    source: str = "historical"
+) -> List[Dict]:
+    """
+    并发补全候选股票的技术指标
+
+    Args:
+        candidates: 候选股票列表 (原地补充指标字段)
+        concurrency: 最大并发数，默认取配置
+        timeout: 单只股票超时 (秒)，默认取配置
+        source: 数据源名称，用于选择限速器
+
+    Returns:
+        补全后的候选股票列表，超时或失败的股票指标为 "N/A"
+    """
+    # 指标引擎中已有状态的股票直接用当前价格试算
+    computed = indicator_engine.peek({
+        stock["symbol"]: stock.get("price")
+        for stock in candidates
+        if isinstance(stock.get("price"), (int, float)) and stock.get("price") > 0
+    }, day=to_day(date.today()))
+    for stock in candidates:
+        indicators = computed.get(stock["symbol"])
+        if indicators:
+            stock.update({
+                field: "N/A" if indicators.get(field) is None else round(indicators[field], 4)
+                for field in INDICATOR_FIELDS
+            })
+    pending = [stock for stock in candidates if stock["symbol"] not in computed]
+    if not pending:
+        return candidates
+
+    semaphore = asyncio.Semaphore(concurrency or settings.candidate_concurrency)
+    limiter = get_rate_limiter(source)
+    timeout = timeout or settings.candidate_fetch_timeout
+
+    async def enrich(stock: Dict) -> Dict:
+        try:
+            async with semaphore:
+                await limiter.acquire()
+                hist = await asyncio.wait_for(
+                    coalesced_data_service.get_historical_data(stock["symbol"], period="daily"),
+                    timeout=timeout
+                )
+
+            if not hist.empty:
+                latest = hist.iloc[-1]
+                stock.update({field: latest.get(field) for field in INDICATOR_FIELDS})
+        except asyncio.TimeoutError:
+            logger.debug(f"获取历史数据超时 [{stock['symbol']}]")
+            stock.update({field: "N/A" for field in INDICATOR_FIELDS})
+        except Exception:
+            # 历史数据获取失败，使用 N/A
+            stock.update({field: "N/A" for field in INDICATOR_FIELDS})
+        return stock
+
+    await asyncio.gather(*(enrich(stock) for stock in pending))
+    return candidates
@@ -0,0 +1,128 @@
+"""
+Lumina 明见量化 - 持仓风控监控
+每次持仓价格更新后对本次取得行情的持仓向量化检查止损 / 止盈，触发时在同一次更新内直接下达卖出指令，不经过 LLM
+"""
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+from app.services.llm import TradingDecision
+from app.services.trading import TradingService, PositionState, portfolio_state_store
+from app.services.trading.rules import TradingRules, trading_rules
+
+
+class RiskMonitor:
+    """止损 / 止盈快速通道"""
+
+    def __init__(self, rules: Optional[TradingRules] = None):
+        self.rules = rules or trading_rules
+        self.triggered = 0
+        self.skipped_stale = 0  # 本次更新没有行情而跳过检查的持仓次数
+
+    def evaluate(
+        self,
+        positions: Iterable[PositionState],
+        symbols: Optional[Set[str]] = None
+    ) -> List[TradingDecision]:
+        """
+        按当前价格检查持仓
+
+        本轮持仓是否已止盈记录在持仓上 (PositionState.profit_taken，持久化到持仓表)，清仓后随持仓删除，
+        重新建仓的股票重新允许止盈。
+
+        Args:
+            positions: 持仓状态
+            symbols: 本次更新取得行情的股票，其余持仓的价格已过时，不做检查；默认检查全部
+
+        Returns:
+            需要立即执行的卖出决策
+        """
+        positions = [p for p in positions if p.quantity > 0]
+        if symbols is not None:
+            fresh = [p for p in positions if p.symbol in symbols]
+            self.skipped_stale += len(positions) - len(fresh)
+            positions = fresh
+        if not positions:
+            return []
+
+        price = np.array([p.current_price for p in positions], dtype=np.float64)
+        avg_cost = np.array([p.avg_cost for p in positions], dtype=np.float64)
+        quantity = np.array([p.quantity for p in positions], dtype=np.int64)
+        can_sell = np.array([p.can_sell for p in positions], dtype=bool)
+        profit_taken = np.array([p.profit_taken for p in positions], dtype=bool)
+
+        stop, take = self.rules.exit_signals(price, avg_cost)
+        sell = self.rules.exit_quantities(quantity, stop & can_sell, take & can_sell, profit_taken)
+
+        decisions = []
+        for i in np.flatnonzero(sell):
+            position = positions[i]
+            pnl_ratio = (price[i] - avg_cost[i]) / avg_cost[i]
+            if stop[i]:
+                reason, confidence = f"触发止损 (亏损 {pnl_ratio*100:.2f}%)", 0.9
+            else:
+                reason, confidence = f"触发止盈 (盈利 {pnl_ratio*100:.2f}%)", 0.8
+            decisions.append(TradingDecision(
+                symbol=position.symbol,
+                name=position.name,
+                action="sell",
+                quantity=int(sell[i]),
+                reason=reason,
+                confidence=confidence
+            ))
+        return decisions
+
+    async def check(
+        self,
+        trading_service: TradingService,
+        portfolio_id: int,
+        quote_age_ms: Optional[int] = None,
+        symbols: Optional[Set[str]] = None
+    ) -> List:
+        """
+        检查组合持仓并立即执行触发的卖出
+
+        Args:
+            symbols: 本次更新取得行情的股票，没有新鲜行情的持仓不检查
+
+        Returns:
+            已提交的订单列表
+        """
+        state = portfolio_state_store.get(portfolio_id)
+        if state is None:
+            return []
+
+        orders = []
+        for decision in self.evaluate(list(state.positions.values()), symbols):
+            price = state.positions[decision.symbol].current_price
+            order = await trading_service.execute_decision(
+                portfolio_id,
+                decision,
+                price,
+                quote_age_ms=quote_age_ms
+            )
+            if order is None:
+                continue
+            orders.append(order)
+            if order.status == "filled":
+                self.triggered += 1
+                if decision.reason.startswith("触发止盈"):
+                    await trading_service.mark_profit_taken(portfolio_id, decision.symbol)
+                logger.info(
+                    f"风控卖出: {decision.symbol} {decision.quantity}股 @ {price:.2f}, {decision.reason}"
+                )
+        return orders
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "triggered": self.triggered,
+            "skipped_stale": self.skipped_stale,
+            "profit_taken": sum(
+                p.profit_taken for state in portfolio_state_store.states() for p in state.positions.values()
+            )
+        }
+
+
+# 全局风控监控
+risk_monitor = RiskMonitor()
@@ -3,18 +3,21 @@ Lumina 明见量化 - 策略调度服务
 定时执行策略分析和交易决策
 """
 import asyncio
-from datetime import datetime, time
-from typing import Optional
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple
 from loguru import logger
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from app.core.config import settings
 from app.core.database import async_session_factory
-from app.services.data import data_service
 from app.services.data.kline_storage import kline_storage
+from app.services.kline import kline_store, indicator_engine
 from app.services.llm import llm_engine
-from app.services.trading import TradingService
+from app.services.market import market_snapshot, coalesced_data_service, is_trading_session
+from app.services.trading import TradingService, portfolio_state_store
+from app.services.strategy.risk_monitor import risk_monitor
 
 
 class StrategyScheduler:
@@ -24,7 +27,12 @@ class StrategyScheduler:
         self.scheduler = AsyncIOScheduler()
         self.is_running = False
         self.last_analysis_time: Optional[datetime] = None
-        self.portfolio_id: Optional[int] = None
+        self.portfolio_id: Optional[int] = None      # 默认组合
+        self.portfolio_ids: List[int] = []           # 全部启用的组合
+        self._position_task: Optional[asyncio.Task] = None
+        self._llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        # 串行化各组合的交易执行与提交 (SQLite 只允许一个写事务，并发提交会遇到 database is locked)
+        self._db_write_lock = asyncio.Lock()
     
     async def init(self):
         """初始化调度器"""
@@ -34,26 +42,30 @@ class StrategyScheduler:
             portfolio = await trading_service.get_or_create_portfolio()
             self.portfolio_id = portfolio.id
             await db.commit()
+        await self.refresh_portfolios()
         
-        logger.info(f"策略调度器初始化完成，投资组合 ID: {self.portfolio_id}")
+        # 从列式存储一次性计算全市场指标状态，之后按 K 线增量更新
+        try:
+            await asyncio.to_thread(
+                indicator_engine.bootstrap_from_store,
+                kline_store, "daily", settings.indicator_lookback
+            )
+            logger.info(f"指标引擎初始化完成: {len(indicator_engine)} 只股票")
+        except Exception as e:
+            logger.warning(f"指标引擎初始化失败: {e}")
+        
+        logger.info(f"策略调度器初始化完成，默认组合 ID: {self.portfolio_id}, 启用组合: {self.portfolio_ids}")
     
     def start(self):
         """启动调度器"""
         if self.is_running:
             return
         
-        # 交易时段行情更新 (每分钟)
-        self.scheduler.add_job(
-            self._update_positions,
-            CronTrigger(
-                day_of_week='mon-fri',
-                hour='9-11,13-15',
-                minute='*',
-                timezone='Asia/Shanghai'
-            ),
-            id='update_positions',
-            replace_existing=True
-        )
+        # 交易时段持续更新持仓价格 (间隔由 position_tick_interval 配置)
+        self._position_task = asyncio.get_event_loop().create_task(self._position_loop())
+        
+        # 市场快照按 market_snapshot_interval 后台刷新
+        market_snapshot.start()
         
         # 开盘前分析 (9:25)
         self.scheduler.add_job(
@@ -130,28 +142,92 @@ class StrategyScheduler:
             return
         
         self.scheduler.shutdown()
+        if self._position_task:
+            self._position_task.cancel()
+            self._position_task = None
+        market_snapshot.stop()
         self.is_running = False
         logger.info("策略调度器已停止")
     
+    async def _position_loop(self):
+        """交易时段内按固定间隔更新持仓价格"""
+        interval = settings.position_tick_interval
+        logger.info(f"持仓行情更新循环已启动，间隔 {interval}s")
+        while True:
+            started = time.monotonic()
+            if is_trading_session():
+                await self._update_positions()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    
+    async def refresh_portfolios(self) -> List[int]:
+        """重新读取启用的组合列表 (组合创建、停用或重置后调用)"""
+        async with async_session_factory() as db:
+            portfolios = await TradingService(db).list_portfolios(active_only=True)
+        self.portfolio_ids = [p.id for p in portfolios]
+        return self.portfolio_ids
+    
+    async def _held_symbols(self) -> List[str]:
+        """全部启用组合的持仓股票并集 (读取内存组合状态，未加载的组合加载一次)"""
+        missing = [pid for pid in self.portfolio_ids if portfolio_state_store.get(pid) is None]
+        if missing:
+            async with async_session_factory() as db:
+                for portfolio_id in missing:
+                    await portfolio_state_store.get_or_load(db, portfolio_id)
+        
+        symbols: Dict[str, None] = {}
+        for state in portfolio_state_store.states(self.portfolio_ids):
+            symbols.update(dict.fromkeys(state.positions))
+        return list(symbols)
+    
+    async def _fetch_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """分批并发获取最新价格"""
+        batch_size = settings.quote_batch_size
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+        results = await asyncio.gather(
+            *(coalesced_data_service.get_realtime_quote(batch) for batch in batches),
+            return_exceptions=True
+        )
+        
+        prices: Dict[str, float] = {}
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"获取持仓行情失败: {result}")
+                continue
+            if result.empty:
+                continue
+            for symbol, price in zip(result["symbol"], result["price"]):
+                if price and price > 0:
+                    prices[symbol] = float(price)
+        return prices
+    
     async def _update_positions(self):
         """更新持仓价格"""
         try:
-            async with async_session_factory() as db:
+            symbols = await self._held_symbols()
+            if not symbols:
+                return
+            
+            # 获取持仓股票的最新价格
+            prices = await self._fetch_prices(symbols)
+            quote_time = time.time()
+            if not prices:
+                return
+            
+            async with self._db_write_lock, async_session_factory() as db:
                 trading_service = TradingService(db)
-                status = await trading_service.get_portfolio_status(self.portfolio_id)
-                
-                if not status.get("positions"):
-                    return
-                
-                # 获取持仓股票的最新价格
-                symbols = [p["symbol"] for p in status["positions"]]
-                quotes = await data_service.get_realtime_quote(symbols)
-                
-                if quotes.empty:
-                    return
-                
-                prices = dict(zip(quotes["symbol"], quotes["price"]))
-                await trading_service.update_positions_price(self.portfolio_id, prices)
+                # 一条语句重估全部启用组合的持仓
+                await trading_service.mark_to_market(prices, self.portfolio_ids)
+                
+                # 止损止盈快速通道：同一次价格更新内直接卖出
+                if settings.risk_monitor_enabled:
+                    quote_age_ms = int((time.time() - quote_time) * 1000)
+                    for portfolio_id in self.portfolio_ids:
+                        await risk_monitor.check(
+                            trading_service,
+                            portfolio_id,
+                            quote_age_ms=quote_age_ms,
+                            symbols=set(prices)
+                        )
                 await db.commit()
                 
         except Exception as e:
@@ -172,251 +248,243 @@ class StrategyScheduler:
         logger.info("开始定时分析...")
         await self._run_analysis("hourly")
     
-    async def _run_analysis(self, session_type: str = "regular"):
-        """运行分析和决策"""
+    async def _run_analysis(self, session_type: str = "regular", portfolio_ids: Optional[List[int]] = None):
+        """
+        运行分析和决策
+        
+        市场数据和候选股票取自共享市场快照，由全部组合共享；各组合并发分析，LLM 调用受全局并发上限约束，
+        交易执行和提交按组合依次进行。
+        """
+        portfolio_ids = portfolio_ids or self.portfolio_ids
+        if not portfolio_ids:
+            return
+        
+        try:
+            # 读取共享市场快照 (过期时由快照生产者刷新，并发读取只请求一次上游)
+            snapshot = await market_snapshot.get()
+        except Exception as e:
+            logger.error(f"获取分析数据失败: {e}")
+            return
+        market_data = snapshot.market
+        
+        await asyncio.gather(*(
+            self._analyze_portfolio(portfolio_id, market_data, snapshot.candidate_list())
+            for portfolio_id in portfolio_ids
+        ))
+        self.last_analysis_time = datetime.now()
+    
+    async def _analyze_portfolio(self, portfolio_id: int, market_data: Dict, candidates: List[Dict]):
+        """
+        对单个组合执行 LLM 分析并执行决策
+        
+        读取组合状态与执行交易使用不同的会话：LLM 调用可能持续数分钟，期间风控快速通道可能已卖出并提交，
+        执行时必须重新读取组合和持仓，不能沿用调用前加载到会话中的旧数据。
+        """
         try:
+            # 获取投资组合状态 (读完即关闭会话)
             async with async_session_factory() as db:
-                trading_service = TradingService(db)
-                
-                # 获取投资组合状态
-                portfolio_status = await trading_service.get_portfolio_status(self.portfolio_id)
-                
-                # 获取市场数据
-                market_data = await self._get_market_data()
-                
-                # 获取候选股票
-                candidates = await self._get_candidates()
-                
-                # 调用 LLM 分析
+                portfolio_status = await TradingService(db).get_portfolio_status(portfolio_id)
+            if not portfolio_status:
+                return
+            
+            # 调用 LLM 分析
+            async with self._llm_semaphore:
                 result = await llm_engine.analyze_and_decide(
                     market_data=market_data,
                     portfolio=portfolio_status,
                     candidates=candidates
                 )
-                
-                logger.info(
-                    f"LLM 分析完成: 市场情绪={result.market_sentiment}, "
-                    f"决策数量={len(result.decisions)}, "
-                    f"用时={result.latency_ms}ms"
-                )
-                
-                # 执行交易决策
-                for decision in result.decisions:
-                    if decision.action == "hold":
-                        continue
-                    
-                    # 获取当前价格
-                    quotes = await data_service.get_realtime_quote([decision.symbol])
-                    if quotes.empty:
+            
+            logger.info(
+                f"LLM 分析完成 [组合 {portfolio_id}]: 市场情绪={result.market_sentiment}, "
+                f"决策数量={len(result.decisions)}, "
+                f"用时={result.latency_ms}ms"
+            )
+            
+            actionable = [d for d in result.decisions if d.action != "hold"]
+            if not actionable:
+                return
+            
+            # 执行交易决策 (一次批量获取所有待执行股票的行情)
+            quotes = await self._get_execution_quotes(
+                [d.symbol for d in actionable],
+                candidates
+            )
+            
+            # 写入阶段串行执行：LLM 调用仍然并发，数据库写事务一次只有一个组合；
+            # 在新会话中执行，组合资金和持仓按最新提交的数据读取
+            async with self._db_write_lock, async_session_factory() as db:
+                trading_service = TradingService(db)
+                for decision in actionable:
+                    quote = quotes.get(decision.symbol)
+                    if not quote:
                         continue
                     
-                    current_price = quotes.iloc[0]["price"]
+                    current_price, quote_time = quote
+                    quote_age_ms = int((time.time() - quote_time) * 1000)
                     
                     # 执行交易
                     order = await trading_service.execute_decision(
-                        self.portfolio_id,
+                        portfolio_id,
                         decision,
-                        current_price
+                        current_price,
+                        quote_age_ms=quote_age_ms
                     )
                     
                     if order and order.status == "filled":
                         logger.info(
-                            f"交易执行: {decision.action.upper()} "
-                            f"{decision.symbol} {decision.quantity}股 @ {current_price:.2f}"
+                            f"交易执行 [组合 {portfolio_id}]: {decision.action.upper()} "
+                            f"{decision.symbol} {decision.quantity}股 @ {current_price:.2f} "
+                            f"(行情时效 {quote_age_ms}ms)"
                         )
                 
                 await db.commit()
-                self.last_analysis_time = datetime.now()
                 
         except Exception as e:
-            logger.error(f"分析执行失败: {e}")
+            logger.error(f"分析执行失败 [组合 {portfolio_id}]: {e}")
     
-    async def _get_market_data(self) -> dict:
-        """获取市场数据"""
-        try:
-            # 优先使用新浪实时指数（更稳定）
-            indices = await data_service.get_index_quote()
-            if indices and "s_sh000001" in indices:
-                sh_data = indices["s_sh000001"]
-                return {
-                    "sh_index": sh_data["price"],
-                    "sh_change": round(sh_data["change_pct"], 2),
-                    "sentiment": "bullish" if sh_data["change_pct"] > 0.5 else ("bearish" if sh_data["change_pct"] < -0.5 else "neutral")
-                }
-        except Exception as e:
-            logger.warning(f"获取实时指数失败: {e}")
+    async def _get_execution_quotes(
+        self,
+        symbols: List[str],
+        candidates: List[Dict]
+    ) -> Dict[str, Tuple[float, float]]:
+        """
+        获取执行交易所需的行情
         
-        # 备选：尝试获取指数日线
-        try:
-            index_data = await data_service.get_index_daily("000001")
-            
-            if not index_data.empty:
-                latest = index_data.iloc[-1]
-                prev_close = index_data.iloc[-2]["close"] if len(index_data) > 1 else latest["close"]
-                change = (latest["close"] - prev_close) / prev_close * 100
-                
-                return {
-                    "sh_index": latest["close"],
-                    "sh_change": round(change, 2),
-                    "sentiment": "bullish" if change > 0.5 else ("bearish" if change < -0.5 else "neutral")
-                }
-        except Exception as e:
-            logger.warning(f"获取指数日线失败: {e}")
+        候选行情在下单时的时效 (含快照已有的时效和 LLM 往返耗时) 不超过 execution_quote_max_age 时直接复用，
+        其余股票一次批量请求。
         
-        return {
-            "sh_index": "N/A",
-            "sh_change": "N/A",
-            "sentiment": "unknown"
-        }
-
-    async def _get_candidates(self) -> list:
-        """获取候选股票"""
-        try:
-            # 获取热门股票
-            hot_stocks = await data_service.get_hot_stocks(20)
-            
-            if hot_stocks.empty:
-                return []
-            
-            candidates = []
-            for _, row in hot_stocks.iterrows():
-                stock_info = {
-                    "symbol": row["symbol"],
-                    "name": row.get("name", ""),
-                    "price": row.get("price", 0),
-                    "change_pct": row.get("change_pct", 0),
-                    "amount": row.get("amount", 0),
-                    "turnover_rate": row.get("turnover_rate", 0),
-                    "pe_ratio": row.get("pe_ratio", 0),
-                    "market_cap": row.get("market_cap", 0)
-                }
-                
-                # 尝试获取历史数据和技术指标（失败不影响主流程）
-                try:
-                    hist = await data_service.get_historical_data(
-                        row["symbol"],
-                        period="daily"
-                    )
-                    
-                    # 添加技术指标
-                    if not hist.empty:
-                        latest = hist.iloc[-1]
-                        stock_info.update({
-                            "ma5": latest.get("ma5"),
-                            "ma20": latest.get("ma20"),
-                            "rsi": latest.get("rsi"),
-                            "macd": latest.get("macd")
-                        })
-                except Exception:
-                    # 历史数据获取失败，使用 N/A
-                    stock_info.update({
-                        "ma5": "N/A",
-                        "ma20": "N/A", 
-                        "rsi": "N/A",
-                        "macd": "N/A"
-                    })
-                
-                candidates.append(stock_info)
-            
-            return candidates
-            
-        except Exception as e:
-            logger.warning(f"获取候选股票失败: {e}")
-            return []
+        Args:
+            symbols: 待执行的股票
+            candidates: 提供给 LLM 的候选股票 (含 price / quote_time)
+        
+        Returns:
+            {symbol: (price, quote_time)}，quote_time 为 time.time() 时间戳
+        """
+        if not symbols:
+            return {}
+        
+        quotes: Dict[str, Tuple[float, float]] = {}
+        now = time.time()
+        for stock in candidates:
+            quote_time = stock.get("quote_time")
+            if stock["symbol"] not in symbols or not quote_time:
+                continue
+            if now - quote_time > settings.execution_quote_max_age:
+                continue
+            try:
+                price = float(stock.get("price"))
+            except (TypeError, ValueError):
+                continue
+            if price > 0:
+                quotes[stock["symbol"]] = (price, quote_time)
+        
+        missing = [s for s in dict.fromkeys(symbols) if s not in quotes]
+        if missing:
+            try:
+                df = await coalesced_data_service.get_realtime_quote(missing)
+                fetched_at = time.time()
+                if not df.empty:
+                    for symbol, price in zip(df["symbol"], df["price"]):
+                        if price and price > 0:
+                            quotes[symbol] = (float(price), fetched_at)
+            except Exception as e:
+                logger.warning(f"批量获取执行行情失败: {e}")
+        
+        return quotes
     
     async def _daily_summary(self):
         """每日收盘总结"""
-        try:
-            async with async_session_factory() as db:
-                trading_service = TradingService(db)
-                
-                # 更新最终持仓价格
-                await self._update_positions()
-                
-                # 记录盈亏
-                await trading_service.record_pnl(self.portfolio_id)
-                
-                # 获取状态
-                status = await trading_service.get_portfolio_status(self.portfolio_id)
-                
-                logger.info(
-                    f"每日收盘总结: "
-                    f"总资产={status['total_value']:.2f}, "
-                    f"今日盈亏={status['daily_pnl']:.2f}, "
-                    f"累计收益率={status['total_pnl_ratio']*100:.2f}%"
-                )
-                
-                await db.commit()
-                
-        except Exception as e:
-            logger.error(f"每日总结失败: {e}")
+        # 更新最终持仓价格
+        await self._update_positions()
+        
+        for portfolio_id in self.portfolio_ids:
+            try:
+                async with self._db_write_lock, async_session_factory() as db:
+                    trading_service = TradingService(db)
+                    
+                    # 记录盈亏
+                    await trading_service.record_pnl(portfolio_id)
+                    
+                    # 获取状态
+                    status = await trading_service.get_portfolio_status(portfolio_id)
+                    
+                    logger.info(
+                        f"每日收盘总结 [组合 {portfolio_id}]: "
+                        f"总资产={status['total_value']:.2f}, "
+                        f"今日盈亏={status['daily_pnl']:.2f}, "
+                        f"累计收益率={status['total_pnl_ratio']*100:.2f}%"
+                    )
+                    
+                    await db.commit()
+                    
+            except Exception as e:
+                logger.error(f"每日总结失败 [组合 {portfolio_id}]: {e}")
     
     async def _update_kline_data(self):
         """收盘后更新K线数据到数据库"""
         logger.info("开始更新K线数据...")
         
         try:
-            async with async_session_factory() as db:
-                trading_service = TradingService(db)
-                
-                # 获取持仓股票
-                status = await trading_service.get_portfolio_status(self.portfolio_id)
-                positions = status.get("positions", [])
-                
-                symbols_to_update = []
-                
-                # 持仓股票
-                for pos in positions:
-                    symbols_to_update.append(pos["symbol"])
-                
-                # 添加一些常用指数和热门股票
-                common_symbols = [
-                    "000001",  # 平安银行
-                    "600519",  # 贵州茅台
-                    "000858",  # 五粮液
-                    "600036",  # 招商银行
-                    "000333",  # 美的集团
-                    "600276",  # 恒瑞医药
-                    "300750",  # 宁德时代
-                    "002594",  # 比亚迪
-                ]
-                symbols_to_update.extend(common_symbols)
-                
-                # 去重
-                symbols_to_update = list(set(symbols_to_update))
-                
-                logger.info(f"更新 {len(symbols_to_update)} 只股票的K线数据...")
-                
-                # 更新日线数据 (今天的数据)
-                today = datetime.now().strftime("%Y%m%d")
-                for symbol in symbols_to_update:
-                    try:
-                        # 获取今天的数据并保存
-                        df = await data_service.get_historical_data(
-                            symbol,
-                            start_date=today,
-                            end_date=today,
-                            period="daily",
-                            use_cache=False
+            # 持仓股票 (全部启用组合)
+            symbols_to_update = await self._held_symbols()
+            
+            # 添加一些常用指数和热门股票
+            common_symbols = [
+                "000001",  # 平安银行
+                "600519",  # 贵州茅台
+                "000858",  # 五粮液
+                "600036",  # 招商银行
+                "000333",  # 美的集团
+                "600276",  # 恒瑞医药
+                "300750",  # 宁德时代
+                "002594",  # 比亚迪
+            ]
+            symbols_to_update.extend(common_symbols)
+            
+            # 去重
+            symbols_to_update = list(set(symbols_to_update))
+            
+            logger.info(f"更新 {len(symbols_to_update)} 只股票的K线数据...")
+            
+            # 更新日线数据 (今天的数据)
+            today = datetime.now().strftime("%Y%m%d")
+            for symbol in symbols_to_update:
+                try:
+                    # 获取今天的数据并保存；列式存储尚无完整历史的股票改为回补完整历史，
+                    # 避免只有一根 K 线的存储被当作完整历史读取
+                    full_history = not kline_store.has_history(symbol, "daily")
+                    df = await coalesced_data_service.get_historical_data(
+                        symbol,
+                        start_date=None if full_history else today,
+                        end_date=today,
+                        period="daily",
+                        use_cache=False
+                    )
+                    if not df.empty:
+                        appended = await asyncio.to_thread(
+                            kline_store.append, symbol, "daily", df, full_history
                         )
-                        if not df.empty:
-                            logger.debug(f"更新K线: {symbol} - {len(df)} 条")
-                        
-                        # 避免请求过快
-                        await asyncio.sleep(0.1)
-                        
-                    except Exception as e:
-                        logger.debug(f"更新K线失败 [{symbol}]: {e}")
-                
-                # 统计
-                stock_count = await kline_storage.get_stock_count("daily")
-                record_count = await kline_storage.get_record_count(period="daily")
-                
-                logger.info(
-                    f"K线数据更新完成: "
-                    f"共 {stock_count} 只股票, {record_count} 条日线记录"
-                )
-                
+                        indicator_engine.sync_symbol(kline_store, symbol, "daily", settings.indicator_lookback)
+                        logger.debug(f"更新K线: {symbol} - {len(df)} 条, 列式存储新增 {appended} 条")
+                    
+                    # 避免请求过快
+                    await asyncio.sleep(0.1)
+                    
+                except Exception as e:
+                    logger.debug(f"更新K线失败 [{symbol}]: {e}")
+            
+            # 统计
+            stock_count = await kline_storage.get_stock_count("daily")
+            record_count = await kline_storage.get_record_count(period="daily")
+            
+            columnar = kline_store.stats("daily")
+            logger.info(
+                f"K线数据更新完成: "
+                f"共 {stock_count} 只股票, {record_count} 条日线记录 "
+                f"(列式存储 {columnar['stocks']} 只, {columnar['records']} 条)"
+            )
+            
         except Exception as e:
             logger.error(f"更新K线数据失败: {e}")
     
@@ -436,7 +504,7 @@ class StrategyScheduler:
         if not symbols:
             # 默认更新热门股票
             try:
-                hot_df = await data_service.get_hot_stocks(50)
+                hot_df = await coalesced_data_service.get_hot_stocks(50)
                 if not hot_df.empty:
                     symbols = hot_df["symbol"].tolist()
                 else:
@@ -449,12 +517,16 @@ class StrategyScheduler:
         
         for symbol in symbols:
             try:
-                df = await data_service.get_historical_data(
+                df = await coalesced_data_service.get_historical_data(
                     symbol,
                     period=period,
                     use_cache=False
                 )
                 if not df.empty:
+                    # 未指定开始日期，取得的是完整历史
+                    await asyncio.to_thread(kline_store.append, symbol, period, df, True)
+                    if period == "daily":
+                        indicator_engine.sync_symbol(kline_store, symbol, period, settings.indicator_lookback)
                     updated += 1
                 else:
                     failed += 1
@@ -472,20 +544,22 @@ class StrategyScheduler:
             "updated": updated,
             "failed": failed,
             "total_stocks": stock_count,
-            "total_records": record_count
+            "total_records": record_count,
+            "columnar": kline_store.stats(period)
         }
         
         logger.info(f"手动更新K线完成: {result}")
         return result
     
-    async def manual_analysis(self) -> dict:
-        """手动触发分析"""
-        logger.info("手动触发分析...")
-        await self._run_analysis("manual")
+    async def manual_analysis(self, portfolio_id: Optional[int] = None) -> dict:
+        """手动触发分析 (默认分析默认组合)"""
+        portfolio_id = portfolio_id or self.portfolio_id
+        logger.info(f"手动触发分析 [组合 {portfolio_id}]...")
+        await self._run_analysis("manual", [portfolio_id])
         
         async with async_session_factory() as db:
             trading_service = TradingService(db)
-            return await trading_service.get_portfolio_status(self.portfolio_id)
+            return await trading_service.get_portfolio_status(portfolio_id)
 
 
 # 全局调度器实例
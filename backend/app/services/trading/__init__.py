@@ -2,5 +2,18 @@
 Lumina 明见量化 - 交易服务模块
 """
 from app.services.trading.trading_service import TradingService
+from app.services.trading.portfolio_state import (
+    PortfolioState,
+    PositionState,
+    portfolio_state_store
+)
+from app.services.trading.rules import TradingRules, trading_rules
 
-__all__ = ["TradingService"]
+__all__ = [
+    "TradingService",
+    "PortfolioState",
+    "PositionState",
+    "portfolio_state_store",
+    "TradingRules",
+    "trading_rules"
+]
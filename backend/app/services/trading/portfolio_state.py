@@ -0,0 +1,199 @@
+"""
+Lumina 明见量化 - 投资组合内存状态
+进程内权威的组合状态 (现金、持仓、最新盈亏)，由 TradingService 在交易和行情更新时同步修改，
+数据库写入随会话提交完成；会话回滚时丢弃对应组合的内存状态，下次读取时从数据库重新加载。
+"""
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Portfolio, Position, PnLRecord
+
+
+# 会话 info 中记录本事务修改过的组合 ID
+_DIRTY_KEY = "portfolio_state_dirty"
+
+
+@dataclass
+class PositionState:
+    """持仓状态"""
+    symbol: str
+    name: str
+    quantity: int
+    avg_cost: float
+    current_price: float = 0.0
+    market_value: float = 0.0
+    unrealized_pnl: float = 0.0
+    unrealized_pnl_ratio: float = 0.0
+    last_buy_date: Optional[str] = None
+    profit_taken: bool = False  # 本轮持仓是否已触发过止盈
+
+    @classmethod
+    def from_model(cls, position: Position) -> "PositionState":
+        return cls(
+            symbol=position.symbol,
+            name=position.name,
+            quantity=position.quantity,
+            avg_cost=position.avg_cost,
+            current_price=position.current_price or 0.0,
+            market_value=position.market_value or 0.0,
+            unrealized_pnl=position.unrealized_pnl or 0.0,
+            unrealized_pnl_ratio=position.unrealized_pnl_ratio or 0.0,
+            last_buy_date=position.last_buy_date,
+            profit_taken=bool(position.profit_taken)
+        )
+
+    @property
+    def can_sell(self) -> bool:
+        """是否可以卖出 (T+1规则：买入后次日才能卖出)"""
+        if not self.last_buy_date:
+            return True
+        return self.last_buy_date < datetime.now().strftime("%Y-%m-%d")
+
+    def mark(self, price: float):
+        """按最新价格重新计算市值和浮动盈亏"""
+        self.current_price = price
+        self.market_value = self.quantity * price
+        self.unrealized_pnl = (price - self.avg_cost) * self.quantity
+        self.unrealized_pnl_ratio = (price - self.avg_cost) / self.avg_cost if self.avg_cost else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "symbol": self.symbol,
+            "name": self.name,
+            "quantity": self.quantity,
+            "avg_cost": self.avg_cost,
+            "current_price": self.current_price,
+            "market_value": self.market_value,
+            "unrealized_pnl": self.unrealized_pnl,
+            "unrealized_pnl_ratio": self.unrealized_pnl_ratio,
+            "last_buy_date": self.last_buy_date,  # T+1规则：最后买入日期
+            "can_sell": self.can_sell  # T+1规则：是否可卖出
+        }
+
+
+@dataclass
+class PortfolioState:
+    """投资组合状态"""
+    portfolio_id: int
+    name: str
+    initial_capital: float
+    cash: float
+    daily_pnl: float = 0.0
+    positions: Dict[str, PositionState] = field(default_factory=dict)
+    version: int = 0  # 状态版本号，每次修改递增 (全局单调)
+
+    @property
+    def market_value(self) -> float:
+        return sum(p.market_value for p in self.positions.values())
+
+    def to_status(self) -> Dict:
+        """转换为 get_portfolio_status 的返回格式"""
+        market_value = self.market_value
+        total_value = self.cash + market_value
+        return {
+            "portfolio_id": self.portfolio_id,
+            "name": self.name,
+            "initial_capital": self.initial_capital,
+            "cash": self.cash,
+            "market_value": market_value,
+            "total_value": total_value,
+            "total_pnl": total_value - self.initial_capital,
+            "total_pnl_ratio": total_value / self.initial_capital - 1,
+            "daily_pnl": self.daily_pnl,
+            "positions": [p.to_dict() for p in self.positions.values()]
+        }
+
+
+class PortfolioStateStore:
+    """投资组合内存状态存储"""
+
+    def __init__(self):
+        self._states: Dict[int, PortfolioState] = {}
+        self._version = itertools.count(1)
+
+    def get(self, portfolio_id: int) -> Optional[PortfolioState]:
+        """获取已加载的组合状态"""
+        return self._states.get(portfolio_id)
+
+    def states(self, portfolio_ids: Optional[Iterable[int]] = None) -> List[PortfolioState]:
+        """已加载的组合状态 (可按 ID 过滤)"""
+        if portfolio_ids is None:
+            return list(self._states.values())
+        return [self._states[i] for i in portfolio_ids if i in self._states]
+
+    async def get_or_load(self, db: AsyncSession, portfolio_id: int) -> Optional[PortfolioState]:
+        """获取组合状态，未加载时从数据库读取"""
+        state = self._states.get(portfolio_id)
+        if state is None:
+            state = await self.load(db, portfolio_id)
+        return state
+
+    async def load(self, db: AsyncSession, portfolio_id: int) -> Optional[PortfolioState]:
+        """从数据库加载组合状态"""
+        portfolio = await db.get(Portfolio, portfolio_id)
+        if not portfolio:
+            return None
+
+        result = await db.execute(
+            select(Position).where(Position.portfolio_id == portfolio_id)
+        )
+        positions = result.scalars().all()
+
+        result = await db.execute(
+            select(PnLRecord.daily_pnl)
+            .where(PnLRecord.portfolio_id == portfolio_id)
+            .order_by(PnLRecord.timestamp.desc())
+            .limit(1)
+        )
+        daily_pnl = result.scalar_one_or_none()
+
+        state = PortfolioState(
+            portfolio_id=portfolio.id,
+            name=portfolio.name,
+            initial_capital=portfolio.initial_capital,
+            cash=portfolio.current_capital,
+            daily_pnl=daily_pnl or 0.0,
+            positions={p.symbol: PositionState.from_model(p) for p in positions},
+            version=next(self._version)
+        )
+        self._states[portfolio_id] = state
+        return state
+
+    def mark_dirty(self, db: AsyncSession, portfolio_id: int):
+        """记录当前会话修改了某个组合 (递增版本号)，回滚时据此丢弃内存状态"""
+        db.info.setdefault(_DIRTY_KEY, set()).add(portfolio_id)
+        state = self._states.get(portfolio_id)
+        if state:
+            state.version = next(self._version)
+
+    def invalidate(self, portfolio_id: Optional[int] = None):
+        """丢弃内存状态 (不指定 ID 时全部丢弃)"""
+        if portfolio_id is None:
+            self._states.clear()
+        else:
+            self._states.pop(portfolio_id, None)
+
+
+# 全局组合状态存储
+portfolio_state_store = PortfolioStateStore()
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session):
+    """提交成功，内存状态与数据库一致"""
+    session.info.pop(_DIRTY_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _on_transaction_end(session: Session, transaction):
+    """事务未提交即结束 (回滚或关闭)，丢弃被修改组合的内存状态"""
+    if transaction.parent is not None:
+        return
+    dirty: Optional[Set[int]] = session.info.pop(_DIRTY_KEY, None)
+    for portfolio_id in dirty or ():
+        portfolio_state_store.invalidate(portfolio_id)
@@ -0,0 +1,113 @@
+"""
+Lumina 明见量化 - 交易规则
+佣金、最低佣金、印花税、整手交易、持仓比例与持股数量限制、T+1、止损止盈，
+供模拟交易 (TradingService) 与回测引擎共用；费用计算同时支持标量与 NumPy 数组。
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from app.core.config import settings
+
+
+Number = Union[float, np.ndarray]
+
+
+@dataclass(frozen=True)
+class TradingRules:
+    """A 股交易规则"""
+    commission_rate: float = 0.0003  # 佣金率 0.03%
+    stamp_duty_rate: float = 0.001   # 印花税 0.1% (仅卖出)
+    min_commission: float = 5.0      # 最低佣金
+    lot_size: int = 100              # 每手股数
+    max_position_ratio: float = 0.2  # 单只股票最大持仓比例
+    max_holdings: int = 10           # 最大持股数量
+    stop_loss_ratio: float = 0.08    # 止损比例
+    take_profit_ratio: float = 0.20  # 止盈比例
+
+    @classmethod
+    def from_settings(cls) -> "TradingRules":
+        return cls(
+            max_position_ratio=settings.max_position_ratio,
+            max_holdings=settings.max_holdings,
+            stop_loss_ratio=settings.stop_loss_ratio,
+            take_profit_ratio=settings.take_profit_ratio
+        )
+
+    def commission(self, amount: Number) -> Number:
+        """佣金 (不足最低佣金按最低佣金收取)"""
+        return np.maximum(amount * self.commission_rate, self.min_commission)
+
+    def buy_cost(self, price: Number, quantity: Number) -> Tuple[Number, Number, Number]:
+        """
+        买入成本
+
+        Returns:
+            (成交金额, 佣金, 总成本)
+        """
+        amount = price * quantity
+        commission = self.commission(amount)
+        return amount, commission, amount + commission
+
+    def sell_proceeds(self, price: Number, quantity: Number) -> Tuple[Number, Number, Number, Number]:
+        """
+        卖出收入
+
+        Returns:
+            (成交金额, 佣金, 印花税, 净收入)
+        """
+        amount = price * quantity
+        commission = self.commission(amount)
+        stamp_duty = amount * self.stamp_duty_rate
+        return amount, commission, stamp_duty, amount - commission - stamp_duty
+
+    def affordable_quantity(self, cash: Number, price: Number) -> Number:
+        """可用资金能买入的最大数量 (整手)"""
+        max_affordable = (cash - self.min_commission) / (price * (1 + self.commission_rate))
+        lots = np.floor(np.maximum(max_affordable, 0) / self.lot_size)
+        return (lots * self.lot_size).astype(np.int64) if isinstance(lots, np.ndarray) else int(lots) * self.lot_size
+
+    def min_lot_cost(self, price: float) -> float:
+        """买入一手所需的大致资金"""
+        return price * self.lot_size * (1 + self.commission_rate)
+
+    def max_position_value(self, total_value: Number) -> Number:
+        """单只股票最大持仓金额"""
+        return total_value * self.max_position_ratio
+
+    def exit_signals(self, price: Number, avg_cost: Number) -> Tuple[Number, Number]:
+        """
+        止损 / 止盈信号
+
+        Returns:
+            (触发止损, 触发止盈)，价格或成本无效时均为 False
+        """
+        price = np.asarray(price, dtype=np.float64)
+        avg_cost = np.asarray(avg_cost, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pnl_ratio = np.where((avg_cost > 0) & (price > 0), (price - avg_cost) / avg_cost, np.nan)
+        return pnl_ratio <= -self.stop_loss_ratio, pnl_ratio >= self.take_profit_ratio
+
+    def exit_quantities(
+        self,
+        quantity: Number,
+        stop: Number,
+        take: Number,
+        profit_taken: Optional[Number] = None
+    ) -> Number:
+        """
+        止损 / 止盈卖出数量
+
+        止损卖出全部；止盈卖出一半 (按整手取整，不足一手时全部卖出)，已止盈过的持仓不再重复止盈。
+        """
+        quantity = np.asarray(quantity, dtype=np.int64)
+        half = quantity // 2 // self.lot_size * self.lot_size
+        half = np.where(half > 0, half, quantity)
+        if profit_taken is not None:
+            take = np.asarray(take) & ~np.asarray(profit_taken, dtype=bool)
+        return np.where(stop, quantity, np.where(take, half, 0))
+
+
+# 全局交易规则
+trading_rules = TradingRules.from_settings()
@@ -6,21 +6,50 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, values, column, case, text, String, Float
 
 from app.core.config import settings
 from app.models import Portfolio, Position, Order, PnLRecord
 from app.services.llm import TradingDecision
+from app.services.trading.portfolio_state import portfolio_state_store, PositionState
+from app.services.trading.rules import TradingRules, trading_rules
+
+
+# 单条批量重估语句的最大股票数 (受数据库绑定参数数量限制)
+MARK_BATCH_SIZE = 2000
+
+# 列式导出的订单与盈亏字段
+ORDER_EXPORT_COLUMNS = (
+    "id", "symbol", "name", "action", "quantity", "price", "filled_price",
+    "filled_quantity", "status", "reason", "quote_age_ms", "created_at"
+)
+PNL_EXPORT_COLUMNS = (
+    "timestamp", "total_value", "cash", "market_value", "daily_pnl", "total_pnl", "total_pnl_ratio"
+)
+
+
+def _column_types(model: Any, names: tuple) -> Dict[str, type]:
+    return {name: getattr(model, name).type.python_type for name in names}
+
+
+# 导出字段的 Python 类型 (列式导出的空结果也保留字段类型)
+ORDER_EXPORT_TYPES = _column_types(Order, ORDER_EXPORT_COLUMNS)
+PNL_EXPORT_TYPES = _column_types(PnLRecord, PNL_EXPORT_COLUMNS)
+
+
+def _transpose(rows: List[Any], names: tuple) -> Dict[str, list]:
+    """查询结果行转为列 (字段名 -> 值列表)"""
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
 
 
 class TradingService:
     """交易执行服务"""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, rules: Optional[TradingRules] = None):
         self.db = db
-        self.commission_rate = 0.0003  # 佣金率 0.03%
-        self.stamp_duty_rate = 0.001   # 印花税 0.1% (仅卖出)
-        self.min_commission = 5.0       # 最低佣金
+        self.rules = rules or trading_rules  # 费用与持仓限制 (与回测引擎共用)
     
     async def get_or_create_portfolio(self, name: str = "默认组合") -> Portfolio:
         """获取或创建投资组合"""
@@ -42,62 +71,58 @@ class TradingService:
         
         return portfolio
     
-    async def get_portfolio_status(self, portfolio_id: int) -> Dict:
-        """获取投资组合状态"""
-        portfolio = await self.db.get(Portfolio, portfolio_id)
-        if not portfolio:
-            return {}
-        
-        # 获取持仓
+    async def create_portfolio(self, name: str, initial_capital: Optional[float] = None) -> Optional[Portfolio]:
+        """创建投资组合 (同名的启用组合已存在时返回 None)"""
         result = await self.db.execute(
-            select(Position).where(Position.portfolio_id == portfolio_id)
+            select(Portfolio).where(Portfolio.name == name, Portfolio.is_active == True)
         )
-        positions = result.scalars().all()
-        
-        # 计算持仓市值
-        market_value = sum(p.market_value for p in positions)
+        if result.scalar_one_or_none():
+            return None
         
-        # 获取最新盈亏记录
-        result = await self.db.execute(
-            select(PnLRecord)
-            .where(PnLRecord.portfolio_id == portfolio_id)
-            .order_by(PnLRecord.timestamp.desc())
-            .limit(1)
+        capital = initial_capital or settings.initial_capital
+        portfolio = Portfolio(
+            name=name,
+            initial_capital=capital,
+            current_capital=capital,
+            total_value=capital
         )
-        latest_pnl = result.scalar_one_or_none()
-        
-        return {
-            "portfolio_id": portfolio.id,
-            "name": portfolio.name,
-            "initial_capital": portfolio.initial_capital,
-            "cash": portfolio.current_capital,
-            "market_value": market_value,
-            "total_value": portfolio.current_capital + market_value,
-            "total_pnl": (portfolio.current_capital + market_value) - portfolio.initial_capital,
-            "total_pnl_ratio": ((portfolio.current_capital + market_value) / portfolio.initial_capital - 1),
-            "daily_pnl": latest_pnl.daily_pnl if latest_pnl else 0,
-            "positions": [
-                {
-                    "symbol": p.symbol,
-                    "name": p.name,
-                    "quantity": p.quantity,
-                    "avg_cost": p.avg_cost,
-                    "current_price": p.current_price,
-                    "market_value": p.market_value,
-                    "unrealized_pnl": p.unrealized_pnl,
-                    "unrealized_pnl_ratio": p.unrealized_pnl_ratio,
-                    "last_buy_date": p.last_buy_date,  # T+1规则：最后买入日期
-                    "can_sell": p.can_sell  # T+1规则：是否可卖出
-                }
-                for p in positions
-            ]
-        }
+        self.db.add(portfolio)
+        await self.db.flush()
+        logger.info(f"创建新投资组合: {name}, 初始资金: {capital}")
+        return portfolio
+    
+    async def list_portfolios(self, active_only: bool = True) -> List[Portfolio]:
+        """列出投资组合"""
+        query = select(Portfolio).order_by(Portfolio.id)
+        if active_only:
+            query = query.where(Portfolio.is_active == True)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+    
+    async def deactivate_portfolio(self, portfolio_id: int) -> bool:
+        """停用投资组合 (保留历史数据，不再参与分析和持仓更新)"""
+        portfolio = await self.db.get(Portfolio, portfolio_id)
+        if not portfolio or not portfolio.is_active:
+            return False
+        portfolio.is_active = False
+        await self.db.flush()
+        portfolio_state_store.invalidate(portfolio_id)
+        return True
+    
+    async def get_portfolio_status(self, portfolio_id: int) -> Dict:
+        """获取投资组合状态 (读取内存状态，仅首次加载时查询数据库)"""
+        state = await portfolio_state_store.get_or_load(self.db, portfolio_id)
+        if not state:
+            return {}
+        
+        return state.to_status()
     
     async def execute_decision(
         self,
         portfolio_id: int,
         decision: TradingDecision,
-        current_price: float
+        current_price: float,
+        quote_age_ms: Optional[int] = None
     ) -> Optional[Order]:
         """
         执行交易决策
@@ -106,6 +131,7 @@ class TradingService:
             portfolio_id: 投资组合 ID
             decision: 交易决策
             current_price: 当前价格
+            quote_age_ms: 当前价格对应行情的时效 (毫秒)
         
         Returns:
             Order: 订单对象，如果执行失败返回 None
@@ -118,6 +144,9 @@ class TradingService:
             logger.error(f"投资组合不存在: {portfolio_id}")
             return None
         
+        # 在修改 ORM 对象之前确保内存状态已加载，避免加载到未提交的修改
+        await portfolio_state_store.get_or_load(self.db, portfolio_id)
+        
         # 创建订单
         order = Order(
             portfolio_id=portfolio_id,
@@ -126,7 +155,8 @@ class TradingService:
             action=decision.action,
             quantity=decision.quantity,
             price=current_price,
-            reason=decision.reason
+            reason=decision.reason,
+            quote_age_ms=quote_age_ms
         )
         
         try:
@@ -157,29 +187,24 @@ class TradingService:
     ):
         """执行买入"""
         # 计算总成本
-        amount = price * order.quantity
-        commission = max(amount * self.commission_rate, self.min_commission)
-        total_cost = amount + commission
+        amount, commission, total_cost = self.rules.buy_cost(price, order.quantity)
         
         # 如果资金不足，自动调整买入数量
         if portfolio.current_capital < total_cost:
-            # 计算可以买入的最大数量（100股的整数倍）
-            max_affordable = (portfolio.current_capital - self.min_commission) / (price * (1 + self.commission_rate))
-            adjusted_quantity = int(max_affordable / 100) * 100
+            # 计算可以买入的最大数量（整手）
+            adjusted_quantity = self.rules.affordable_quantity(portfolio.current_capital, price)
             
             if adjusted_quantity <= 0:
-                raise ValueError(f"资金不足: 需要至少 {price * 100 * (1 + self.commission_rate):.2f}, 可用 {portfolio.current_capital:.2f}")
+                raise ValueError(f"资金不足: 需要至少 {self.rules.min_lot_cost(price):.2f}, 可用 {portfolio.current_capital:.2f}")
             
             logger.warning(f"资金不足，调整买入数量: {order.quantity} -> {adjusted_quantity}")
             order.quantity = adjusted_quantity
             
             # 重新计算成本
-            amount = price * order.quantity
-            commission = max(amount * self.commission_rate, self.min_commission)
-            total_cost = amount + commission
+            amount, commission, total_cost = self.rules.buy_cost(price, order.quantity)
         
         # 检查持仓比例限制
-        max_position_value = portfolio.total_value * settings.max_position_ratio
+        max_position_value = self.rules.max_position_value(portfolio.total_value)
         if amount > max_position_value:
             raise ValueError(f"超出单只股票最大持仓限制: {max_position_value:.2f}")
         
@@ -216,8 +241,8 @@ class TradingService:
                 select(Position).where(Position.portfolio_id == portfolio.id)
             )
             positions = result.scalars().all()
-            if len(positions) >= settings.max_holdings:
-                raise ValueError(f"超出最大持仓数量限制: {settings.max_holdings}")
+            if len(positions) >= self.rules.max_holdings:
+                raise ValueError(f"超出最大持仓数量限制: {self.rules.max_holdings}")
             
             # 创建新持仓
             position = Position(
@@ -237,6 +262,21 @@ class TradingService:
         # 扣除资金
         portfolio.current_capital -= total_cost
         
+        # 同步内存状态
+        state = portfolio_state_store.get(portfolio.id)
+        if state:
+            position_state = state.positions.get(order.symbol)
+            if position_state:
+                position_state.quantity = position.quantity
+                position_state.avg_cost = position.avg_cost
+                position_state.last_buy_date = today
+            else:
+                position_state = PositionState.from_model(position)
+                state.positions[order.symbol] = position_state
+            position_state.mark(price)
+            state.cash = portfolio.current_capital
+            portfolio_state_store.mark_dirty(self.db, portfolio.id)
+        
         logger.info(
             f"买入成功: {order.symbol} {order.quantity}股 @ {price:.2f}, "
             f"费用: {total_cost:.2f}"
@@ -273,13 +313,11 @@ class TradingService:
             )
         
         # 计算收入
-        amount = price * order.quantity
-        commission = max(amount * self.commission_rate, self.min_commission)
-        stamp_duty = amount * self.stamp_duty_rate
-        net_income = amount - commission - stamp_duty
+        amount, commission, stamp_duty, net_income = self.rules.sell_proceeds(price, order.quantity)
         
-        # 更新持仓
-        if position.quantity == order.quantity:
+        # 更新持仓 (先记录是否清仓，部分卖出会修改 position.quantity)
+        full_exit = position.quantity == order.quantity
+        if full_exit:
             # 全部卖出，删除持仓
             await self.db.delete(position)
         else:
@@ -293,6 +331,18 @@ class TradingService:
         # 增加资金
         portfolio.current_capital += net_income
         
+        # 同步内存状态
+        state = portfolio_state_store.get(portfolio.id)
+        if state:
+            if full_exit:
+                state.positions.pop(order.symbol, None)
+            elif order.symbol in state.positions:
+                position_state = state.positions[order.symbol]
+                position_state.quantity = position.quantity
+                position_state.mark(price)
+            state.cash = portfolio.current_capital
+            portfolio_state_store.mark_dirty(self.db, portfolio.id)
+        
         # 计算实现盈亏
         realized_pnl = (price - position.avg_cost) * order.quantity - commission - stamp_duty
         
@@ -307,20 +357,124 @@ class TradingService:
         prices: Dict[str, float]
     ):
         """更新持仓价格"""
-        result = await self.db.execute(
-            select(Position).where(Position.portfolio_id == portfolio_id)
+        await portfolio_state_store.get_or_load(self.db, portfolio_id)
+        await self.mark_to_market(prices, [portfolio_id])
+
+    async def mark_profit_taken(self, portfolio_id: int, symbol: str):
+        """标记持仓本轮已止盈 (持久化到持仓表，清仓时随持仓删除而重置)"""
+        await self.db.execute(
+            update(Position)
+            .where(Position.portfolio_id == portfolio_id, Position.symbol == symbol)
+            .values(profit_taken=True),
+            execution_options={"synchronize_session": False}
         )
-        positions = result.scalars().all()
+    
+        state = portfolio_state_store.get(portfolio_id)
+        if state and symbol in state.positions:
+            state.positions[symbol].profit_taken = True
+            portfolio_state_store.mark_dirty(self.db, portfolio_id)
+    
+    async def mark_to_market(
+        self,
+        prices: Dict[str, float],
+        portfolio_ids: Optional[List[int]] = None,
+        returning: bool = False
+    ) -> List[Dict]:
+        """
+        按最新价格批量重估持仓
         
-        for position in positions:
-            if position.symbol in prices:
-                price = prices[position.symbol]
-                position.current_price = price
-                position.market_value = position.quantity * price
-                position.unrealized_pnl = (price - position.avg_cost) * position.quantity
-                position.unrealized_pnl_ratio = (price - position.avg_cost) / position.avg_cost
+        以一条 UPDATE ... FROM (VALUES ...) 语句更新全部 (或指定) 组合中相关股票的持仓，
+        市值、浮动盈亏和盈亏比例在 SQL 中计算；已加载的内存组合状态同步重估。
         
-        await self.db.flush()
+        Args:
+            prices: {symbol: 最新价格}
+            portfolio_ids: 限定的组合 ID，默认全部组合
+            returning: 是否返回被更新的持仓行 (供推送使用)
+        
+        Returns:
+            returning 为 True 时返回 [{portfolio_id, symbol, quantity, current_price, market_value, unrealized_pnl, unrealized_pnl_ratio}]
+        """
+        prices = {s: float(p) for s, p in prices.items() if p and p > 0}
+        if not prices:
+            return []
+        
+        rows: List[Dict] = []
+        items = list(prices.items())
+        for i in range(0, len(items), MARK_BATCH_SIZE):
+            result = await self.db.execute(
+                self._mark_statement(items[i:i + MARK_BATCH_SIZE], portfolio_ids, returning),
+                execution_options={"synchronize_session": False}
+            )
+            if returning:
+                rows.extend(dict(row._mapping) for row in result)
+        
+        # 同步内存状态
+        for state in portfolio_state_store.states(portfolio_ids):
+            marked = False
+            for symbol, position_state in state.positions.items():
+                if symbol in prices:
+                    position_state.mark(prices[symbol])
+                    marked = True
+            if marked:
+                portfolio_state_store.mark_dirty(self.db, state.portfolio_id)
+        
+        return rows
+    
+    def _mark_statement(
+        self,
+        items: List[tuple],
+        portfolio_ids: Optional[List[int]],
+        returning: bool
+    ):
+        """构建批量重估持仓的 UPDATE 语句"""
+        if self.db.bind.dialect.name == "postgresql":
+            source = values(
+                column("symbol", String),
+                column("price", Float),
+                name="prices"
+            ).data(items)
+        else:
+            # SQLite 不支持 VALUES 子查询的列别名，使用默认列名 column1 / column2
+            params = {}
+            placeholders = []
+            for i, (symbol, price) in enumerate(items):
+                params[f"s{i}"] = symbol
+                params[f"p{i}"] = price
+                placeholders.append(f"(:s{i}, :p{i})")
+            source = (
+                text(f"SELECT column1 AS symbol, column2 AS price FROM (VALUES {', '.join(placeholders)})")
+                .bindparams(**params)
+                .columns(column("symbol", String), column("price", Float))
+                .subquery("prices")
+            )
+        
+        price = source.c.price
+        stmt = (
+            update(Position)
+            .where(Position.symbol == source.c.symbol)
+            .values(
+                current_price=price,
+                market_value=Position.quantity * price,
+                unrealized_pnl=(price - Position.avg_cost) * Position.quantity,
+                unrealized_pnl_ratio=case(
+                    (Position.avg_cost > 0, (price - Position.avg_cost) / Position.avg_cost),
+                    else_=0.0
+                )
+            )
+        )
+        if portfolio_ids is not None:
+            stmt = stmt.where(Position.portfolio_id.in_(portfolio_ids))
+        if returning:
+            stmt = stmt.returning(
+                Position.portfolio_id,
+                Position.symbol,
+                Position.quantity,
+                Position.current_price,
+                Position.market_value,
+                Position.unrealized_pnl,
+                Position.unrealized_pnl_ratio
+            )
+        return stmt
     
     async def record_pnl(self, portfolio_id: int):
         """记录盈亏"""
@@ -355,6 +509,11 @@ class TradingService:
         self.db.add(record)
         await self.db.flush()
         
+        state = portfolio_state_store.get(portfolio_id)
+        if state:
+            state.daily_pnl = daily_pnl
+            portfolio_state_store.mark_dirty(self.db, portfolio_id)
+        
         logger.info(
             f"记录盈亏: 总资产 {status['total_value']:.2f}, "
             f"今日盈亏 {daily_pnl:.2f}, 累计收益率 {status['total_pnl_ratio']*100:.2f}%"
@@ -386,6 +545,7 @@ class TradingService:
                 "filled_quantity": o.filled_quantity,
                 "status": o.status,
                 "reason": o.reason,
+                "quote_age_ms": o.quote_age_ms,
                 "created_at": o.created_at.isoformat()
             }
             for o in orders
@@ -422,3 +582,36 @@ class TradingService:
             }
             for r in records
         ]
+    
+    async def get_order_columns(
+        self,
+        portfolio_id: int,
+        limit: int = 50
+    ) -> Dict[str, list]:
+        """获取订单历史 (列式，只查询导出字段，不构建 ORM 对象)"""
+        result = await self.db.execute(
+            select(*[getattr(Order, name) for name in ORDER_EXPORT_COLUMNS])
+            .where(Order.portfolio_id == portfolio_id)
+            .order_by(Order.created_at.desc())
+            .limit(limit)
+        )
+        return _transpose(result.all(), ORDER_EXPORT_COLUMNS)
+    
+    async def get_pnl_columns(
+        self,
+        portfolio_id: int,
+        days: int = 30
+    ) -> Dict[str, list]:
+        """获取盈亏历史 (列式)"""
+        from datetime import timedelta
+        start_date = datetime.utcnow() - timedelta(days=days)
+        
+        result = await self.db.execute(
+            select(*[getattr(PnLRecord, name) for name in PNL_EXPORT_COLUMNS])
+            .where(
+                PnLRecord.portfolio_id == portfolio_id,
+                PnLRecord.timestamp >= start_date
+            )
+            .order_by(PnLRecord.timestamp.asc())
+        )
+        return _transpose(result.all(), PNL_EXPORT_COLUMNS)
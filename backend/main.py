@@ -16,8 +16,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.core.config import settings, check_api_key_interactive
 from app.core.database import init_db
 from app.api import portfolio_router, market_router, websocket_router
-from app.api.websocket import broadcast_loop
-from app.services.strategy import strategy_scheduler
+from app.api.websocket import broadcast_loop, quote_loop
+from app.services.llm import llm_engine
+from app.services.market import market_snapshot, coalesced_data_service, quote_table, stock_search, stock_screener
+from app.services.strategy import strategy_scheduler, risk_monitor
 
 
 # 配置日志
@@ -59,6 +61,9 @@ async def lifespan(app: FastAPI):
         llm_available = False
         logger.warning(f"⚠️ LLM 未配置，自动选股功能将不可用")
     
+    # 打开 LLM 共享连接池
+    await llm_engine.open()
+    
     # 初始化调度器
     await strategy_scheduler.init()
     if llm_available:
@@ -69,6 +74,7 @@ async def lifespan(app: FastAPI):
     
     # 启动广播任务
     broadcast_task = asyncio.create_task(broadcast_loop())
+    quote_task = asyncio.create_task(quote_loop())
     logger.info("✅ WebSocket 广播服务启动完成")
     
     logger.info("=" * 50)
@@ -83,12 +89,14 @@ async def lifespan(app: FastAPI):
     
     # 关闭时
     logger.info("正在关闭服务...")
-    broadcast_task.cancel()
-    try:
-        await broadcast_task
-    except asyncio.CancelledError:
-        pass
+    for task in (broadcast_task, quote_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     strategy_scheduler.stop()
+    await llm_engine.close()
     logger.info("服务已关闭")
 
 
@@ -133,6 +141,15 @@ async def health():
         "status": "healthy",
         "llm_available": llm_available,
         "llm_provider": settings.llm_provider if llm_available else None,
+        "llm_pool": llm_engine.pool_stats(),
+        "llm_cache": llm_engine.cache_stats(),
+        "llm_replay": llm_engine.replay_stats(),
+        "risk_monitor": risk_monitor.stats(),
+        "market_snapshot": market_snapshot.stats(),
+        "data_coalesce": coalesced_data_service.stats(),
+        "quote_table": quote_table.stats(),
+        "stock_search": stock_search.stats(),
+        "stock_screener": stock_screener.stats(),
         "scheduler_running": strategy_scheduler.is_running,
         "last_analysis": strategy_scheduler.last_analysis_time
     }
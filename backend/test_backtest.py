@@ -0,0 +1,134 @@
+"""测试回测引擎账本与模拟交易规则一致 (python -m pytest test_backtest.py)"""
+import asyncio
+import sys
+sys.path.insert(0, ".")
+
+import numpy as np
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models import Portfolio, Position
+from app.services.backtest import BacktestEngine, Panel, Strategy
+from app.services.llm import TradingDecision
+from app.services.trading import TradingService, portfolio_state_store
+from app.services.trading.rules import TradingRules
+
+
+CAPITAL = 1e6
+
+
+def _panel(close) -> Panel:
+    close = np.asarray(close, dtype=np.float64)
+    n, steps = close.shape
+    return Panel(
+        symbols=[f"{600000 + i}" for i in range(n)],
+        dates=np.arange(np.datetime64("2024-01-02"), np.datetime64("2024-01-02") + steps),
+        open=close, high=close, low=close, close=close, volume=np.ones_like(close)
+    )
+
+
+class ScriptedStrategy(Strategy):
+    """按预先给定的 {时间下标: [(股票下标, 数量)]} 下单"""
+
+    def __init__(self, script):
+        self.script = script
+
+    def on_bar(self, ctx):
+        orders = self.script.get(ctx.t)
+        if not orders:
+            return None
+        idx, qty = zip(*orders)
+        return np.array(idx), np.array(qty)
+
+
+async def _replay_in_trading_service(prices, script, rules):
+    """在内存数据库中按同样的价格和订单调用 TradingService，返回 (组合资金, 持仓数量)"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            portfolio = Portfolio(name="回测对照", initial_capital=CAPITAL, current_capital=CAPITAL, total_value=CAPITAL)
+            db.add(portfolio)
+            await db.commit()
+
+            service = TradingService(db, rules=rules)
+            for t, orders in sorted(script.items()):
+                # 模拟交易按自然日判断 T+1，对照时把上一根 K 线的买入视为前一日
+                await db.execute(update(Position).values(last_buy_date="2000-01-01"))
+                for _, qty in sorted(orders, key=lambda o: o[1]):
+                    decision = TradingDecision(
+                        symbol="600000", name="测试", action="buy" if qty > 0 else "sell",
+                        quantity=abs(qty) // rules.lot_size * rules.lot_size if qty > 0 else -qty,
+                        reason="对照", confidence=1.0
+                    )
+                    order = await service.execute_decision(portfolio.id, decision, float(prices[t]))
+                    assert order.status == "filled", order.reason
+                await db.commit()
+
+            await db.refresh(portfolio)
+            position = await db.get(Position, 1)
+            return portfolio.current_capital, position.quantity if position else 0
+    finally:
+        portfolio_state_store.invalidate()
+        await engine.dispose()
+
+
+def test_ledger_matches_trading_service():
+    """同样的价格和订单，回测账本的资金与模拟交易 (TradingService) 一致，含最低佣金与印花税"""
+    rules = TradingRules()
+    prices = [10.0, 10.5, 11.0, 10.8]
+    script = {0: [(0, 350)], 1: [(0, 100)], 2: [(0, -250)], 3: [(0, -150)]}
+
+    result = BacktestEngine(CAPITAL, rules, risk_exits=False).run(_panel([prices]), ScriptedStrategy(script))
+    cash, quantity = asyncio.run(_replay_in_trading_service(prices, script, rules))
+
+    assert list(result.trades["quantity"]) == [300, 100, -250, -150]
+    assert result.cash[-1] == pytest.approx(cash)
+    assert quantity == 0
+    assert not result.rejected
+
+    # 手续费逐笔按 TradingRules 计算
+    expected_fees = [
+        rules.buy_cost(10.0, 300)[1],
+        rules.buy_cost(10.5, 100)[1],
+        sum(rules.sell_proceeds(11.0, 250)[1:3]),
+        sum(rules.sell_proceeds(10.8, 150)[1:3]),
+    ]
+    np.testing.assert_allclose(result.trades["fee"], expected_fees)
+
+
+def test_position_limits_rejected():
+    """单只股票最大持仓比例与最大持股数量按 TradingRules 拒绝"""
+    rules = TradingRules(max_holdings=1, max_position_ratio=0.2)
+    script = {
+        0: [(0, 100), (1, 10000)],   # 第二只股票超过最大持股数量
+        1: [(0, 20000)],             # 加仓金额超过总资产的 20%
+    }
+    result = BacktestEngine(CAPITAL, rules, risk_exits=False).run(
+        _panel([[10.0, 10.0], [10.0, 10.0]]), ScriptedStrategy(script)
+    )
+
+    assert list(result.trades["quantity"]) == [100]
+    assert result.rejected == {"max_holdings": 1, "max_position_ratio": 1}
+
+
+def test_take_profit_once_per_holding():
+    """止盈卖出一半且同一轮持仓只止盈一次，与风控监控的 exit_quantities 一致"""
+    rules = TradingRules(take_profit_ratio=0.2, stop_loss_ratio=0.5)
+    prices = [10.0, 12.5, 13.0, 13.5]
+    result = BacktestEngine(CAPITAL, rules).run(_panel([prices]), ScriptedStrategy({0: [(0, 1000)]}))
+
+    records = result.trade_records()
+    assert [(r["action"], r["quantity"], r["reason"]) for r in records] == [
+        ("buy", 1000, "strategy"),
+        ("sell", 500, "take_profit"),
+    ]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,217 @@
+"""测试流式 JSON / NDJSON 编码与列式格式协商 (python -m pytest test_export.py)"""
+import asyncio
+import json
+import sys
+from datetime import datetime
+sys.path.insert(0, ".")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.export import (
+    ARROW_STREAM, PARQUET, ArrowUnavailableError, aiter_encoded, attachment, encode_columnar, encode_json,
+    encode_stream, frame_columns, negotiate, parse_fields, project, wants_ndjson
+)
+from app.services.export.arrow import to_table
+
+
+def _frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """随机 K 线 (含缺失值和缺失日期)"""
+    rng = np.random.default_rng(seed)
+    close = rng.uniform(5, 50, rows)
+    close[::7] = np.nan
+    dates = pd.date_range("2024-01-01", periods=rows).to_numpy().copy()
+    dates[::11] = np.datetime64("NaT")
+    return pd.DataFrame({
+        "date": dates,
+        "symbol": [f"{i % 5:06d}" for i in range(rows)],
+        "close": close,
+        "volume": rng.integers(0, 10 ** 6, rows),
+    })
+
+
+def _expected_rows(df: pd.DataFrame) -> list:
+    rows = []
+    for record in df.to_dict("records"):
+        rows.append({
+            "date": None if pd.isna(record["date"]) else record["date"].strftime("%Y-%m-%d"),
+            "symbol": record["symbol"],
+            "close": None if np.isnan(record["close"]) else record["close"],
+            "volume": int(record["volume"]),
+        })
+    return rows
+
+
+def _chunks(df: pd.DataFrame, size: int) -> list:
+    return [frame_columns(df.iloc[i:i + size]) for i in range(0, len(df), size)]
+
+
+@pytest.mark.parametrize("rows,batch_size", [(0, 4), (1, 4), (10, 4), (37, 5), (40, 40)])
+def test_stream_matches_single_json(rows, batch_size):
+    """分块 JSON 数组、NDJSON 与一次性编码解码出的记录相同 (NaN / NaT 转为 null)"""
+    df = _frame(rows)
+    expected = _expected_rows(df)
+    assert json.loads(encode_json(frame_columns(df))) == expected
+
+    chunks = _chunks(df, 13) if rows else [frame_columns(df)]
+    body = b"".join(encode_stream(chunks, ndjson=False, batch_size=batch_size))
+    assert json.loads(body) == expected
+
+    lines = b"".join(encode_stream(chunks, ndjson=True, batch_size=batch_size)).splitlines()
+    assert [json.loads(line) for line in lines] == expected
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_async_chunks_with_empty_blocks(ndjson):
+    """异步逐块编码时跳过空块，块与块之间的分隔符正确"""
+    df = _frame(23, seed=1)
+    blocks = [frame_columns(df.iloc[:0]), *_chunks(df, 9), frame_columns(df.iloc[:0])]
+
+    async def chunks():
+        for block in blocks:
+            yield block
+
+    async def collect():
+        return b"".join([data async for data in aiter_encoded(chunks(), ndjson, batch_size=4)])
+
+    body = asyncio.run(collect())
+    decoded = [json.loads(line) for line in body.splitlines()] if ndjson else json.loads(body)
+    assert decoded == _expected_rows(df)
+
+
+def test_field_projection_and_format_selection():
+    """字段投影按请求顺序输出，未知字段报错；format 参数优先于 Accept 头"""
+    df = _frame(6)
+    fields = parse_fields(" close, date ,,")
+    assert fields == ["close", "date"]
+    assert parse_fields(" , ") is None
+
+    rows = json.loads(encode_json(project(frame_columns(df), fields)))
+    assert [list(row) for row in rows] == [["close", "date"]] * 6
+    with pytest.raises(ValueError, match="turnover"):
+        project(frame_columns(df), ["close", "turnover"])
+
+    assert wants_ndjson("application/x-ndjson, application/json;q=0.5")
+    assert not wants_ndjson("application/json")
+    assert not wants_ndjson(None)
+    assert wants_ndjson("application/json", "NDJSON")
+    assert not wants_ndjson("application/x-ndjson", "json")
+
+
+
+def _get(path: str, headers: dict = None):
+    """对市场数据路由发起请求 (不启动完整应用)"""
+    import httpx
+    from fastapi import FastAPI
+    from app.api.market import router
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize("accept,format,expected", [
+    (None, None, None),
+    ("application/json", None, None),
+    ("*/*", None, None),
+    ("application/vnd.apache.arrow.stream", None, ARROW_STREAM),
+    ("application/vnd.apache.arrow.file", None, ARROW_STREAM),
+    ("application/json;q=0.9, application/x-parquet;q=0.5", None, PARQUET),
+    ("Application/Vnd.Apache.Parquet; q=1", None, PARQUET),
+    ("application/vnd.apache.arrow.stream", "parquet", PARQUET),
+    (None, "ARROW", ARROW_STREAM),
+    ("application/vnd.apache.arrow.stream", "json", None),
+])
+def test_negotiate(accept, format, expected):
+    """format 参数优先，其次按 Accept 头中第一个支持的列式媒体类型"""
+    assert negotiate(accept, format) == expected
+
+
+def test_arrow_unavailable(monkeypatch):
+    """pyarrow 未安装时编码报 ArrowUnavailableError，接口返回 406"""
+    import app.api.market as market_api
+
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ArrowUnavailableError):
+        encode_columnar(frame_columns(_frame(3)), ARROW_STREAM)
+
+    monkeypatch.setattr(market_api, "get_history_frame", lambda symbol, **kwargs: _frame(3))
+    response = _get("/api/market/history/000001", {"Accept": ARROW_STREAM})
+    assert response.status_code == 406
+    assert attachment("000001_daily", PARQUET) == {
+        "Content-Disposition": 'attachment; filename="000001_daily.parquet"'
+    }
+
+
+@pytest.mark.parametrize("media_type", [ARROW_STREAM, PARQUET])
+def test_columnar_round_trip(monkeypatch, media_type):
+    """Arrow IPC 流 / Parquet 解码后与原始列一致 (NaN 转为 null)，空结果仍保留字段类型"""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+    import app.api.market as market_api
+
+    df = _frame(20)
+    monkeypatch.setattr(market_api, "get_history_frame", lambda symbol, **kwargs: df)
+    response = _get("/api/market/history/000001?fields=date,close", {"Accept": media_type})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == media_type
+    if media_type == PARQUET:
+        table = pa.parquet.read_table(pa.BufferReader(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["date", "close"]
+    assert table.column("close").null_count == int(df["close"].isna().sum())
+    np.testing.assert_array_equal(table.column("close").to_numpy(zero_copy_only=False), df["close"].to_numpy())
+
+    empty = to_table({"price": [], "filled_at": []}, {"price": float, "filled_at": datetime})
+    assert empty.schema.field("price").type == pa.float64()
+    assert empty.schema.field("filled_at").type == pa.timestamp("us")
+
+
+
+def test_history_json_columns(monkeypatch):
+    """历史K线 JSON 按列构建：字段同 HistoricalData，缺失列和 NaN 输出 null，分页与字段投影生效"""
+    import app.api.market as market_api
+
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({
+        "date": [f"2024-03-{d:02d}" for d in range(1, 11)],
+        "open": rng.uniform(10, 11, 10),
+        "high": rng.uniform(11, 12, 10),
+        "low": rng.uniform(9, 10, 10),
+        "close": rng.uniform(10, 11, 10),
+        "volume": rng.integers(1000, 5000, 10),
+        "ma5": [np.nan] * 4 + list(rng.uniform(10, 11, 6)),
+        "extra": ["x"] * 10,
+    })
+    monkeypatch.setattr(market_api, "get_history_frame", lambda symbol, **kwargs: df)
+
+    expected = []
+    for _, row in df.iterrows():
+        item = {}
+        for name in market_api.HistoricalData.model_fields:
+            value = row.get(name)
+            item[name] = None if value is None or pd.isna(value) else (value if name == "date" else float(value))
+        expected.append(item)
+
+    response = _get("/api/market/history/000001")
+    assert response.status_code == 200
+    assert response.json() == expected
+    assert list(response.json()[0]) == list(market_api.HistoricalData.model_fields)
+
+    page = _get("/api/market/history/000001?offset=3&limit=4&fields=date,ma5").json()
+    assert page == [{"date": item["date"], "ma5": item["ma5"]} for item in expected[3:7]]
+    assert _get("/api/market/history/000001?offset=20").json() == []
+    assert _get("/api/market/history/000001?fields=date,extra").status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
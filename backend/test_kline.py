@@ -0,0 +1,129 @@
+"""测试列式 K 线存储与指标引擎 (python -m pytest test_kline.py)"""
+import sys
+from datetime import date
+sys.path.insert(0, ".")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.kline import history
+from app.services.kline.columnar_store import ColumnarKlineStore
+from app.services.kline.indicators import IndicatorEngine, compute_indicators
+
+
+def _bars(days: int, end: date = None) -> pd.DataFrame:
+    dates = pd.bdate_range(end=end or date.today(), periods=days)
+    close = np.linspace(10.0, 20.0, days)
+    return pd.DataFrame({
+        "date": dates, "open": close, "high": close + 0.5, "low": close - 0.5,
+        "close": close, "volume": np.full(days, 1e6), "amount": close * 1e6,
+    })
+
+
+def test_one_bar_store_does_not_cover_open_start(tmp_path, monkeypatch):
+    """只由日常追加建立的存储 (一根 K 线) 不能当作完整历史返回"""
+    store = ColumnarKlineStore(tmp_path)
+    monkeypatch.setattr(history, "kline_store", store)
+    today = _bars(1)
+    store.append("600519", "daily", today)
+    day = today["date"].iloc[0].date()
+
+    assert store.length("600519") == 1
+    assert not store.covers("600519", end_date=day)
+    assert history.get_history_frame("600519", end_date=day) is None
+    # 指定开始日期且已覆盖时仍可读取本地数据
+    assert store.covers("600519", start_date=day, end_date=day)
+
+
+def test_full_history_marker_survives_daily_append(tmp_path, monkeypatch):
+    store = ColumnarKlineStore(tmp_path)
+    monkeypatch.setattr(history, "kline_store", store)
+    bars = _bars(60)
+    store.append("600519", "daily", bars.iloc[:-1], full_history=True)
+    store.append("600519", "daily", bars.iloc[-1:])
+    last = bars["date"].iloc[-1].date()
+
+    assert store.covers("600519", end_date=last)
+    df = history.get_history_frame("600519", end_date=last)
+    assert len(df) == 60
+
+    # 回补历史整体重写后标记仍保留
+    store.append("600519", "daily", _bars(5, end=bars["date"].iloc[0] - pd.Timedelta(days=1)))
+    assert store.length("600519") == 65
+    assert store.covers("600519", end_date=last)
+
+
+
+def test_indicator_engine_skips_store_without_history(tmp_path):
+    """指标引擎不从只有日常追加 K 线的存储建立状态"""
+    store = ColumnarKlineStore(tmp_path)
+    store.append("600519", "daily", _bars(1))
+    store.append("000001", "daily", _bars(60), full_history=True)
+
+    engine = IndicatorEngine()
+    engine.bootstrap_from_store(store, "daily", lookback=120)
+    assert engine.symbols == ["000001"]
+    assert not engine.sync_symbol(store, "600519", "daily", lookback=120)
+    assert "600519" not in engine.symbols
+
+
+
+def _random_closes(rows: int, days: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 10.0 * np.exp(rng.normal(0, 0.02, (rows, days)).cumsum(axis=1))
+
+
+def _assert_matches_batch(engine: IndicatorEngine, close: np.ndarray):
+    expected = compute_indicators(close)
+    latest = engine.latest_all()
+    for name, values in expected.items():
+        np.testing.assert_allclose(latest[name], values[:, -1], rtol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_incremental_append_matches_batch():
+    """逐根增量追加后的指标与对完整历史一次批量计算的结果一致"""
+    close = _random_closes(3, 120)
+    engine = IndicatorEngine()
+    engine.bootstrap(["600519", "000001", "300750"], close[:, :80], np.full(3, 79))
+    for t in range(80, 120):
+        engine.append(dict(zip(engine.symbols, close[:, t])), day=t)
+    _assert_matches_batch(engine, close)
+
+    # 同一天重复追加被跳过
+    assert engine.append({"600519": 1.0}, day=119) == []
+    _assert_matches_batch(engine, close)
+
+
+def test_peek_matches_append_without_changing_state():
+    close = _random_closes(2, 70, seed=1)
+    engine = IndicatorEngine()
+    engine.bootstrap(["600519", "000001"], close[:, :-1])
+    before = engine.latest_all()
+
+    peeked = engine.peek(dict(zip(engine.symbols, close[:, -1])))
+    for name, values in before.items():
+        np.testing.assert_array_equal(engine.latest_all()[name], values)
+
+    expected = compute_indicators(close)
+    for i, symbol in enumerate(engine.symbols):
+        for name, values in expected.items():
+            assert peeked[symbol][name] == pytest.approx(values[i, -1], rel=1e-9)
+
+
+def test_sync_symbol_incremental_matches_batch(tmp_path):
+    """存储追加一根 K 线后 sync_symbol 增量更新，结果与按存储全量计算一致"""
+    store = ColumnarKlineStore(tmp_path)
+    bars = _bars(90)
+    store.append("600519", "daily", bars.iloc[:-1], full_history=True)
+
+    engine = IndicatorEngine()
+    assert not engine.sync_symbol(store, "600519", "daily", lookback=500)
+    store.append("600519", "daily", bars.iloc[-1:])
+    assert engine.sync_symbol(store, "600519", "daily", lookback=500)
+
+    _assert_matches_batch(engine, np.asarray(store.columns("600519")["close"])[None, :])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
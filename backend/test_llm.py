@@ -0,0 +1,60 @@
+"""测试 LLM 决策录制与回放 (python -m pytest test_llm.py)"""
+import asyncio
+import sys
+from datetime import datetime
+sys.path.insert(0, ".")
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.services.llm.decision_engine import LLMDecisionEngine, StubLLMClient
+from app.services.llm.replay import ReplayStore
+from app.services.llm.response_cache import ResponseCache
+
+
+def _buy_responder(messages):
+    return {
+        "market_sentiment": "bullish",
+        "market_summary": "测试",
+        "risk_assessment": "低",
+        "decisions": [{
+            "symbol": "600519", "name": "贵州茅台", "action": "buy",
+            "quantity": 100, "reason": "测试", "confidence": 0.9
+        }]
+    }
+
+
+async def _record_two_days():
+    """相同行情在两个历史日期各分析一次 (录制模式，开启响应缓存)"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    store = ReplayStore(async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+
+    client = StubLLMClient(_buy_responder, model="test-model")
+    llm = LLMDecisionEngine(model="test-model", client=client, replay_mode="record", replay_store=store)
+    llm.cache = ResponseCache(max_size=16, ttl=3600)
+
+    try:
+        market = {"sh_index": 3000.0, "sh_change": 0.5, "sentiment": "neutral"}
+        candidates = [{"symbol": "600519", "name": "贵州茅台", "price": 1500.0}]
+        for day in (datetime(2024, 1, 2, 10, 0), datetime(2024, 1, 3, 10, 0)):
+            result = await llm.analyze_and_decide(market, {"cash": 1e6}, candidates, as_of=day)
+            assert not result.cached
+
+        decisions = await store.decisions(model="test-model")
+        return client.requests_total, sorted(d["as_of"] for d in decisions)
+    finally:
+        await engine.dispose()
+
+
+def test_record_mode_records_each_day_under_its_as_of():
+    """录制模式不被响应缓存短路，且按决策日期 (as_of) 而不是录制当天存储"""
+    requests, days = asyncio.run(_record_two_days())
+    assert requests == 2
+    assert days == ["2024-01-02", "2024-01-03"]
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,153 @@
+"""测试全市场行情表与条件筛选 (python -m pytest test_market.py)"""
+import asyncio
+import sys
+sys.path.insert(0, ".")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.data import data_service
+from app.services.market import coalesced_data_service
+from app.services.kline.indicators import IndicatorEngine, compute_indicators
+from app.services.market import screener as screener_module
+from app.services.market.quote_table import QuoteTable, QuoteTableCache, top_k
+from app.services.market.screener import Predicate, StockScreener, build_predicates
+
+
+def _market(rows: int = 500, seed: int = 0) -> pd.DataFrame:
+    """随机全市场行情 (含停牌和缺失值)"""
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(2, 200, rows)
+    price[::37] = 0.0  # 停牌
+    change_pct = rng.normal(0, 3, rows)
+    change_pct[::53] = np.nan
+    return pd.DataFrame({
+        "symbol": [f"{i:06d}" for i in range(rows)],
+        "name": [f"股票{i}" for i in range(rows)],
+        "price": price,
+        "change_pct": change_pct,
+        "volume": rng.uniform(1e4, 1e8, rows),
+        "amount": rng.uniform(1e6, 1e10, rows),
+        "turnover_rate": rng.uniform(0, 20, rows),
+        "pe_ratio": rng.uniform(-50, 100, rows),
+        "market_cap": rng.uniform(1e9, 1e12, rows),
+    })
+
+
+@pytest.mark.parametrize("k", [0, 1, 10, 499, 1000])
+@pytest.mark.parametrize("descending", [True, False])
+def test_top_k_matches_full_sort(k, descending):
+    rng = np.random.default_rng(k)
+    values = rng.normal(size=500)
+    values[::11] = np.nan
+    mask = rng.random(500) > 0.3
+
+    valid = np.flatnonzero(~np.isnan(values) & mask)
+    expected = valid[np.argsort(-values[valid] if descending else values[valid], kind="stable")][:k]
+    np.testing.assert_array_equal(top_k(values, k, descending, mask), expected)
+
+
+@pytest.mark.parametrize("name, column, ascending", [
+    ("gainers", "change_pct", False),
+    ("losers", "change_pct", True),
+    ("volume", "volume", False),
+    ("hot", "amount", False),
+])
+def test_ranking_matches_pandas_sort(name, column, ascending):
+    """排行与 pandas 整表排序的结果一致 (排除停牌和排序值缺失的股票)"""
+    df = _market()
+    table = QuoteTable.from_frame(df)
+
+    trading = df[(df["price"] > 0) & df[column].notna()]
+    expected = trading.sort_values(column, ascending=ascending, kind="stable")["symbol"].head(20).tolist()
+    assert [r["symbol"] for r in table.ranking(name, 20)] == expected
+
+
+def test_records_convert_nan_to_none():
+    table = QuoteTable.from_frame(_market())
+    record = table.records([53], fields=["symbol", "change_pct", "missing"])
+    assert record == [{"symbol": "000053", "change_pct": None}]
+
+
+def test_cache_single_refresh_and_keeps_last_table(monkeypatch):
+    """并发读取只刷新一次；刷新失败时继续返回上一次的行情表"""
+    calls = []
+
+    async def get_all_stocks_quote():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return _market()
+
+    monkeypatch.setattr(data_service, "get_all_stocks_quote", get_all_stocks_quote, raising=False)
+    coalesced_data_service.invalidate()
+    cache = QuoteTableCache(ttl=60)
+
+    async def run():
+        tables = await asyncio.gather(*(cache.get() for _ in range(5)))
+        assert len(calls) == 1
+        assert all(t is tables[0] for t in tables)
+
+        async def fail():
+            raise RuntimeError("上游不可用")
+        monkeypatch.setattr(data_service, "get_all_stocks_quote", fail, raising=False)
+        coalesced_data_service.invalidate()
+        assert await cache.get(max_age=0) is tables[0]
+
+    asyncio.run(run())
+
+
+
+def test_screen_masks_match_pandas_and_are_cached():
+    """区间条件的掩码与 pandas 筛选一致；相同组合 (不论顺序) 复用缓存，行情表更新后缓存失效"""
+    df = _market()
+    table = QuoteTable.from_frame(df, timestamp=1.0)
+    screener = StockScreener(cache_size=16)
+    predicates = build_predicates(min_price=10, max_price=100, min_turnover=5, max_pe=30)
+
+    records = screener.screen(table, predicates, limit=1000)
+    expected = df.query("price >= 10 and price <= 100 and turnover_rate >= 5 and pe_ratio <= 30")
+    assert [r["symbol"] for r in records] == expected["symbol"].tolist()
+
+    frame = screener.frame(table)
+    first = screener.mask(frame, predicates)
+    hits = screener.hits
+    assert screener.mask(frame, list(reversed(predicates))) is first
+    assert screener.hits == hits + 1
+
+    # 新增一个条件时单个条件的掩码仍然复用，只计算新条件
+    misses = screener.misses
+    screener.mask(frame, predicates + [Predicate("change_pct", ">", 0.0)])
+    assert screener.misses == misses + 2  # 新组合 + 新条件
+
+    screener.frame(QuoteTable.from_frame(df, timestamp=2.0))
+    assert screener.stats()["cached_masks"] == 0
+
+
+def test_indicator_predicates_use_live_price(monkeypatch):
+    """均线 / 均线交叉条件按当前价格试算的指标判断，与对完整序列批量计算的结果一致"""
+    rng = np.random.default_rng(3)
+    history = 10.0 * np.exp(rng.normal(0, 0.03, (200, 60)).cumsum(axis=1))
+    symbols = [f"{i:06d}" for i in range(200)]
+    engine = IndicatorEngine()
+    engine.bootstrap(symbols, history)
+    monkeypatch.setattr(screener_module, "indicator_engine", engine)
+
+    price = history[:, -1] * rng.uniform(0.9, 1.1, 200)
+    table = QuoteTable.from_frame(pd.DataFrame({"symbol": symbols, "name": symbols, "price": price}))
+    full = compute_indicators(np.concatenate([history, price[:, None]], axis=1))
+
+    screener = StockScreener()
+    above = {r["symbol"] for r in screener.screen(table, build_predicates(above_ma=5), limit=1000)}
+    assert above == {symbols[i] for i in np.flatnonzero(price > full["ma5"][:, -1])}
+
+    cross = {r["symbol"] for r in screener.screen(table, build_predicates(ma_cross=(5, 20)), limit=1000)}
+    expected = (full["ma5"][:, -1] > full["ma20"][:, -1]) & (full["ma5"][:, -2] <= full["ma20"][:, -2])
+    assert cross == {symbols[i] for i in np.flatnonzero(expected)}
+
+    top = screener.screen(table, [], sort_by="rsi", limit=5)
+    assert [r["symbol"] for r in top] == [symbols[i] for i in np.argsort(-full["rsi"][:, -1])[:5]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,303 @@
+"""测试交易执行与持仓状态 (python -m pytest test_trading.py)"""
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+sys.path.insert(0, ".")
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models import Order, Portfolio, Position
+from app.services.data import data_service
+from app.services.llm import TradingDecision
+from app.services.market import coalesced_data_service
+from app.services.strategy.risk_monitor import RiskMonitor
+from app.services.strategy import scheduler as scheduler_module
+from app.services.strategy.scheduler import StrategyScheduler
+from app.services.trading import TradingService, portfolio_state_store
+
+
+def _fake_realtime_quote(calls):
+    async def get_realtime_quote(symbols):
+        calls.append(list(symbols))
+        return pd.DataFrame({"symbol": symbols, "price": [9.9] * len(symbols)})
+    return get_realtime_quote
+
+
+def test_execution_quotes_reuse_candidates(monkeypatch):
+    """下单时仍在 execution_quote_max_age 内的候选行情直接复用，过期的一次批量重新请求"""
+    calls = []
+    monkeypatch.setattr(data_service, "get_realtime_quote", _fake_realtime_quote(calls), raising=False)
+    coalesced_data_service.invalidate()
+
+    now = time.time()
+    candidates = [
+        {"symbol": "600519", "price": 1500.0, "quote_time": now - settings.execution_quote_max_age + 5},
+        # 读取快照时足够新鲜，但经过 LLM 往返后已超过时效
+        {"symbol": "000001", "price": 10.0, "quote_time": now - settings.execution_quote_max_age - 1},
+        {"symbol": "300750", "price": 200.0, "quote_time": now - settings.market_snapshot_interval},
+    ]
+
+    quotes = asyncio.run(StrategyScheduler()._get_execution_quotes(
+        ["600519", "000001", "300750"], candidates
+    ))
+
+    assert quotes["600519"] == (1500.0, candidates[0]["quote_time"])
+    assert quotes["000001"][0] == 9.9
+    assert quotes["300750"][0] == 9.9
+    assert quotes["000001"][1] >= now
+    assert calls == [["000001", "300750"]]
+
+
+def test_execution_quotes_all_fresh_no_fetch(monkeypatch):
+    """全部候选行情可复用时不发起行情请求"""
+    calls = []
+    monkeypatch.setattr(data_service, "get_realtime_quote", _fake_realtime_quote(calls), raising=False)
+    coalesced_data_service.invalidate()
+
+    now = time.time()
+    candidates = [{"symbol": "600519", "price": 1500.0, "quote_time": now - 5}]
+    quotes = asyncio.run(StrategyScheduler()._get_execution_quotes(["600519"], candidates))
+
+    assert quotes == {"600519": (1500.0, now - 5)}
+    assert calls == []
+
+
+async def _memory_engine():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _add_position(db: AsyncSession, quantity: int, avg_cost: float) -> Portfolio:
+    """创建测试组合并持有 quantity 股 600519 (非当日买入，可卖出)"""
+    portfolio = Portfolio(name="测试组合", initial_capital=1e6, current_capital=1e6, total_value=1e6)
+    db.add(portfolio)
+    await db.flush()
+    db.add(Position(
+        portfolio_id=portfolio.id, symbol="600519", name="贵州茅台",
+        quantity=quantity, avg_cost=avg_cost, current_price=avg_cost, last_buy_date="2000-01-01"
+    ))
+    await db.commit()
+    return portfolio
+
+
+async def _partial_sell(held: int, sell: int):
+    """在内存数据库中持有 held 股后卖出 sell 股，返回 (内存持仓, 数据库持仓)"""
+    engine, session_factory = await _memory_engine()
+
+    try:
+        async with session_factory() as db:
+            portfolio = await _add_position(db, held, 1500.0)
+
+            decision = TradingDecision(
+                symbol="600519", name="贵州茅台", action="sell",
+                quantity=sell, reason="止盈", confidence=1.0
+            )
+            order = await TradingService(db).execute_decision(portfolio.id, decision, 1600.0)
+            await db.commit()
+            assert order.status == "filled"
+
+            state = portfolio_state_store.get(portfolio.id)
+            memory = {s: p.quantity for s, p in state.positions.items()}
+            rows = await db.execute(select(Position.symbol, Position.quantity))
+            return memory, dict(rows.all())
+    finally:
+        portfolio_state_store.invalidate()
+        await engine.dispose()
+
+
+def test_partial_sell_keeps_position_in_memory():
+    """持有 200 股卖出 100 股: 剩余数量等于卖出数量时内存持仓不能被删除"""
+    memory, stored = asyncio.run(_partial_sell(200, 100))
+    assert stored == {"600519": 100}
+    assert memory == stored
+
+
+def test_full_sell_removes_position():
+    memory, stored = asyncio.run(_partial_sell(200, 200))
+    assert stored == {}
+    assert memory == {}
+
+
+
+async def _take_profit_twice():
+    """
+    止盈后丢弃内存状态 (模拟进程重启) 再次检查，返回两次检查的卖出数量和数据库中的剩余持仓
+    """
+    engine, session_factory = await _memory_engine()
+    monitor = RiskMonitor()
+    price = 100.0 * (1 + settings.take_profit_ratio) + 1
+
+    try:
+        async with session_factory() as db:
+            portfolio = await _add_position(db, 400, 100.0)
+            service = TradingService(db)
+            await service.update_positions_price(portfolio.id, {"600519": price})
+
+            # 没有新鲜行情的持仓不检查
+            stale = await monitor.check(service, portfolio.id, symbols=set())
+            first = await monitor.check(service, portfolio.id, symbols={"600519"})
+            await db.commit()
+
+        portfolio_state_store.invalidate()
+        async with session_factory() as db:
+            service = TradingService(db)
+            await service.update_positions_price(portfolio.id, {"600519": price})
+            second = await monitor.check(service, portfolio.id, symbols={"600519"})
+            await db.commit()
+            rows = await db.execute(select(Position.quantity, Position.profit_taken))
+            return stale, [o.quantity for o in first], [o.quantity for o in second], rows.all()
+    finally:
+        portfolio_state_store.invalidate()
+        await engine.dispose()
+
+
+def test_take_profit_flag_survives_reload():
+    """止盈标记持久化在持仓上，重新加载组合状态后同一轮持仓不会再次止盈"""
+    stale, first, second, rows = asyncio.run(_take_profit_twice())
+    assert stale == []
+    assert first == [200]
+    assert second == []
+    assert rows == [(200, True)]
+
+
+
+async def _analyze_two_portfolios(db_path):
+    """两个组合同时分析：返回 (LLM 最大并发数, 交易执行最大并发数, 成交订单数)"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    active = {"llm": 0, "execute": 0}
+    peak = {"llm": 0, "execute": 0}
+
+    def track(name, func):
+        async def wrapper(*args, **kwargs):
+            active[name] += 1
+            peak[name] = max(peak[name], active[name])
+            try:
+                await asyncio.sleep(0.02)
+                return await func(*args, **kwargs)
+            finally:
+                active[name] -= 1
+        return wrapper
+
+    async def analyze_and_decide(**kwargs):
+        decision = TradingDecision(
+            symbol="600519", name="贵州茅台", action="buy", quantity=100, reason="测试", confidence=1.0
+        )
+        return SimpleNamespace(market_sentiment="neutral", decisions=[decision], latency_ms=0)
+
+    try:
+        async with session_factory() as db:
+            portfolios = [
+                Portfolio(name=f"组合{i}", initial_capital=1e6, current_capital=1e6, total_value=1e6)
+                for i in range(2)
+            ]
+            db.add_all(portfolios)
+            await db.commit()
+
+        candidates = [{"symbol": "600519", "price": 10.0, "quote_time": time.time()}]
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(scheduler_module, "async_session_factory", session_factory)
+            mp.setattr(scheduler_module.llm_engine, "analyze_and_decide", track("llm", analyze_and_decide))
+            mp.setattr(TradingService, "execute_decision", track("execute", TradingService.execute_decision))
+            scheduler = StrategyScheduler()
+            await asyncio.gather(*(
+                scheduler._analyze_portfolio(p.id, {}, candidates) for p in portfolios
+            ))
+
+        async with session_factory() as db:
+            rows = await db.execute(select(Order).where(Order.status == "filled"))
+            return peak["llm"], peak["execute"], len(rows.scalars().all())
+    finally:
+        portfolio_state_store.invalidate()
+        await engine.dispose()
+
+
+def test_concurrent_analysis_serializes_writes(tmp_path):
+    """多组合并发分析时 LLM 调用并发，交易执行与提交依次进行"""
+    llm_peak, execute_peak, filled = asyncio.run(_analyze_two_portfolios(tmp_path / "lumina.db"))
+    assert llm_peak == 2
+    assert execute_peak == 1
+    assert filled == 2
+
+
+
+async def _risk_sell_during_llm(db_path):
+    """
+    LLM 调用期间风控快速通道在另一个会话中清仓并提交，LLM 返回后买入另一只股票
+
+    Returns:
+        (LLM 调用期间调度器持有的会话数, 数据库中的组合资金, 期望资金, 数据库持仓)
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    rules = TradingService(None).rules
+    open_sessions = []
+
+    @asynccontextmanager
+    async def tracked_session_factory():
+        async with session_factory() as db:
+            open_sessions.append(db)
+            try:
+                yield db
+            finally:
+                open_sessions.remove(db)
+    held_during_llm = []
+
+    try:
+        async with session_factory() as db:
+            portfolio = await _add_position(db, 200, 100.0)
+        portfolio_state_store.invalidate()
+
+        async def analyze_and_decide(**kwargs):
+            held_during_llm.append(len(open_sessions))
+            async with session_factory() as db:
+                sell = TradingDecision(
+                    symbol="600519", name="贵州茅台", action="sell", quantity=200, reason="触发止损", confidence=0.9
+                )
+                order = await TradingService(db).execute_decision(portfolio.id, sell, 90.0)
+                await db.commit()
+                assert order.status == "filled"
+            buy = TradingDecision(
+                symbol="000001", name="平安银行", action="buy", quantity=100, reason="测试", confidence=1.0
+            )
+            return SimpleNamespace(market_sentiment="neutral", decisions=[buy], latency_ms=0)
+
+        candidates = [{"symbol": "000001", "price": 10.0, "quote_time": time.time()}]
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(scheduler_module, "async_session_factory", tracked_session_factory)
+            mp.setattr(scheduler_module.llm_engine, "analyze_and_decide", analyze_and_decide)
+            await StrategyScheduler()._analyze_portfolio(portfolio.id, {}, candidates)
+
+        expected = 1e6 + rules.sell_proceeds(90.0, 200)[3] - rules.buy_cost(10.0, 100)[2]
+        async with session_factory() as db:
+            stored = await db.get(Portfolio, portfolio.id)
+            rows = await db.execute(select(Position.symbol, Position.quantity))
+            return held_during_llm, stored.current_capital, expected, dict(rows.all())
+    finally:
+        portfolio_state_store.invalidate()
+        await engine.dispose()
+
+
+def test_execution_rereads_portfolio_after_llm(tmp_path):
+    """LLM 调用期间不持有会话，期间提交的风控卖出不会被执行阶段的旧组合数据覆盖"""
+    held, capital, expected, positions = asyncio.run(_risk_sell_during_llm(tmp_path / "lumina.db"))
+    assert held == [0]
+    assert capital == pytest.approx(expected)
+    assert positions == {"000001": 100}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
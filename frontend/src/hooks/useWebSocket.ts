@@ -1,15 +1,44 @@
 import { useState, useEffect, useCallback, useRef } from 'react'
-import type { Portfolio, PnLRecord, WebSocketMessage } from '../types'
+import type { Portfolio, PnLRecord, PatchOperation, WebSocketMessage } from '../types'
 
 const WS_URL = import.meta.env.DEV 
   ? 'ws://localhost:8000/ws' 
   : `ws://${window.location.host}/ws`
 
+// 将增量操作应用到组合快照 (持仓路径为 /positions/{symbol})
+function applyPatch(portfolio: Portfolio, ops: PatchOperation[]): Portfolio {
+  const next: any = { ...portfolio }
+  let positions = [...portfolio.positions]
+
+  for (const { op, path, value } of ops) {
+    const parts = path.split('/').slice(1)
+    if (parts[0] === 'positions' && parts.length === 2) {
+      const symbol = parts[1]
+      const index = positions.findIndex((p) => p.symbol === symbol)
+      if (op === 'remove') {
+        if (index >= 0) positions.splice(index, 1)
+      } else if (index >= 0) {
+        positions[index] = value
+      } else {
+        positions.push(value)
+      }
+    } else if (op === 'remove') {
+      delete next[parts[0]]
+    } else {
+      next[parts[0]] = value
+    }
+  }
+
+  next.positions = positions
+  return next as Portfolio
+}
+
 export function useWebSocket() {
   const [isConnected, setIsConnected] = useState(false)
   const [portfolioData, setPortfolioData] = useState<Portfolio | null>(null)
   const [pnlHistory, setPnlHistory] = useState<PnLRecord[]>([])
   const wsRef = useRef<WebSocket | null>(null)
+  const seqRef = useRef<number | null>(null)
   const reconnectTimeoutRef = useRef<number>()
 
   const connect = useCallback(() => {
@@ -28,6 +57,7 @@ export function useWebSocket() {
           
           switch (message.type) {
             case 'initial_state':
+              seqRef.current = message.seq ?? null
               if (message.data?.portfolio) {
                 setPortfolioData(message.data.portfolio)
               }
@@ -36,12 +66,30 @@ export function useWebSocket() {
               }
               break
             
-            case 'portfolio_update':
+            case 'portfolio_snapshot':
+              seqRef.current = message.seq ?? null
               if (message.data) {
                 setPortfolioData(message.data)
               }
               break
             
+            case 'portfolio_delta':
+              if (seqRef.current === null || message.seq === undefined) {
+                break
+              }
+              if (message.seq <= seqRef.current) {
+                // 重复的增量，忽略
+                break
+              }
+              if (message.base !== seqRef.current) {
+                // 序号不连续，请求从当前版本重新同步
+                ws.send(JSON.stringify({ type: 'resync', since: seqRef.current }))
+                break
+              }
+              seqRef.current = message.seq
+              setPortfolioData((prev) => (prev ? applyPatch(prev, message.ops ?? []) : prev))
+              break
+            
             case 'pong':
             case 'heartbeat':
               // 心跳响应，忽略
@@ -59,6 +107,7 @@ export function useWebSocket() {
         console.log('WebSocket 已断开')
         setIsConnected(false)
         wsRef.current = null
+        seqRef.current = null
         
         // 5秒后重连
         reconnectTimeoutRef.current = setTimeout(() => {
@@ -70,9 +70,19 @@ export interface StockQuote {
   market_cap?: number
 }
 
+export interface PatchOperation {
+  op: 'add' | 'replace' | 'remove'
+  path: string
+  value?: any
+}
+
 export interface WebSocketMessage {
   type: string
   data?: any
   timestamp?: string
   message?: string
+  seq?: number   // 组合快照版本号
+  base?: number  // 增量所基于的版本号
+  ops?: PatchOperation[]
+  portfolio_id?: number  // 消息所属组合 (连接通过 ?portfolio_id= 或 subscribe_portfolio 订阅)
 }